@@ -1,216 +1,35 @@
 # You may import any submodules of tkinter here if you wish
 # You may also import anything from the typing module
 # All other additional imports will result in a deduction of up to 100% of your A3 mark
+import argparse
+import math
+import time
 import tkinter as tk
-import tkinter.messagebox as tkMessageBox
 from a3_support import *
-from tkinter.filedialog import askopenfilename, asksaveasfilename, askopenfile
-
-class Model:
-	def __init__(self) -> None:
-		"""
-		Constructs a new 2048 model instance. This includes setting up a new game (see new_game
-		method below).
-		"""
-		self.column = 4#Designed for changing the size of the board
-		#Initialization of the board using list[list[int]] without using numpy
-		self.matrix = [[None for _ in range(self.column)] for _ in range(self.column)]
-		#2 new tiles randommly be created 
-		self.add_tile()
-		self.add_tile()
-		#A list for recording the history of the history
-		self.history = list()
-		#Only 3 undo can be done
-		self.undoable_move = list()
-		self.score = 0
-		#Remaining undo chances
-		self.undo_remained = 3
-		#Add first record
-		self.record()
-
-	def new_game(self) -> None:
-		"""
-		Sets, or resets, the game state to an initial game state. Any information is set to its initial
-		state, the tiles are all set to empty, and then two new starter tiles are randomly generated
-		(see the add_tile method below).
-		"""
-		self.matrix = [[None for _ in range(self.column)] for _ in range(self.column)]
-		self.add_tile()
-		self.add_tile()
-		self.score = 0
-		self.undo_remained = 3
-		self.history = list()
-		self.undoable_move = list()
-		self.record()
-
-	def get_tiles(self) -> list[list[Optional[int]]]:
-		"""
-		Return the current tiles matrix. Each internal list represents a row of the grid, ordered from
-		top to bottom. Each item in each row list is the integer value on the tile occupying that
-		space, or None if no tile is occupying that space.
-		"""
-		return self.matrix
-
-	def add_tile(self) -> None:
-		"""
-		Randomly generate a new tile at an empty location (you must use generate_tile for this)
-		and add it to the current tiles matrix.
-		"""
-		(position, number) = generate_tile(self.matrix)
-		row = position[0]
-		col = position[1]
-		self.matrix[row][col] = number
-
-	def move_left(self) -> None:
-		"""
-		Moves all tiles to their left extreme, merging where necessary. This involves stacking all tiles
-		to the left, merging to the left, and then restacking to the left to fill in any gaps created. If
-		you are keeping track of a score (see Task 2), this method should also add any points gained
-		from the history to the total score.
-		"""
-		#stack left -> combine left -> stack left
-		combined = combine_left(stack_left(self.matrix))
-		self.matrix = stack_left(combined[0])
-		self.score += combined[1]
-
-	def move_right(self) -> None: 
-		"""
-		Moves all tiles to their right extreme, merging where neces-
-		sary. This can be achieved by reversing the tiles matrix, moving left, and then reversing
-		the matrix again. If you are keeping track of a score (see Task 2), this method should also
-		result in gained points being added to the total score.
-		"""
-		#reverse -> history left -> reverse
-		self.matrix = reverse(self.matrix)
-		self.move_left()
-		self.matrix = reverse(self.matrix)
-
-	def move_up(self) -> None:
-		"""
-		Moves all tiles to their top extreme, merging where necessary. This can be achieved by
-		transposing the tiles matrix, moving left, and then transposing the matrix again. If you are
-		keeping track of a score (see Task 2), this method should also result in gained points being
-		added to the total score.
-		"""
-		#transpose -> history left -> transpose
-		self.matrix = transpose(self.matrix)
-		self.move_left()
-		self.matrix = transpose(self.matrix)
-
-	def move_down(self) -> None:
-		"""
-		Moves all tiles to their bottom extreme, merging where necessary. This can be achieved by
-		transposing the tiles matrix, moving right, and then transposing the matrix again. If you
-		are keeping track of a score (see Task 2), this method should also result in gained points
-		being added to the total score.
-		"""
-		#transpose -> history right -> transpose
-		self.matrix = transpose(self.matrix)
-		self.move_right()
-		self.matrix = transpose(self.matrix)
-
-	def attempt_move(self, history: str) -> bool:
-		"""
-		Makes the appropriate history according to the history string provided. Returns True if the
-		history resulted in a change to the game state, else False. The history provided must be one
-		of wasd (this is a pre-condition, not something that must be handled within this method).
-		"""
-
-		if len(self.undoable_move) >= 3:
-			del(self.undoable_move[0])
-			self.undoable_move.append(self.history[-1])
-		else:
-			self.undoable_move.append(self.history[-1])
-		
-		if history in ['Up', 'w', 'Down', 's', 'Left', 'a', 'Right', 'd']:
-			if history in ['Up', 'w']:    
-				self.move_up()
-			elif history in ['Down', 's']:  
-				self.move_down()
-			elif history in ['Left', 'a']: 
-				self.move_left()
-			elif history in ['Right', 'd']:
-				self.move_right()
-			return True
-		return False
-	
-	def has_won(self) -> bool:
-		"""
-		Returns True if the game has been won, else False. The game has been won if a 2048 tile
-		exists on the grid.
-		"""
-		#Winning condition
-		if 2048 in [i for li in self.matrix for i in li]:
-			return True
-		return False
-
-	def has_lost(self) -> bool:
-		"""
-		Returns True if the game has been lost, else False. The game has been lost if there are
-		no remaining empty places in the grid, but no history would result in a change to the game
-		state.
-		"""
-		matrix = self.matrix
-		column = self.column
-		if None in [i for li in matrix for i in li]:
-			return False
-
-		for row in range(column):
-			for col in range(column-1):
-				if matrix[row][col] == matrix[row][col+1]:
-					return False
-
-		for row in range(column-1):
-			for col in range(column):
-				if matrix[row][col] == matrix[row+1][col]:
-					return False
-		return True
-
-	def prev_step(self):
-		if self.history !=[]:
-			#get the latest data
-			prev_data = self.undoable_move.pop()
-			self.score = prev_data['score']
-			self.matrix = prev_data['matrix']
-
-	def record(self):
-		prev_step = {
-				'score': self.score,
-				'matrix': self.cheat_copy(self.matrix),
-			}
-		self.history.append(prev_step)
-
-	def cheat_copy(self, original):
-		return [item[:] for item in original]
-
-	def	get_score(self) -> int: 
-		"""
-		Returns the current score for the game. Each time a new tile is
-		created by a merge, its new value should be added to the score. The total score to be added
-		after a merge is calculated for you by the combine_left function in a3_support.py.
-		"""
-		return self.score
-
-	def get_undos_remaining(self) -> int: 
-		"""
-		Get the number of undos the player has remaining.
-		This should start at 3 at the beginning of a new game, and reduce each time an undo is
-		used.
-		"""
-		return self.undo_remained
-
-	def use_undo(self) -> None: 
-		"""
-		Attempts to undo the previous history, returning the current tiles
-		to the previous tiles state before the last history that made changes to the tiles matrix. If the
-		player does not have any undos remaining, or they are back at the initial state, this method
-		should do nothing.
-		"""
-		if self.undo_remained > 0:
-			self.undo_remained -= 1
-			self.prev_step()
-		else:
-			return None
+import bitboard
+import hint
+import instrument
+import sprites
+#The game model lives in core.py so it can be used without Tk
+from core import UndoHistory, UNDO, MOVE_KEYS, Model, BitboardModel
+
+#Key presses beyond this many waiting to be applied are dropped
+MAX_QUEUED_MOVES = 8
+#Views the Game repaints, and the shortest time between two repaints
+GRID = 'grid'
+STATUS = 'status'
+FRAME_SECONDS = 1/60
+#Tile animations: milliseconds per frame, frames for a slide and for a merge pop, and how many
+#pixels a merged tile grows by at the start of its pop
+ANIMATION_FRAME_MS = 16
+SLIDE_FRAMES = 6
+POP_FRAMES = 4
+POP_GROW = 6
+#Milliseconds between checks for the hint engine's answer, the key that asks for a hint, and the
+#arrow shown for each suggested direction
+HINT_POLL_MS = 50
+HINT_KEY = 'h'
+HINT_ARROWS = {LEFT: '\u2190', UP: '\u2191', DOWN: '\u2193', RIGHT: '\u2192'}
 
 class StatusBar(tk.Frame):
 	"""
@@ -255,9 +74,15 @@ class StatusBar(tk.Frame):
 		#Create the buttons
 		self.reset_bot = tk.Button(button_list, text='New Game', bg='#f5ebe4', font=('Arial bold', 10))
 		self.undo_bot = tk.Button(button_list, text='Undo Move', bg='#f5ebe4', font=('Arial bold', 10))
+		self.hint_bot = tk.Button(button_list, text='Hint', bg='#f5ebe4', font=('Arial bold', 10))
+		#Label for the suggested direction
+		self.hint = tk.Label(button_list, fg=COLOURS[None], font=('Arial bold', 20), width=2, text='')
+		self._hint_text = ''
 		#Pack the buttons
 		self.reset_bot.grid(row=1, padx=10, pady=3)
 		self.undo_bot.grid(row=2, padx=10, pady=3)
+		self.hint_bot.grid(row=3, padx=10, pady=3)
+		self.hint.grid(row=1, column=1, rowspan=3)
 		button_list.pack(side=tk.RIGHT)
 		self.pack(side=tk.BOTTOM)
 
@@ -268,11 +93,10 @@ class StatusBar(tk.Frame):
 		"""
 		#Change the text of counters
 		self.score.config(text=str(score))
-		self.score.update()
 		self.remaining_undo.config(text=str(undos))
-		self.remaining_undo.update()
 
-	def set_callbacks(self, new_game_command: callable, undo_command: callable) -> None:
+	def set_callbacks(self, new_game_command: callable, undo_command: callable,
+			hint_command: Optional[callable] = None) -> None:
 
 		"""
 		Sets the commands for the new game and undo buttons to the given commands. 
@@ -281,35 +105,71 @@ class StatusBar(tk.Frame):
 		#Set the callback reference
 		self.reset_bot.config(command=new_game_command)
 		self.undo_bot.config(command=undo_command)
+		if hint_command is not None:
+			self.hint_bot.config(command=hint_command)
+
+	def show_hint(self, text: str) -> None:
+		"""
+		Shows the suggested direction (an arrow, '...' while still searching), or nothing if text
+		is empty.
+		"""
+		#Skip the repaint when nothing changed, as this runs on every move
+		if text == self._hint_text:
+			return
+		self._hint_text = text
+		self.hint.config(text=text, bg=COLOURS[2] if text else self.cget('bg'))
 
 class GameGrid(tk.Canvas):
 	"""
 	The GameGrid is a view class which inherits from tk.Canvas and represents the 4x4 grid. On
-	the GameGrid canvas, tiles should be drawn using a combination of the create_rectangle and
-	create_text method on self. You should not create a new tk.Canvas instance as an attribute
-	within this class; doing so will cause the Gradescope tests to report that your GameGrid canvas
-	contains no items.
+	the GameGrid canvas, the empty board is a single create_image item, and each tile is a single
+	create_image item on top of it showing a pre-rendered sprite (see sprites.py). You should not create a new
+	tk.Canvas instance as an attribute within this class; doing so will cause the Gradescope tests
+	to report that your GameGrid canvas contains no items.
 	"""
-	def __init__(self, root:tk.Tk, **kwargs) -> None:
+	def __init__(self, root:tk.Tk, rows: int = NUM_ROWS, cols: int = NUM_COLS, **kwargs) -> None:
 		"""
 		Sets up a new GameGrid in the master window. **kwargs is used to allow GameGrid to
 		support any named arguments supported by tk.Canvas. The canvas should be 400 pixels
-		wide and 400 pixels tall.
-		"""
-		canvas_size = 400
-		self.data = Model()
-		self.column = self.data.column
-		self.space_size = 10
-		self.cell_size = 87.5
+		wide and 400 pixels tall for the standard 4x4 grid. Other grid sizes keep square cells and
+		fit within the same area, with the tile numbers scaled to the cell size.
+		"""
+		#Packed, so has_won and has_lost are lookups. The win prompt ends the game at WIN_TILE, long
+		#before two bitboard.MAX_TILE tiles could need merging
+		self.data = BitboardModel(rows=rows, cols=cols)
+		self.rows = rows
+		self.cols = cols
+		self.space_size = BUFFER
+		#87.5 pixels for a 4x4 grid
+		self.cell_size = min(
+			(BOARD_WIDTH - (cols + 1)*self.space_size) / cols,
+			(BOARD_HEIGHT - (rows + 1)*self.space_size) / rows
+		)
+		#Width and height of the tile sprites, 88 pixels for a 4x4 grid
+		self.sprite_size = round(self.cell_size)
 		self._root = self.init_root(root)
 		#Initialization for the canvas
 		super().__init__(
 			self._root,
-			width = canvas_size,
-			height = canvas_size,
+			width = cols*self.cell_size + (cols + 1)*self.space_size,
+			height = rows*self.cell_size + (rows + 1)*self.space_size,
 			**kwargs,
 			bg = BACKGROUND_COLOUR
 		)
+		#Tile sprites by (value, size), shared by every cell, and the image of the empty board
+		self.sprites = sprites.SpriteCache(self)
+		self._board_image = None
+		#Canvas image item for each (row, col) cell, the value each one currently shows and the
+		#sprite it shows, kept so the image lives on even if the cache evicts it
+		self._tiles = {}
+		self._rendered = {}
+		self._images = {}
+		#The running animation's after() job, the tiles to show once its slide is done and the
+		#cells popping after it
+		self._animation_job = None
+		self._sliding = False
+		self._pending_tiles = None
+		self._popping = []
 		
 	def init_root(self, root:tk.Tk):
 		#Modify the attributes of the root
@@ -355,56 +215,158 @@ class GameGrid(tk.Canvas):
 		y = (y_min + y_max) // 2
 		return x, y
 
-	#Unused function
 	def clear(self) -> None:
 		"""
-		Clears all items.
+		Clears all items. The cells are created again on the next redraw.
 		"""
-		pass
+		if self._animation_job is not None:
+			self.after_cancel(self._animation_job)
+		self._animation_job = None
+		self._sliding = False
+		self._pending_tiles = None
+		self._popping = []
+		self.delete("all")
+		self._tiles = {}
+		self._rendered = {}
+		self._images = {}
 
-	def redraw(self, tiles: list[list[Optional[int]]]) -> None:
+	def _create_cells(self) -> None:
 		"""
-		Clears and redraws the entire grid based on the given tiles.
+		Create the empty board and the tile image item for every cell. The image items are reused
+		by redraw, which only swaps the sprite they show, instead of being recreated on every move.
 		"""
-		#Draw the grid
-		self.delete("all")
-		for row in range(4):
-			for col in range(4):
+		#Empty cells underneath, showing wherever there is no tile
+		self._draw_board()
+		for row in range(self.rows):
+			for col in range(self.cols):
 				position = (row, col)
-				if tiles[row][col] == None:
-					self._draw_box(position)
-				else:
-					self._draw_box(position, COLOURS[tiles[row][col]])
-					self._draw_number(position, tiles[row][col])
-					
-	def _draw_box(self, position: tuple[int, int], colour = COLOURS[None]) -> None:
+				self._tiles[position] = self._draw_tile(position)
+				self._rendered[position] = None
+				self._images[position] = None
+
+	def redraw(self, tiles: list[list[Optional[int]]]) -> None:
 		"""
-		Draw the <row, col> box.
+		Redraws the grid based on the given tiles, updating only the cells whose value changed
+		since the last redraw.
+		"""
+		if self._sliding:
+			#Shown once the tiles have slid into place
+			self._pending_tiles = tiles
+			return
+		if not self._tiles:
+			self._create_cells()
+		rendered = self._rendered
+		for row in range(self.rows):
+			for col in range(self.cols):
+				position = (row, col)
+				number = tiles[row][col]
+				if rendered[position] == number:
+					continue
+				rendered[position] = number
+				self._show_sprite(position, self.sprite_size)
+
+	def _show_sprite(self, position: tuple[int, int], size: int) -> None:
+		"""
+		Shows the sprite of the given size for the value rendered at position, or nothing for an
+		empty cell.
+		"""
+		number = self._rendered[position]
+		image = None if number is None else self.sprites.get(number, size)
+		self._images[position] = image
+		self.itemconfig(self._tiles[position], image='' if image is None else image)
+
+	def animate(self, motion: list[bitboard.Motion], tiles: list[list[Optional[int]]]) -> None:
+		"""
+		Slides tiles from their source to their destination cells as given by motion (see
+		Engine.motion), then shows the given tiles and pops the cells where tiles merged. The grid
+		must still be showing the tiles from before the move. The existing canvas items are moved
+		rather than recreated, and go back to their own cells when the animation ends or is
+		cancelled.
+		"""
+		self.cancel_animation()
+		if not self._tiles:
+			self._create_cells()
+		step = self.cell_size + self.space_size
+		slides = []
+		for source, destination, merged in motion:
+			item = self._tiles[source]
+			#Keep sliding tiles above the ones standing still
+			self.tag_raise(item)
+			dx = (destination[1] - source[1])*step / SLIDE_FRAMES
+			dy = (destination[0] - source[0])*step / SLIDE_FRAMES
+			slides.append((item, dx, dy))
+		pops = sorted({destination for _, destination, merged in motion if merged})
+		self._sliding = True
+		self._pending_tiles = tiles
+		self._animation_job = self.after(ANIMATION_FRAME_MS, self._slide_frame, slides, pops, 1)
+
+	def _slide_frame(self, slides: list, pops: list[tuple[int, int]], frame: int) -> None:
+		for item, dx, dy in slides:
+			self.move(item, dx, dy)
+		if frame < SLIDE_FRAMES:
+			self._animation_job = self.after(ANIMATION_FRAME_MS, self._slide_frame, slides, pops, frame + 1)
+			return
+		self._end_slide()
+		self._popping = pops
+		self._pop_frame(pops, 0)
+
+	def _pop_frame(self, pops: list[tuple[int, int]], frame: int) -> None:
+		#The sprites for each grown size are cached like any other
+		grow = round(POP_GROW*(POP_FRAMES - frame) / POP_FRAMES)
+		for position in pops:
+			self._show_sprite(position, self.sprite_size + 2*grow)
+		if frame < POP_FRAMES:
+			self._animation_job = self.after(ANIMATION_FRAME_MS, self._pop_frame, pops, frame + 1)
+		else:
+			self._animation_job = None
+			self._popping = []
+
+	def _end_slide(self) -> None:
 		"""
-		x_min, y_min, x_max, y_max = self._get_bbox(position)
-		box = self.create_rectangle(
-			x_min, y_min,
-			x_max, y_max,
-			#Fill the boxes with the colour according to number
-			fill=colour,
-			#Hide the outline
-			outline=colour,
-			width=1
-		)
-		
-	def _draw_number(self, position: tuple[int, int], number: int) -> None:
+		Puts every item back in its own cell and shows the tiles waiting for the slide.
+		"""
+		self._sliding = False
+		for position, item in self._tiles.items():
+			self.coords(item, *self._get_midpoint(position))
+		tiles, self._pending_tiles = self._pending_tiles, None
+		if tiles is not None:
+			self.redraw(tiles)
+
+	def cancel_animation(self) -> None:
+		"""
+		Stops the running animation, if any, jumping straight to its final state.
+		"""
+		if self._animation_job is None:
+			return
+		self.after_cancel(self._animation_job)
+		self._animation_job = None
+		if self._sliding:
+			self._end_slide()
+		else:
+			#Mid-pop, so shrink the popping tiles back
+			for position in self._popping:
+				self._show_sprite(position, self.sprite_size)
+			self._popping = []
+
+	def _draw_board(self) -> int:
 		"""
-		Draw <number> in the <row, col> box.
+		Draw the background and every empty cell as one image item and return its canvas item id.
+		"""
+		if self._board_image is None:
+			cells = [tuple(round(edge) for edge in self._get_bbox((row, col)))
+				for row in range(self.rows) for col in range(self.cols)]
+			self._board_image = sprites.render_board(self, round(float(self['width'])),
+				round(float(self['height'])), cells)
+		return self.create_image(0, 0, anchor=tk.NW, image=self._board_image)
+
+	def _draw_tile(self, position: tuple[int, int]) -> int:
+		"""
+		Draw an empty image item centred on the <row, col> cell and return its canvas item id. It
+		is given a sprite once the cell has a tile.
 		"""
 		x, y = self._get_midpoint(position)
-		num = self.create_text(
-			x, y,
-			text=str(number),
-			#Use the given font
-			font=TILE_FONT,
-			fill=FG_COLOURS[number]
-		)
-		
+		return self.create_image(x, y, anchor=tk.CENTER)
+
 class Game():
 	"""
 	You must implement a class for the controller, called Game. This class should be instantiated in
@@ -412,22 +374,44 @@ class Game():
 	for maintaining the model and view classes, binding some event handlers, and facilitating com-
 	munication between model and view classes.
 	"""
-	def __init__(self, master: tk.Tk) -> None:
+	def __init__(self, master: tk.Tk, rows: int = NUM_ROWS, cols: int = NUM_COLS,
+			profile: bool = False, animate: bool = True, weights: Optional[str] = None) -> None:
 		"""
 		Constructs a new 2048 game. This method should create a Model instance, set the window
 		title, create the title label and create instances of any view classes packed into master. It
 		should also bind key press events to an appropriate handler, and cause the initial GUI to
-		be drawn.
+		be drawn. If profile is True, each stage of a key press is timed into self.profiler and F3
+		toggles an overlay showing the latencies. If animate is True, tiles slide into place. Hints
+		are searched with the evaluation weights in the weights file, if given (see tune.py).
 		"""
 		self.root = master
-		self.view = GameGrid(self.root)
+		self.profiler = instrument.Profiler(enabled=profile)
+		self.overlay = None
+		#Moves waiting to be applied, and the pending after() jobs
+		self._queued_moves = []
+		self._process_job = None
+		self._spawn_job = None
+		#Views waiting to be repainted, and the pending render job
+		self._dirty = set()
+		self._render_job = None
+		self._last_render = 0.0
+		#How the tiles slid in the move the next render shows, if it is to be animated
+		self._motion = None
+		#Searches for the best move in the background; its answer for the current board, whether
+		#the player is waiting for it, and the pending poll for it
+		self.hints = hint.HintEngine(weights)
+		self._hint = None
+		self._hint_wanted = False
+		self._hint_job = None
+		self.view = GameGrid(self.root, rows, cols)
 		self.status = StatusBar(self.root)
 		#Add attributes to the StatusBar instance
 		self.status.config(padx=20, pady=20)
 		#Set the callback function
-		self.status.set_callbacks(self.start_new_game, self.undo_previous_move)
+		self.status.set_callbacks(self.start_new_game, self.undo_previous_move, self.show_hint)
 		#Use the same Model() data
 		self.data = self.view.data
+		self.data.track_motion = animate
 		#Create top-level menu
 		self.menu = tk.Menu(self.root)
 		#Second-level menu
@@ -447,46 +431,169 @@ class Game():
 		"""
 		Start a new game
 		"""
+		self.cancel_input()
 		self.data.new_game()
-		self.status.redraw_infos(self.data.get_score(), self.data.get_undos_remaining())
-		self.view.redraw(self.data.get_tiles())
+		self.draw()
+		self.redraw_infos()
+		self.search_hint()
 
 	def undo_previous_move(self):
-		if self.data.get_undos_remaining() == 3:
-			self.data.history.pop()
+		#Apply everything pressed before the undo first, so it undoes the last of them
+		if self._process_job is not None:
+			self.root.after_cancel(self._process_job)
+			self.process_moves()
+		self.complete_spawn()
 		self.data.use_undo()
-		self.status.redraw_infos(self.data.get_score(), self.data.get_undos_remaining())
-		self.view.redraw(self.data.get_tiles())
+		self.draw()
+		self.redraw_infos()
+		self.search_hint()
 
 	def draw(self) -> None:
 		"""
-		Redraws any view classes based on the current model state.
+		Redraws the grid based on the current model state, on the next frame.
 		"""
-		self.view.redraw(self.data.get_tiles())
+		self._motion = None
+		self.mark_dirty(GRID)
 
-	def attempt_move(self, event: tk.Event) -> None:
+	def redraw_infos(self) -> None:
+		"""
+		Redraws the status bar based on the current model state, on the next frame.
+		"""
+		self.mark_dirty(STATUS)
+
+	def mark_dirty(self, *views: str) -> None:
+		"""
+		Marks views (GRID or STATUS) as needing a repaint. Dirty views are repainted together once
+		Tk is idle, at most once per frame, so any number of changes in between cost one repaint.
 		"""
-		Attempt a history if the event represents a key press on character ‘a’, ‘w’, ‘s’, or ‘d’. Once
-		a history has been made, this method should redraw the view, display the appropriate mes-
-		sagebox if the game has been won, or create a new tile after 150ms if the game has not been
-		won.
+		self._dirty.update(views)
+		if GRID in views:
+			#The board changed, so the hint for the old board no longer applies
+			self.clear_hint()
+		if self._render_job is None:
+			wait = self._last_render + FRAME_SECONDS - time.perf_counter()
+			if wait > 0:
+				self._render_job = self.root.after(math.ceil(wait*1000), self.render)
+			else:
+				self._render_job = self.root.after_idle(self.render)
+
+	def render(self) -> None:
 		"""
-		ans = self.data.attempt_move(event.keysym)
-		#Valid movement
-		if ans == True:	
-			self.new_tile()
+		Repaints the dirty views now.
+		"""
+		if self._render_job is not None:
+			self.root.after_cancel(self._render_job)
+			self._render_job = None
+		dirty, self._dirty = self._dirty, set()
+		if GRID in dirty:
+			motion, self._motion = self._motion, None
+			with self.profiler.timed('redraw'):
+				if motion:
+					self.view.animate(motion, self.data.get_tiles())
+				else:
+					self.view.redraw(self.data.get_tiles())
+		if STATUS in dirty:
+			with self.profiler.timed('redraw_infos'):
+				self.status.redraw_infos(self.data.get_score(), self.data.get_undos_remaining())
+		self._last_render = time.perf_counter()
+
+	def attempt_move(self, event: tk.Event) -> None:
+		"""
+		Queue a history if the event represents a key press on character ‘a’, ‘w’, ‘s’, or ‘d’. Queued
+		moves are applied once Tk has handled the key presses already waiting, so a burst of keys
+		is processed in one pass and only the final state is redrawn.
+		"""
+		if event.keysym not in MOVE_KEYS:
+			return
+		#Never make the player wait for an animation
+		self.view.cancel_animation()
+		if len(self._queued_moves) < MAX_QUEUED_MOVES:
+			self._queued_moves.append(event.keysym)
+		if self._process_job is None:
+			self._process_job = self.root.after_idle(self.process_moves)
+
+	def process_moves(self) -> None:
+		"""
+		Applies the queued moves in order. A tile still waiting for its 150ms delay is added first,
+		and every move but the last is applied together with its new tile, so tiles always land in
+		the order the moves were made. The last move gets its new tile after 150ms as usual. The
+		views are redrawn once, at the end, whenever the board changed, even if every queued move
+		turned out not to move anything.
+		"""
+		self._process_job = None
+		moves, self._queued_moves = self._queued_moves, []
+		#A single move can be animated if the grid still shows the board from before it
+		can_animate = len(moves) == 1 and GRID not in self._dirty
+		spawned = self.complete_spawn()
+		if spawned and self.game_over():
+			#The pending tile ended the game, so the queued moves are dropped
 			self.draw()
-			self.status.redraw_infos(self.data.get_score(), self.data.get_undos_remaining())
+			self.judge()
+			return
+		moved = False
+		for index, direction in enumerate(moves):
+			if index < len(moves) - 1:
+				with self.profiler.timed('attempt_move'):
+					if not self.data.play(direction):
+						continue
+				moved = True
+				if self.game_over():
+					self.draw()
+					self.redraw_infos()
+					self.judge()
+					return
+			else:
+				with self.profiler.timed('attempt_move'):
+					ans = self.data.attempt_move(direction)
+				#Valid movement
+				if ans == True:
+					moved = True
+					self.new_tile()
+		if moved or spawned:
+			self.draw()
+			self.redraw_infos()
+			if moved and can_animate:
+				self._motion = self.data.last_motion
+			#Without a new tile still to come, the board has settled and draw_tile will not run
+			if self._spawn_job is None:
+				self.search_hint()
 
-	def draw_tile(self):
+	def game_over(self) -> bool:
+		return self.data.has_won() or self.data.has_lost()
+
+	def spawn_tile(self) -> bool:
+		"""
+		Adds the new tile for the last move, if there is space. Returns True if a tile was added.
+		"""
+		self._spawn_job = None
 		#Only create new tile when there is a spare space
-		if None in [i for li in self.data.matrix for i in li]:
+		if not self.data.has_empty():
+			return False
+		with self.profiler.timed('spawn'):
 			self.data.add_tile()
+		return True
+
+	def complete_spawn(self) -> bool:
+		"""
+		Adds the pending new tile now, without waiting for the rest of its delay. Returns True if a
+		tile was added.
+		"""
+		if self._spawn_job is None:
+			return False
+		self.root.after_cancel(self._spawn_job)
+		return self.spawn_tile()
+
+	def draw_tile(self):
+		if self.spawn_tile():
 			self.draw()
-			#Judging win or lost
-			self.judge()
-			#Record the changes
-			self.data.record()
+			#Judging win or lost, timing the checks but not the time spent on a dialog
+			with self.profiler.timed('judge'):
+				over = self.game_over()
+			if over:
+				self.judge()
+			else:
+				#Look for the next move while the player thinks about it
+				self.search_hint()
 
 	def new_tile(self) -> None: 
 		"""
@@ -495,28 +602,103 @@ class Game():
 		appropriate messagebox displaying the LOSS_MESSAGE.
 		"""
 		#Add a delay on GUI
-		self.root.after(150, self.draw_tile)		
+		self._spawn_job = self.root.after(150, self.draw_tile)
+
+	def cancel_input(self) -> None:
+		"""
+		Drops any queued moves and the pending new tile, when the game is replaced.
+		"""
+		self._queued_moves = []
+		for job in (self._process_job, self._spawn_job):
+			if job is not None:
+				self.root.after_cancel(job)
+		self._process_job = None
+		self._spawn_job = None
+
+	def search_hint(self) -> None:
+		"""
+		Starts the hint engine on the current board, replacing any search already running, and
+		polls for its answer.
+		"""
+		self.clear_hint()
+		self.hints.submit(self.data.pack(), self.data.rows, self.data.cols)
+		if self._hint_job is None:
+			self._hint_job = self.root.after(HINT_POLL_MS, self.poll_hint)
+
+	def clear_hint(self) -> None:
+		"""
+		Forgets the hint for the board, cancelling its search. The player's request for a hint is
+		kept, so it is answered for the next board.
+		"""
+		self.hints.cancel()
+		self._hint = None
+		if self._hint_wanted:
+			self.status.show_hint('...')
+		else:
+			self.status.show_hint('')
+
+	def poll_hint(self) -> None:
+		"""
+		Takes the hint engine's answer if it has arrived, never waiting for it, and polls again
+		later if it has not.
+		"""
+		self._hint_job = None
+		result = self.hints.poll()
+		if result is not None:
+			self._hint = result[1]
+			if self._hint_wanted:
+				self.display_hint()
+		elif self.hints.pending:
+			self._hint_job = self.root.after(HINT_POLL_MS, self.poll_hint)
+
+	def show_hint(self, event: Optional[tk.Event] = None) -> None:
+		"""
+		Hint button and key handler. Shows the suggested move now if the search has finished, or as
+		soon as it does.
+		"""
+		self._hint_wanted = True
+		if self._hint is not None:
+			self.display_hint()
+		elif not self.hints.pending:
+			#Nothing is searching the current board, e.g. the player asked mid-move
+			if self._spawn_job is None and self._process_job is None and not self.game_over():
+				self.search_hint()
+			self.status.show_hint('...')
+		else:
+			self.status.show_hint('...')
+
+	def display_hint(self) -> None:
+		self._hint_wanted = False
+		self.status.show_hint(HINT_ARROWS.get(self._hint, ''))
 
 	def reset(self) -> None:
+		self.cancel_input()
 		self.data.new_game()
 		self.draw()
+		self.redraw_infos()
+		self.search_hint()
 
 	def judge(self):
+		#Dialogs are only loaded once a game actually needs one
+		import tkinter.messagebox as tkMessageBox
 		if self.data.has_won() == True:
+			#Show the final board behind the message box
+			self.render()
+			self.view.cancel_animation()
 			res = tkMessageBox.askyesno(title="2048", message=WIN_MESSAGE)
 			if res:
 				#Delete the items on background
-				self.view.delete('all')
+				self.view.clear()
 				self.reset()
-				self.view.redraw(self.data.get_tiles())
 			else:
 				self.root.quit()
 		if self.data.has_lost() == True:
+			self.render()
+			self.view.cancel_animation()
 			res = tkMessageBox.askyesno(title="2048", message=LOSS_MESSAGE)
 			if res:
-				self.view.delete('all')
+				self.view.clear()
 				self.reset()
-				self.view.redraw(self.data.get_tiles())
 			else:
 				self.root.quit()
 
@@ -524,11 +706,36 @@ class Game():
 		self.draw()
         #Binding keyboard events
 		self.root.bind('<Key>', self.attempt_move)
+		self.root.bind(f'<KeyPress-{HINT_KEY}>', self.show_hint)
+		#Start on the first board straight away
+		self.search_hint()
+		if self.profiler.enabled:
+			self.root.bind('<F3>', self.toggle_overlay)
+
+	def toggle_overlay(self, event: Optional[tk.Event] = None) -> None:
+		"""
+		Shows or hides the latency overlay over the grid. While shown it refreshes twice a second.
+		"""
+		if self.overlay is not None:
+			self.overlay.destroy()
+			self.overlay = None
+			return
+		self.overlay = tk.Label(self.view, font=('Courier', 9), justify=tk.LEFT, anchor=tk.NW,
+			bg='#000000', fg='#f5ebe4')
+		self.overlay.place(x=0, y=0)
+		self.refresh_overlay()
+
+	def refresh_overlay(self) -> None:
+		if self.overlay is None:
+			return
+		self.overlay.config(text=self.profiler.report())
+		self.root.after(500, self.refresh_overlay)
 
 	def file_menu_quit(self) -> None:
 		"""
 		file_menu -> quit handler
 		"""
+		import tkinter.messagebox as tkMessageBox
 		res = tkMessageBox.askyesno(title="2048", message="Are you sure you want to quit?")
 		if res:
 			self.root.destroy()
@@ -536,40 +743,57 @@ class Game():
 			return None
 	
 	def save_as_file(self) -> None:
+		from tkinter.filedialog import asksaveasfilename
+		import tkinter.messagebox as tkMessageBox
+		import savefile
 		self.saved_files += 1
-		files = [('All Files', '*.*'), ('text files', '*.txt')]
-		file_name = asksaveasfilename(filetypes = files, defaultextension = ".py")
+		files = [('2048 saves', '*.sav'), ('All Files', '*.*')]
+		file_name = asksaveasfilename(filetypes = files, defaultextension = ".sav")
 		#Handle the "Cancel"
 		if file_name:
-			f = open(file_name, "w")
-			f.write("%s=%s\n" %("self.data.matrix", self.data.get_tiles()))
-			f.write("%s=%s\n" %("self.data.score", self.data.get_score()))
-			f.write("%s=%s\n" %("self.data.undo_remained", self.data.get_undos_remaining()))
-			f.write("%s=%s\n" %("self.data.history", self.data.history))
-			f.write("%s=%s\n" %("self.data.undoable_move", self.data.undoable_move))
-			f.close()
+			try:
+				savefile.save(file_name, self.data)
+			except ValueError as e:
+				#Tiles beyond bitboard.MAX_TILE do not fit in the save format
+				tkMessageBox.showerror(title="2048", message=str(e))
 
 	def load_from_file(self) -> None:
-		f = askopenfile(mode ='r', filetypes =[('text files', '*.txt')])
+		from tkinter.filedialog import askopenfilename
+		import tkinter.messagebox as tkMessageBox
+		import savefile
+		file_name = askopenfilename(filetypes = [('2048 saves', '*.sav'), ('All Files', '*.*')])
 		#Handle the "Cancel"
-		if f:
-			self.data.matrix = eval(f.readline().split("=")[-1].strip())
-			self.data.score = int(f.readline().split("=")[-1].strip())
-			self.data.undo_remained = int(f.readline().split("=")[-1].strip())
-			self.data.history =eval(f.readline().split("=")[-1].strip())
-			self.data.undoable_move = eval(f.readline().split("=")[-1].strip())
+		if file_name:
+			try:
+				with savefile.load(file_name) as save_file:
+					save_file.restore(self.data)
+				self.cancel_input()
+			except savefile.SaveFormatError as e:
+				tkMessageBox.showerror(title="2048", message=str(e))
+				return
 			#Resume the game
-			self.data.record()
-			self.status.redraw_infos(self.data.get_score(), self.data.get_undos_remaining())
-			self.view.redraw(self.data.get_tiles())
-			f.close()
+			self.draw()
+			self.redraw_infos()
 
-def play_game(root):
-	game = Game(root)
+def play_game(root, rows: int = NUM_ROWS, cols: int = NUM_COLS, profile: bool = False,
+		weights: Optional[str] = None) -> Game:
+	game = Game(root, rows, cols, profile, weights=weights)
 	game.main()
 	game.view.pack()
+	return game
 
 if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Play 2048.')
+	parser.add_argument('--rows', type=int, default=NUM_ROWS)
+	parser.add_argument('--cols', type=int, default=NUM_COLS)
+	parser.add_argument('--profile', metavar='PATH', default=None,
+		help='time each stage of a key press, press F3 for an overlay, and write the latencies to PATH as JSON on exit')
+	parser.add_argument('--weights', metavar='PATH', default=None,
+		help='evaluation weights file for hints, as written by tune.py')
+	args = parser.parse_args()
 	root = tk.Tk()
-	play_game(root)
+	game = play_game(root, args.rows, args.cols, args.profile is not None, args.weights)
 	root.mainloop()
+	game.hints.close()
+	if args.profile is not None:
+		game.profiler.dump(args.profile)
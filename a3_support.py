@@ -43,15 +43,20 @@ RIGHT = 'd'
 
 NEW_TILE_DELAY = 150
 MAX_UNDOS = 3
+WIN_TILE = 2048
 
 WIN_MESSAGE = 'You won! Would you like to play again?'
 LOSS_MESSAGE = 'You lost :( Play again?'
 
+# The value of a new tile is drawn from these, giving 2 and 4 at 5:1 odds
+NEW_TILE_VALUES = (2, 2, 2, 2, 2, 4)
+
 BOARD_WIDTH = 400
 BOARD_HEIGHT = 400
 BUFFER = 10
 
-def generate_tile(current_tiles: list[list[Optional[int]]]) -> tuple[tuple[int, int], int]:
+def generate_tile(current_tiles: list[list[Optional[int]]],
+                  rng: random.Random = random) -> tuple[tuple[int, int], int]:
     """ Generates a random position for a new tile, and the number (either 2 or
     4) to display on that tile.
 
@@ -61,6 +66,8 @@ def generate_tile(current_tiles: list[list[Optional[int]]]) -> tuple[tuple[int,
                        row), where each element is the number on the tile (or
                        None if no tile exists) at the corresponding row in the
                        column.
+        rng: The random number generator to draw from. Defaults to the global
+             random module.
 
     Returns:
         A tuple containing ((row, column), value), where (row, column) is the
@@ -72,7 +79,7 @@ def generate_tile(current_tiles: list[list[Optional[int]]]) -> tuple[tuple[int,
         for j, tile in enumerate(row):
             if tile is None:
                 candidate_positions.append((i, j))
-    return random.choice(candidate_positions), random.choice([2] * 5 + [4])
+    return rng.choice(candidate_positions), rng.choice(NEW_TILE_VALUES)
 
 def stack_left(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
     """ Moves all tiles as far as possible to the left without merging.
@@ -84,10 +91,11 @@ def stack_left(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
     Returns:
         A copy of the tiles list, in which all the tiles have stacked to the left.
     """
-    stacked_tiles = [[None for _ in range(NUM_COLS)] for _ in range(NUM_ROWS)]
-    for i in range(NUM_ROWS):
+    num_rows, num_cols = len(tiles), len(tiles[0])
+    stacked_tiles = [[None for _ in range(num_cols)] for _ in range(num_rows)]
+    for i in range(num_rows):
         to_fill = 0
-        for j in range(NUM_COLS):
+        for j in range(num_cols):
             if tiles[i][j] is not None:
                 stacked_tiles[i][to_fill] = tiles[i][j]
                 to_fill += 1
@@ -107,8 +115,8 @@ def combine_left(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
     """
     combined_tiles = [row[:] for row in tiles]
     score_added = 0
-    for i in range(NUM_ROWS):
-        for j in range(NUM_COLS - 1):
+    for i in range(len(combined_tiles)):
+        for j in range(len(combined_tiles[i]) - 1):
             if combined_tiles[i][j] is not None and combined_tiles[i][j] == combined_tiles[i][j + 1]:
                 combined_tiles[i][j] *= 2
                 combined_tiles[i][j + 1] = None
@@ -126,10 +134,11 @@ def reverse(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
         A copy of the tiles list, which has been flipped horizontally.
     """
     reversed_tiles = []
-    for i in range(NUM_ROWS):
+    for i in range(len(tiles)):
         reversed_tiles.append([])
-        for j in range(NUM_COLS):
-            reversed_tiles[i].append(tiles[i][3-j])
+        num_cols = len(tiles[i])
+        for j in range(num_cols):
+            reversed_tiles[i].append(tiles[i][num_cols - 1 - j])
     return reversed_tiles
 
 def transpose(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
@@ -140,10 +149,12 @@ def transpose(tiles: list[list[Optional[int]]]) -> list[list[Optional[int]]]:
                represents a row in the grid.
 
     Returns:
-        A copy of the tiles, transposed.
+        A copy of the tiles, transposed. For a grid that is not square, this
+        has as many rows as the original had columns.
     """
-    transposed_tiles = [[None for _ in range(NUM_COLS)] for _ in range(NUM_ROWS)]
-    for i in range(NUM_ROWS):
-        for j in range(NUM_COLS):
+    num_rows, num_cols = len(tiles), len(tiles[0])
+    transposed_tiles = [[None for _ in range(num_rows)] for _ in range(num_cols)]
+    for i in range(num_cols):
+        for j in range(num_rows):
             transposed_tiles[i][j] = tiles[j][i]
     return transposed_tiles
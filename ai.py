@@ -0,0 +1,382 @@
+"""
+Expectimax move search for 2048.
+
+Positions are searched on packed boards from bitboard.py. Max nodes try each
+of LEFT, UP, DOWN and RIGHT; chance nodes average over every empty cell
+receiving a 2 or a 4 with the same 5:1 odds as generate_tile. Leaves are
+scored by a weighted evaluation function computed through per-row lookup
+tables (mapped from the shared tables file when tables.py has built one), and
+results of chance nodes are kept in a bounded transposition table
+so repeated positions are not searched twice.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import bitboard
+import tables
+from a3_support import LEFT, UP, DOWN, RIGHT
+
+DIRECTIONS = (LEFT, UP, DOWN, RIGHT)
+PROB_TWO = 5 / 6
+PROB_FOUR = 1 / 6
+# Chance branches less likely than this are scored without searching further
+PROB_CUTOFF = 1e-4
+# The value of a lost position. It must be below the evaluation of any board
+# that can still move, which the monotonicity penalty can take far negative.
+LOSS_VALUE = -1e9
+
+DEFAULT_WEIGHTS = {
+    'empty': 270.0,
+    'monotonicity': 47.0,
+    'smoothness': 11.0,
+    'corner': 20.0,
+    'merges': 700.0,
+}
+
+
+def load_weights(path: str) -> dict[str, float]:
+    """ Reads evaluation weights from a JSON weights file, as written by
+    save_weights (see tune.py).
+
+    Parameters:
+        path: The weights file.
+
+    Returns:
+        The weights, with any missing from the file taken from
+        DEFAULT_WEIGHTS.
+
+    Raises:
+        ValueError: If the file names a weight the Evaluator does not use.
+    """
+    with open(path) as f:
+        weights = json.load(f)['weights']
+    unknown = set(weights) - set(DEFAULT_WEIGHTS)
+    if unknown:
+        raise ValueError(f'{path}: unknown weights {", ".join(sorted(unknown))}')
+    return {**DEFAULT_WEIGHTS, **{name: float(value) for name, value in weights.items()}}
+
+
+def save_weights(path: str, weights: dict[str, float], **details) -> None:
+    """ Writes evaluation weights to a JSON weights file.
+
+    Parameters:
+        path: The file to write. It is replaced in one step, so a reader
+              never sees it half written.
+        weights: The weights, by DEFAULT_WEIGHTS name.
+        details: Anything else to record alongside them, such as how they
+                 were found.
+    """
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'weights': weights, **details}, f, indent=2)
+        f.write('\n')
+    os.replace(temporary, path)
+
+
+# The per-line features the evaluation weights, in the order _line_features
+# returns them
+LINE_FEATURES = ('empty', 'merges', 'monotonicity', 'smoothness')
+
+
+def _line_features(line: list[int]) -> tuple[int, int, int, int]:
+    """ Measures one row or column of ranks, ordered left to right.
+
+    Returns:
+        A tuple of (empty cells, available merges, monotonicity penalty,
+        smoothness penalty).
+    """
+    empty = line.count(0)
+    merges = 0
+    previous = 0
+    for rank in line:
+        if rank and rank == previous:
+            merges += 1
+        if rank:
+            previous = rank
+    # Penalise lines that go up and down, more so for large tiles
+    increasing = decreasing = 0
+    smoothness = 0
+    for a, b in zip(line, line[1:]):
+        if a > b:
+            decreasing += a ** 4 - b ** 4
+        else:
+            increasing += b ** 4 - a ** 4
+        if a and b:
+            smoothness += abs(a - b)
+    return empty, merges, min(increasing, decreasing), smoothness
+
+
+def shared_tables() -> dict[str, tables.TableData]:
+    """ Builds the line feature tables for the shared tables file (see
+    tables.py).
+
+    Returns:
+        A dict from table name to (array typecode, values).
+    """
+    features = [_line_features([(row >> (4 * i)) & bitboard.MAX_RANK for i in range(4)])
+                for row in range(bitboard.ROW_MASK + 1)]
+    return {f'heuristic/{name}': ('d', values) for name, values in zip(LINE_FEATURES, zip(*features))}
+
+
+class Evaluator:
+    """ Scores a packed board as a weighted sum of hand-picked features:
+    empty cells, monotonicity, smoothness, largest tile in a corner and
+    available merges.
+
+    Everything but the corner term only depends on one line of the board at a
+    time, so it is precomputed for all 65,536 possible lines and a board is
+    scored with 8 table lookups.
+    """
+    def __init__(self, weights: Optional[dict[str, float]] = None) -> None:
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self._line_table = self._build_line_table()
+
+    def _line_score(self, line: list[int]) -> float:
+        """ Scores one row or column of ranks, ordered left to right. """
+        return self._weigh(*_line_features(line))
+
+    def _weigh(self, empty: float, merges: float, monotonicity: float, smoothness: float) -> float:
+        weights = self.weights
+        return (weights['empty'] * empty + weights['merges'] * merges
+                - weights['monotonicity'] * monotonicity
+                - weights['smoothness'] * smoothness)
+
+    def _build_line_table(self) -> list[float]:
+        # The features do not depend on the weights, so they can come from
+        # the shared tables file. Their weighted sum depends on this
+        # evaluator's weights, so it is a list of this process's own
+        mapped = [tables.get(f'heuristic/{name}') for name in LINE_FEATURES]
+        if None not in mapped:
+            empty, merges, monotonicity, smoothness = (self.weights[name] for name in LINE_FEATURES)
+            return [empty * e + merges * m - monotonicity * mono - smoothness * smooth
+                    for e, m, mono, smooth in zip(*mapped)]
+        table = [0.0] * (bitboard.ROW_MASK + 1)
+        for row in range(bitboard.ROW_MASK + 1):
+            line = [(row >> (4 * i)) & bitboard.MAX_RANK for i in range(4)]
+            table[row] = self._line_score(line)
+        return table
+
+    def evaluate(self, board: int) -> float:
+        """ Returns the heuristic value of a packed board. """
+        table = self._line_table
+        mask = bitboard.ROW_MASK
+        t = bitboard.transpose(board)
+        value = (table[board & mask] + table[(board >> 16) & mask]
+                 + table[(board >> 32) & mask] + table[(board >> 48) & mask]
+                 + table[t & mask] + table[(t >> 16) & mask]
+                 + table[(t >> 32) & mask] + table[(t >> 48) & mask])
+        top = bitboard.max_rank(board)
+        corners = (board & 0xF, (board >> 12) & 0xF, (board >> 48) & 0xF, (board >> 60) & 0xF)
+        if top in corners:
+            value += self.weights['corner'] * top
+        return value
+
+
+class TranspositionTable:
+    """ A bounded LRU cache of searched positions.
+
+    Each entry maps a packed board to (depth searched, value). A lookup only
+    hits if the stored search was at least as deep as the one requested.
+    When the table is full the least recently used entry is evicted.
+
+    A symmetric table files every board under its canonical form (see
+    bitboard.canonical), so the 8 rotations and reflections of a position
+    share one entry. That is sound because the value of a position does not
+    change under any of them.
+    """
+    # Rough size of one entry: dict slot, int key and (int, float) tuple
+    ENTRY_BYTES = 200
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: int = 64 * 1024 * 1024,
+                 symmetric: bool = False) -> None:
+        """
+        Parameters:
+            max_entries: The most entries to hold. Derived from max_bytes if
+                         not given.
+            max_bytes: Approximate memory ceiling for the table.
+            symmetric: Share entries between symmetric boards.
+        """
+        self.max_entries = max_entries if max_entries is not None else max_bytes // self.ENTRY_BYTES
+        self.symmetric = symmetric
+        self._entries: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, board: int, depth: int) -> Optional[float]:
+        """ Returns the cached value of board searched to at least depth, or
+        None. """
+        if self.symmetric:
+            board = bitboard.canonical_key(board)
+        entry = self._entries.get(board)
+        if entry is not None and entry[0] >= depth:
+            self._entries.move_to_end(board)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, board: int, depth: int, value: float) -> None:
+        """ Stores the value of board searched to depth. """
+        if self.symmetric:
+            board = bitboard.canonical_key(board)
+        entries = self._entries
+        entries[board] = (depth, value)
+        entries.move_to_end(board)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time budget has run out. """
+
+
+class ExpectimaxSolver:
+    """ Picks moves by depth-limited expectimax search.
+
+    With a time limit, the search deepens one level at a time and returns the
+    best move from the deepest search that finished within the budget.
+    """
+    # How many nodes to visit between checks of the clock
+    CLOCK_INTERVAL = 256
+
+    def __init__(self, depth: int = 3, time_limit: Optional[float] = None,
+                 evaluator: Optional[Evaluator] = None,
+                 table: Optional[TranspositionTable] = None) -> None:
+        """
+        Parameters:
+            depth: The most moves to look ahead.
+            time_limit: Seconds allowed per decision, or None for no limit.
+            evaluator: Scores leaf positions.
+            table: Cache of chance node values, kept between decisions.
+        """
+        self.depth = depth
+        self.time_limit = time_limit
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.table = table if table is not None else TranspositionTable()
+        self.nodes = 0
+        self._deadline: Optional[float] = None
+
+    def _tick(self) -> None:
+        self.nodes += 1
+        if self._deadline is not None and self.nodes % self.CLOCK_INTERVAL == 0:
+            if time.perf_counter() > self._deadline:
+                raise SearchTimeout()
+
+    def _max_node(self, board: int, depth: int, prob: float) -> float:
+        self._tick()
+        best = None
+        for move in bitboard.MOVES.values():
+            new_board, gained = move(board)
+            if new_board == board:
+                continue
+            value = gained + self._chance_node(new_board, depth, prob)
+            if best is None or value > best:
+                best = value
+        # No legal moves, the game is over
+        return best if best is not None else LOSS_VALUE
+
+    def _leaf(self, board: int) -> float:
+        """ Scores a board without searching further. A full board with no
+        merges left is lost, whatever the evaluation makes of it. """
+        if not bitboard.empty_mask(board) and not bitboard.legal_moves(board):
+            return LOSS_VALUE
+        return self.evaluator.evaluate(board)
+
+    def _chance_node(self, board: int, depth: int, prob: float) -> float:
+        if depth <= 0 or prob < PROB_CUTOFF:
+            return self._leaf(board)
+        cached = self.table.get(board, depth)
+        if cached is not None:
+            return cached
+        self._tick()
+        empty = bitboard.empty_mask(board)
+        count = empty.bit_count()
+        if not count:
+            return self._leaf(board)
+        cell_prob = prob / count
+        total = 0.0
+        while empty:
+            low = empty & -empty
+            empty ^= low
+            # low puts a 2 (rank 1) in the empty cell and low << 1 a 4 (rank 2)
+            total += PROB_TWO * self._max_node(board | low, depth - 1, cell_prob * PROB_TWO)
+            total += PROB_FOUR * self._max_node(board | (low << 1), depth - 1, cell_prob * PROB_FOUR)
+        value = total / count
+        self.table.put(board, depth, value)
+        return value
+
+    def _search_root(self, board: int, depth: int) -> Optional[str]:
+        best_value = None
+        best_direction = None
+        for direction in DIRECTIONS:
+            new_board, gained = bitboard.MOVES[direction](board)
+            if new_board == board:
+                continue
+            value = gained + self._chance_node(new_board, depth - 1, 1.0)
+            if best_value is None or value > best_value:
+                best_value = value
+                best_direction = direction
+        return best_direction
+
+    def best_move(self, board: int) -> Optional[str]:
+        """ Finds the best move for a packed board.
+
+        Parameters:
+            board: The packed board.
+
+        Returns:
+            One of LEFT, UP, DOWN or RIGHT, or None if no move is possible.
+        """
+        self.nodes = 0
+        if self.time_limit is None:
+            self._deadline = None
+            return self._search_root(board, self.depth)
+        self._deadline = time.perf_counter() + self.time_limit
+        best = None
+        try:
+            for depth in range(1, self.depth + 1):
+                best = self._search_root(board, depth)
+        except SearchTimeout:
+            pass
+        finally:
+            self._deadline = None
+        if best is None:
+            # Out of time before even one level finished, fall back to any legal move
+            for direction in DIRECTIONS:
+                if bitboard.MOVES[direction](board)[0] != board:
+                    return direction
+        return best
+
+    def suggest(self, model) -> Optional[str]:
+        """ Finds the best move for the current state of a Model.
+
+        Parameters:
+            model: A Model (or BitboardModel) instance with a 4x4 board.
+
+        Returns:
+            One of LEFT, UP, DOWN or RIGHT, or None if no move is possible.
+        """
+        if (model.rows, model.cols) != (4, 4):
+            raise ValueError('expectimax search only supports 4x4 boards')
+        return self.best_move(model.pack())
@@ -0,0 +1,189 @@
+"""
+Vectorized move engine operating on many 2048 boards at once.
+
+Boards are held in an (N, rows, cols) uint8 array of log2 tile values, with 0
+for an empty cell, so a whole batch of boards is moved with a handful of NumPy
+operations instead of a Python loop per cell. The functions here are batched
+counterparts of the ones in a3_support.
+
+This module needs NumPy, which the rest of the game does not.
+"""
+from typing import Optional
+
+import numpy as np
+
+from a3_support import LEFT, UP, DOWN, RIGHT, WIN_TILE
+
+WIN_RANK = WIN_TILE.bit_length() - 1
+
+
+def from_tiles(tiles: list[list[list[Optional[int]]]]) -> np.ndarray:
+    """ Converts a list of tiles matrices into a batch of boards.
+
+    Parameters:
+        tiles: A list of tiles matrices, as returned by Model.get_tiles.
+
+    Returns:
+        An (N, rows, cols) uint8 array of log2 tile values.
+    """
+    boards = np.zeros((len(tiles), len(tiles[0]), len(tiles[0][0])), dtype=np.uint8)
+    for n, matrix in enumerate(tiles):
+        for i, row in enumerate(matrix):
+            for j, tile in enumerate(row):
+                if tile is not None:
+                    boards[n, i, j] = tile.bit_length() - 1
+    return boards
+
+
+def to_tiles(boards: np.ndarray) -> list[list[list[Optional[int]]]]:
+    """ Converts a batch of boards back into a list of tiles matrices.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+
+    Returns:
+        A list of tiles matrices, with None for empty cells.
+    """
+    return [[[1 << int(rank) if rank else None for rank in row] for row in board]
+            for board in boards]
+
+
+def stack_left(boards: np.ndarray) -> np.ndarray:
+    """ Moves all tiles on every board as far as possible to the left without
+    merging.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+
+    Returns:
+        A new array in which all the tiles have stacked to the left.
+    """
+    order = np.argsort(boards == 0, axis=2, kind='stable')
+    return np.take_along_axis(boards, order, axis=2)
+
+
+def combine_left(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Merges tiles to the left on every board.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+
+    Returns:
+        A tuple containing a new array in which merges have been made to the
+        left, and an (N,) int64 array of the score gained on each board.
+    """
+    combined = boards.copy()
+    scores = np.zeros(len(boards), dtype=np.int64)
+    for j in range(boards.shape[2] - 1):
+        left = combined[:, :, j]
+        right = combined[:, :, j + 1]
+        merge = (left != 0) & (left == right)
+        left += merge
+        right[merge] = 0
+        scores += np.where(merge, np.left_shift(1, left.astype(np.int64)), 0).sum(axis=1)
+    return combined, scores
+
+
+def reverse(boards: np.ndarray) -> np.ndarray:
+    """ Flips every board horizontally.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+
+    Returns:
+        A flipped copy of the boards.
+    """
+    return boards[:, :, ::-1].copy()
+
+
+def transpose(boards: np.ndarray) -> np.ndarray:
+    """ Transposes every board.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+
+    Returns:
+        A transposed copy of the boards.
+    """
+    return boards.transpose(0, 2, 1).copy()
+
+
+def _move_left(boards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    combined, scores = combine_left(stack_left(boards))
+    return stack_left(combined), scores
+
+
+def move(boards: np.ndarray, direction: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Applies the same move to every board.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+        direction: One of LEFT, UP, DOWN or RIGHT.
+
+    Returns:
+        A tuple containing the moved boards, an (N,) array of the score gained
+        on each board, and an (N,) bool mask of the boards the move changed.
+    """
+    if direction == LEFT:
+        moved, scores = _move_left(boards)
+    elif direction == RIGHT:
+        moved, scores = _move_left(boards[:, :, ::-1])
+        moved = moved[:, :, ::-1]
+    elif direction == UP:
+        moved, scores = _move_left(boards.transpose(0, 2, 1))
+        moved = moved.transpose(0, 2, 1)
+    elif direction == DOWN:
+        moved, scores = _move_left(boards.transpose(0, 2, 1)[:, :, ::-1])
+        moved = moved[:, :, ::-1].transpose(0, 2, 1)
+    else:
+        raise ValueError(f'unknown direction {direction!r}')
+    moved = np.ascontiguousarray(moved)
+    changed = (moved != boards).any(axis=(1, 2))
+    return moved, scores, changed
+
+
+def generate_tile(boards: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """ Adds a 2 or 4 tile at a random empty cell on every board that has one,
+    with the same 5:1 odds as a3_support.generate_tile.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+        rng: The generator to draw from, defaulting to a fresh one.
+
+    Returns:
+        A new array with the tiles added. Full boards are left unchanged.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    flat = boards.reshape(len(boards), -1).copy()
+    empty = flat == 0
+    # Give every empty cell a random key and pick the largest per board
+    keys = np.where(empty, rng.random(flat.shape), -1.0)
+    positions = keys.argmax(axis=1)
+    has_space = empty.any(axis=1)
+    ranks = np.where(rng.integers(0, 6, len(boards)) == 0, 2, 1).astype(np.uint8)
+    rows = np.nonzero(has_space)[0]
+    flat[rows, positions[rows]] = ranks[rows]
+    return flat.reshape(boards.shape)
+
+
+def has_won(boards: np.ndarray, win_rank: int = WIN_RANK) -> np.ndarray:
+    """ Returns an (N,) bool mask of the boards holding a winning tile.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+        win_rank: The log2 of the winning tile, 11 for 2048.
+    """
+    return (boards >= win_rank).any(axis=(1, 2))
+
+
+def has_lost(boards: np.ndarray) -> np.ndarray:
+    """ Returns an (N,) bool mask of the boards on which no move is possible.
+
+    Parameters:
+        boards: An (N, rows, cols) array of log2 tile values.
+    """
+    full = (boards != 0).all(axis=(1, 2))
+    horizontal = (boards[:, :, :-1] == boards[:, :, 1:]).any(axis=(1, 2))
+    vertical = (boards[:, :-1, :] == boards[:, 1:, :]).any(axis=(1, 2))
+    return full & ~horizontal & ~vertical
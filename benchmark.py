@@ -0,0 +1,273 @@
+"""
+Benchmark suite for the 2048 engine, model and view.
+
+Each benchmark runs a small operation many times and reports the best
+per-call time over several repeats, in microseconds. Results are printed as
+JSON and can be compared against a stored baseline, failing if any benchmark
+got slower by more than a threshold.
+
+Usage:
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Optional
+
+import a3_support
+import bitboard
+import simulate
+from core import Model, BitboardModel
+from a3_support import LEFT, UP, DOWN, RIGHT
+
+# A mid-game board with merges available in every direction
+MID_GAME = [
+    [2, 2, 4, None],
+    [8, 4, 4, 2],
+    [None, 16, 16, 32],
+    [64, None, 2, 2],
+]
+# Full boards: one with no moves left and one that can still merge
+LOST = [
+    [2, 4, 2, 4],
+    [4, 2, 4, 2],
+    [2, 4, 2, 4],
+    [4, 2, 4, 2],
+]
+FULL_MERGEABLE = [
+    [2, 4, 2, 4],
+    [4, 2, 4, 2],
+    [2, 4, 2, 4],
+    [4, 2, 4, 4],
+]
+
+Benchmark = Callable[[], None]
+
+
+def measure(function: Benchmark, number: int, repeat: int) -> float:
+    """ Returns the best time per call of function, in microseconds. """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6
+
+
+def support_benchmarks() -> dict[str, tuple[Benchmark, int]]:
+    rng = random.Random(0)
+    return {
+        'support.stack_left': (lambda: a3_support.stack_left(MID_GAME), 20000),
+        'support.combine_left': (lambda: a3_support.combine_left(MID_GAME), 20000),
+        'support.reverse': (lambda: a3_support.reverse(MID_GAME), 20000),
+        'support.transpose': (lambda: a3_support.transpose(MID_GAME), 20000),
+        'support.generate_tile': (lambda: a3_support.generate_tile(MID_GAME, rng), 20000),
+    }
+
+
+def model_benchmarks() -> dict[str, tuple[Benchmark, int]]:
+    benchmarks = {}
+    for cls in (Model, BitboardModel):
+        model = cls(seed=0)
+        board = bitboard.encode(MID_GAME)
+        for direction in (LEFT, UP, DOWN, RIGHT):
+            # Reset to the same board each call, so every call does real work
+            def attempt(model=model, direction=direction) -> None:
+                model.unpack(board)
+                model.attempt_move(direction)
+            benchmarks[f'{cls.__name__}.attempt_move[{direction}]'] = (attempt, 10000)
+        for name, tiles in (('lost', LOST), ('mergeable', FULL_MERGEABLE)):
+            # Set the board again each call, so BitboardModel cannot answer
+            # from the legal-move mask cached by the previous call
+            def has_lost(model=cls(seed=0), board=bitboard.encode(tiles)) -> None:
+                model.unpack(board)
+                model.has_lost()
+            benchmarks[f'{cls.__name__}.has_lost[{name}]'] = (has_lost, 20000)
+    return benchmarks
+
+
+def game_benchmarks() -> dict[str, tuple[Benchmark, int]]:
+    rng = random.Random(0)
+    engine = bitboard.get_engine()
+    return {
+        'game.random_policy': (lambda: simulate.play_game(simulate.random_policy, rng, engine), 20),
+    }
+
+
+def headless_grid():
+    """ Returns a GameGrid whose canvas and sprites are stand-ins, so it can
+    be built and redrawn without a display. Canvas items are only numbered
+    and sprites are (value, size) tuples, so redrawing it measures the grid's
+    own work: finding the changed cells and looking up their sprites. """
+    import itertools
+    import tkinter as tk
+    import sprites
+    from a3 import GameGrid
+
+    class HeadlessCanvas(tk.Canvas):
+        def __init__(self, master, **options) -> None:
+            self._options = options
+            self._items = itertools.count(1)
+
+        def __getitem__(self, key: str):
+            return self._options[key]
+
+        def create_image(self, *args, **options) -> int:
+            return next(self._items)
+
+        def itemconfig(self, item: int, **options) -> None:
+            pass
+
+        def delete(self, *items) -> None:
+            pass
+
+    class HeadlessSprites(sprites.SpriteCache):
+        def _render(self, value: int, size: int) -> tuple[int, int]:
+            return value, size
+
+    # GameGrid's super() calls land on HeadlessCanvas rather than tk.Canvas
+    class HeadlessGrid(GameGrid, HeadlessCanvas):
+        def init_root(self, root):
+            return root
+
+        def _draw_board(self) -> int:
+            return self.create_image(0, 0)
+
+    grid = HeadlessGrid(None)
+    grid.sprites = HeadlessSprites()
+    return grid
+
+
+def view_benchmarks() -> dict[str, tuple[Benchmark, int]]:
+    """ Benchmarks GameGrid.redraw without a display, and also on a withdrawn
+    Tk window if Tk can open one. """
+    import tkinter as tk
+    from a3 import GameGrid
+    boards = [MID_GAME, bitboard.decode(bitboard.transpose(bitboard.encode(MID_GAME)))]
+
+    def redraw_benchmark(grid, update: bool) -> Benchmark:
+        grid.redraw(boards[0])
+        state = {'index': 0}
+
+        def redraw() -> None:
+            # Alternate between two boards so most cells change on every call
+            state['index'] ^= 1
+            grid.redraw(boards[state['index']])
+            if update:
+                grid.update_idletasks()
+        return redraw
+
+    benchmarks = {'GameGrid.redraw[headless]': (redraw_benchmark(headless_grid(), False), 5000)}
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print('skipping GameGrid.redraw on Tk: no display', file=sys.stderr)
+        return benchmarks
+    root.withdraw()
+    benchmarks['GameGrid.redraw'] = (redraw_benchmark(GameGrid(root), True), 500)
+    return benchmarks
+
+
+def import_time(module: str, repeat: int) -> float:
+    """ Returns the best time, in microseconds, to import a module in a fresh
+    interpreter. """
+    code = (f'import time; start = time.perf_counter(); import {module}; '
+            f'print(time.perf_counter() - start)')
+    best = None
+    for _ in range(repeat):
+        # Run from this directory, so the module is found wherever the benchmark is run from
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = float(output.stdout)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6
+
+
+def run(repeat: int = 5, scale: float = 1.0) -> dict[str, float]:
+    """ Runs every benchmark.
+
+    Parameters:
+        repeat: How many times to repeat each measurement, keeping the best.
+        scale: Multiplies the number of calls per measurement.
+
+    Returns:
+        A dict from benchmark name to microseconds per call.
+    """
+    benchmarks = {}
+    benchmarks.update(support_benchmarks())
+    benchmarks.update(model_benchmarks())
+    benchmarks.update(game_benchmarks())
+    benchmarks.update(view_benchmarks())
+    # The headless core is imported by every worker and CLI tool, so its
+    # start-up cost is tracked too
+    results = {'import.core': import_time('core', repeat)}
+    for name, (function, number) in benchmarks.items():
+        results[name] = measure(function, max(1, int(number * scale)), repeat)
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float],
+            threshold: float) -> list[str]:
+    """ Finds benchmarks that got slower than the baseline by more than
+    threshold (0.2 meaning 20%).
+
+    Returns:
+        A description of each regression.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is not None and current > base * (1 + threshold):
+            regressions.append(f'{name}: {base:.2f}us -> {current:.2f}us '
+                               f'(+{(current / base - 1) * 100:.0f}%)')
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the 2048 engine, model and view.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the number of calls per measurement')
+    parser.add_argument('--output', help='also write the results JSON to this file')
+    parser.add_argument('--baseline', help='baseline results JSON to compare against')
+    parser.add_argument('--save-baseline', help='write the results as a new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before failing, as a fraction')
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'unit': 'microseconds per call',
+        'results': run(args.repeat, args.scale),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report['results'], baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
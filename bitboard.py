@@ -0,0 +1,960 @@
+"""
+Packed board engine for 2048.
+
+The whole 4x4 board is stored in a single 64-bit integer. Each cell takes 4
+bits holding the log2 of its tile value (0 for an empty cell), so a 2 is
+stored as 1, a 4 as 2, ... and 32768 as 15, the largest representable tile.
+Cell (row, col) lives at bits 4 * (4 * row + col), which means each row is a
+16-bit slice of the board with its leftmost cell in the lowest nibble.
+
+Moves are done through lookup tables indexed by a 16-bit row, mapped from
+the shared file written by tables.py if it exists, or else built. Either is
+done the first time a table is used or a 4x4 Engine is made (see
+load_tables), so importing this module stays cheap for tools that never move
+a board.
+
+Other board sizes, from 2x2 up to 8x8 and including rectangular boards, are
+handled by an Engine from get_engine(rows, cols). It uses the same layout,
+with cell (row, col) at bits 4 * (cols * row + col), and builds its lookup
+tables the first time that size is used.
+
+A 4-bit cell cannot hold a tile above MAX_TILE (32768), so on every board
+size the tables leave two 32768 tiles side by side rather than merge them.
+Engine.overflows tells whether a move would need such a merge: the game
+models and the server refuse those moves with an error, while searches and
+playouts take the cap as part of the rules.
+"""
+import random
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import tables
+from a3_support import NUM_ROWS, NUM_COLS, LEFT, UP, DOWN, RIGHT
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+MAX_RANK = 0xF
+# The largest tile a 4-bit cell can hold
+MAX_TILE = 1 << MAX_RANK
+
+
+def _pack_row(line: list[int]) -> int:
+    """ Packs a list of 4 ranks into a 16-bit row, leftmost cell lowest. """
+    return line[0] | (line[1] << 4) | (line[2] << 8) | (line[3] << 12)
+
+
+def _reverse_row(row: int) -> int:
+    """ Reverses the order of the 4 nibbles in a 16-bit row. """
+    return ((row >> 12) | ((row >> 4) & 0x00F0)
+            | ((row << 4) & 0x0F00) | ((row << 12) & 0xF000))
+
+
+def _unpack_col(row: int) -> int:
+    """ Spreads a 16-bit row into a column occupying nibble 0 of each row. """
+    return ((row & 0x000F) | ((row & 0x00F0) << 12)
+            | ((row & 0x0F00) << 24) | ((row & 0xF000) << 36))
+
+
+def _slide_line(line: list[int]) -> tuple[list[int], int]:
+    """ Moves one line of ranks to the left, merging where necessary.
+
+    This mirrors stack_left -> combine_left -> stack_left from a3_support on
+    a single row of ranks.
+
+    Parameters:
+        line: The ranks in the line, ordered from left to right.
+
+    Returns:
+        A tuple containing the moved line and the score gained by merges.
+    """
+    stacked = [rank for rank in line if rank]
+    merged = []
+    score = 0
+    i = 0
+    while i < len(stacked):
+        rank = stacked[i]
+        if i + 1 < len(stacked) and stacked[i + 1] == rank and rank < MAX_RANK:
+            rank += 1
+            score += 1 << rank
+            i += 2
+        else:
+            i += 1
+        merged.append(rank)
+    return merged + [0] * (len(line) - len(merged)), score
+
+
+# A tile's slide during a move, as (source cell, destination cell, merged)
+Motion = tuple[tuple[int, int], tuple[int, int], bool]
+
+
+@lru_cache(maxsize=1 << 16)
+def _slide_motion(line: tuple[int, ...]) -> tuple[tuple[int, int, bool], ...]:
+    """ Finds where each tile in a line ends up when the line is moved to
+    the left, following the same rules as _slide_line.
+
+    Parameters:
+        line: The ranks in the line, ordered from left to right.
+
+    Returns:
+        (source index, destination index, merged) for every tile that moves
+        or merges. Both tiles of a merge are marked merged.
+    """
+    tiles = [(i, rank) for i, rank in enumerate(line) if rank]
+    slides = []
+    i = 0
+    destination = 0
+    while i < len(tiles):
+        source, rank = tiles[i]
+        if i + 1 < len(tiles) and tiles[i + 1][1] == rank and rank < MAX_RANK:
+            slides.append((source, destination, True))
+            slides.append((tiles[i + 1][0], destination, True))
+            i += 2
+        else:
+            if source != destination:
+                slides.append((source, destination, False))
+            i += 1
+        destination += 1
+    return tuple(slides)
+
+
+def _build_tables() -> tuple[list[int], list[int], list[int], list[int], list[int], list[int]]:
+    """ Builds the move, score and max rank lookup tables for every possible
+    row.
+
+    The move tables store the XOR between a line before and after the move, so
+    that a move is applied with `board ^= table[line] << shift`.
+
+    Returns:
+        A tuple of (row_left, row_right, col_up, col_down, score, row_max)
+        tables.
+    """
+    row_left = [0] * (ROW_MASK + 1)
+    row_right = [0] * (ROW_MASK + 1)
+    col_up = [0] * (ROW_MASK + 1)
+    col_down = [0] * (ROW_MASK + 1)
+    score = [0] * (ROW_MASK + 1)
+    row_max = [0] * (ROW_MASK + 1)
+    for row in range(ROW_MASK + 1):
+        line = [(row >> (4 * i)) & MAX_RANK for i in range(NUM_COLS)]
+        moved, gained = _slide_line(line)
+        result = _pack_row(moved)
+        reversed_row = _reverse_row(row)
+        reversed_result = _reverse_row(result)
+        row_left[row] = row ^ result
+        row_right[reversed_row] = reversed_row ^ reversed_result
+        col_up[row] = _unpack_col(row) ^ _unpack_col(result)
+        col_down[reversed_row] = _unpack_col(reversed_row) ^ _unpack_col(reversed_result)
+        score[row] = gained
+        row_max[row] = max(line)
+    return row_left, row_right, col_up, col_down, score, row_max
+
+
+TABLE_NAMES = ('row_left', 'row_right', 'col_up', 'col_down', 'score', 'row_max')
+
+
+def _load_tables() -> tuple:
+    """ Maps the 4x4 tables from the shared tables file, building them
+    in-process if it does not have them. """
+    mapped = [tables.get(f'4x4/{name}') for name in TABLE_NAMES]
+    if None in mapped:
+        return _build_tables()
+    return tuple(mapped)
+
+
+class _UnloadedTable:
+    """ Stands in for one of the 4x4 tables until it is first indexed, which
+    loads them all. """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __getitem__(self, index: int) -> int:
+        if globals()[self.name] is self:
+            load_tables()
+        return globals()[self.name][index]
+
+
+TABLE_GLOBALS = ('ROW_LEFT_TABLE', 'ROW_RIGHT_TABLE', 'COL_UP_TABLE', 'COL_DOWN_TABLE',
+                 'SCORE_TABLE', 'ROW_MAX_TABLE')
+(ROW_LEFT_TABLE, ROW_RIGHT_TABLE, COL_UP_TABLE, COL_DOWN_TABLE,
+ SCORE_TABLE, ROW_MAX_TABLE) = (_UnloadedTable(name) for name in TABLE_GLOBALS)
+
+
+def load_tables() -> None:
+    """ Maps or builds the 4x4 tables now, if that has not happened yet,
+    rather than on first use. """
+    if isinstance(ROW_LEFT_TABLE, _UnloadedTable):
+        globals().update(zip(TABLE_GLOBALS, _load_tables()))
+
+
+def encode(tiles: list[list[Optional[int]]]) -> int:
+    """ Packs a tiles matrix into a 64-bit board.
+
+    Parameters:
+        tiles: The tiles currently on the grid, where each internal list
+               represents a row in the grid.
+
+    Returns:
+        The packed board.
+
+    Raises:
+        ValueError: If a tile is larger than MAX_TILE, so its rank would not
+                    fit in its cell.
+    """
+    board = 0
+    shift = 0
+    for row in tiles:
+        for tile in row:
+            if tile is not None:
+                if tile > MAX_TILE:
+                    raise ValueError(f'tile {tile} is larger than {MAX_TILE}, the largest that can be packed')
+                board |= (tile.bit_length() - 1) << shift
+            shift += 4
+    return board
+
+
+def decode(board: int) -> list[list[Optional[int]]]:
+    """ Unpacks a 64-bit board into a tiles matrix.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A list of rows, where each element is the number on the tile (or None
+        if no tile exists) at the corresponding position.
+    """
+    tiles = []
+    for i in range(NUM_ROWS):
+        row = []
+        for j in range(NUM_COLS):
+            rank = (board >> (4 * (NUM_COLS * i + j))) & MAX_RANK
+            row.append(1 << rank if rank else None)
+        tiles.append(row)
+    return tiles
+
+
+def transpose(board: int) -> int:
+    """ Transposes a packed board, swapping rows and columns.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        The transposed board.
+    """
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def move_left(board: int) -> tuple[int, int]:
+    """ Moves all tiles on a packed board to the left.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A tuple containing the new board and the score gained by the move.
+    """
+    table = ROW_LEFT_TABLE
+    scores = SCORE_TABLE
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = (board >> 48) & ROW_MASK
+    board ^= table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    return board, scores[r0] + scores[r1] + scores[r2] + scores[r3]
+
+
+def move_right(board: int) -> tuple[int, int]:
+    """ Moves all tiles on a packed board to the right.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A tuple containing the new board and the score gained by the move.
+    """
+    table = ROW_RIGHT_TABLE
+    scores = SCORE_TABLE
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = (board >> 48) & ROW_MASK
+    board ^= table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    return board, scores[r0] + scores[r1] + scores[r2] + scores[r3]
+
+
+def move_up(board: int) -> tuple[int, int]:
+    """ Moves all tiles on a packed board upwards.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A tuple containing the new board and the score gained by the move.
+    """
+    table = COL_UP_TABLE
+    scores = SCORE_TABLE
+    t = transpose(board)
+    c0 = t & ROW_MASK
+    c1 = (t >> 16) & ROW_MASK
+    c2 = (t >> 32) & ROW_MASK
+    c3 = (t >> 48) & ROW_MASK
+    board ^= table[c0] | (table[c1] << 4) | (table[c2] << 8) | (table[c3] << 12)
+    return board, scores[c0] + scores[c1] + scores[c2] + scores[c3]
+
+
+def move_down(board: int) -> tuple[int, int]:
+    """ Moves all tiles on a packed board downwards.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A tuple containing the new board and the score gained by the move.
+    """
+    table = COL_DOWN_TABLE
+    scores = SCORE_TABLE
+    t = transpose(board)
+    c0 = t & ROW_MASK
+    c1 = (t >> 16) & ROW_MASK
+    c2 = (t >> 32) & ROW_MASK
+    c3 = (t >> 48) & ROW_MASK
+    board ^= table[c0] | (table[c1] << 4) | (table[c2] << 8) | (table[c3] << 12)
+    return board, scores[c0] + scores[c1] + scores[c2] + scores[c3]
+
+
+MOVES = {
+    LEFT: move_left,
+    UP: move_up,
+    DOWN: move_down,
+    RIGHT: move_right,
+}
+
+
+# Bit for each direction in the masks returned by legal_moves
+MOVE_BITS = {
+    LEFT: 1,
+    UP: 2,
+    DOWN: 4,
+    RIGHT: 8,
+}
+
+
+def legal_moves(board: int) -> int:
+    """ Finds which moves would change a board, without making them.
+
+    A move changes a line exactly when its table entry for that line is
+    non-zero, so this only needs table lookups.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        A mask of MOVE_BITS for every direction that changes the board.
+    """
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = (board >> 48) & ROW_MASK
+    t = transpose(board)
+    c0 = t & ROW_MASK
+    c1 = (t >> 16) & ROW_MASK
+    c2 = (t >> 32) & ROW_MASK
+    c3 = (t >> 48) & ROW_MASK
+    mask = 0
+    table = ROW_LEFT_TABLE
+    if table[r0] or table[r1] or table[r2] or table[r3]:
+        mask |= 1
+    table = ROW_RIGHT_TABLE
+    if table[r0] or table[r1] or table[r2] or table[r3]:
+        mask |= 8
+    table = COL_UP_TABLE
+    if table[c0] or table[c1] or table[c2] or table[c3]:
+        mask |= 2
+    table = COL_DOWN_TABLE
+    if table[c0] or table[c1] or table[c2] or table[c3]:
+        mask |= 4
+    return mask
+
+
+def move(board: int, direction: str) -> tuple[int, int]:
+    """ Moves all tiles on a packed board in the given direction.
+
+    Parameters:
+        board: The packed board.
+        direction: One of LEFT, UP, DOWN or RIGHT.
+
+    Returns:
+        A tuple containing the new board and the score gained by the move.
+    """
+    return MOVES[direction](board)
+
+
+NIBBLE_LOW_BITS = 0x1111111111111111
+
+
+def empty_mask(board: int) -> int:
+    """ Returns a mask of the empty cells on a board, computed in a few bit
+    operations with no loop.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        An integer with bit 4 * index set for every empty cell, where index is
+        4 * row + col. Its bit_count() is the number of empty cells.
+    """
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    return ~occupied & NIBBLE_LOW_BITS
+
+
+def empty_positions(board: int) -> list[tuple[int, int]]:
+    """ Returns the (row, column) positions of every empty cell on a board.
+
+    Parameters:
+        board: The packed board.
+
+    Returns:
+        The empty positions, ordered from top-left to bottom-right.
+    """
+    positions = []
+    mask = empty_mask(board)
+    while mask:
+        low = mask & -mask
+        positions.append(divmod((low.bit_length() - 1) >> 2, NUM_COLS))
+        mask ^= low
+    return positions
+
+
+def max_rank(board: int) -> int:
+    """ Returns the largest rank (log2 of the largest tile) on a board. """
+    table = ROW_MAX_TABLE
+    return max(table[board & ROW_MASK], table[(board >> 16) & ROW_MASK],
+               table[(board >> 32) & ROW_MASK], table[(board >> 48) & ROW_MASK])
+
+
+def add_random_tile(board: int, rng: random.Random = random) -> int:
+    """ Adds a 2 or 4 tile at a random empty cell, with the same odds as
+    generate_tile.
+
+    Parameters:
+        board: The packed board. It must have at least one empty cell.
+        rng: The random number generator to draw from.
+
+    Returns:
+        The board with the new tile added.
+    """
+    return _spawn(board, empty_mask(board), rng)
+
+
+def _select_cell(mask: int, k: int) -> int:
+    """ Returns the shift of the k-th lowest cell set in mask, where k counts
+    from 0. Halves the mask on the counts of set cells rather than clearing
+    them one at a time, so it takes O(log cells) steps whatever k is. """
+    shift = 0
+    width = mask.bit_length()
+    while width > 4:
+        # The low half, rounded to a whole number of cells
+        half = ((width + 4) >> 3) << 2
+        low = mask & ((1 << half) - 1)
+        count = low.bit_count()
+        if k < count:
+            mask = low
+            width = half
+        else:
+            k -= count
+            mask >>= half
+            shift += half
+            width -= half
+    return shift
+
+
+def _spawn(board: int, mask: int, rng: random.Random) -> int:
+    """ Adds a 2 or 4 tile to board at one of the empty cells set in mask. """
+    # Same draws as rng.choice over the empty positions in row-major order
+    shift = _select_cell(mask, rng.randrange(mask.bit_count()))
+    # Draws from rng exactly like generate_tile, so both give the same games
+    rank = 2 if rng.randrange(6) == 5 else 1
+    return board | (rank << shift)
+
+
+def mirror(board: int) -> int:
+    """ Reverses every row of a packed board, reflecting it left to right. """
+    return (((board & 0x000F000F000F000F) << 12) | ((board & 0x00F000F000F000F0) << 4)
+            | ((board >> 4) & 0x00F000F000F000F0) | ((board >> 12) & 0x000F000F000F000F))
+
+
+def flip(board: int) -> int:
+    """ Reverses the order of the rows of a packed board, reflecting it top
+    to bottom. """
+    return (((board & 0xFFFF) << 48) | ((board & 0xFFFF0000) << 16)
+            | ((board >> 16) & 0xFFFF0000) | (board >> 48))
+
+
+# The 8 symmetries of a square board, each as the (transpose, mirror, flip)
+# steps it applies in that order. canonical() tries them in this order.
+SYMMETRIES = (
+    (False, False, False),
+    (False, True, False),
+    (False, False, True),
+    (False, True, True),
+    (True, False, False),
+    (True, True, False),
+    (True, False, True),
+    (True, True, True),
+)
+_STEP_DIRECTIONS = (
+    {LEFT: UP, UP: LEFT, DOWN: RIGHT, RIGHT: DOWN},
+    {LEFT: RIGHT, UP: UP, DOWN: DOWN, RIGHT: LEFT},
+    {LEFT: LEFT, UP: DOWN, DOWN: UP, RIGHT: RIGHT},
+)
+
+
+def _symmetry_directions(steps: tuple[bool, bool, bool]) -> dict[str, str]:
+    directions = {direction: direction for direction in MOVES}
+    for applied, step in zip(steps, _STEP_DIRECTIONS):
+        if applied:
+            directions = {direction: step[image] for direction, image in directions.items()}
+    return directions
+
+
+# For each symmetry, the direction on the transformed board that matches each
+# direction on the original one, and the way back
+TO_CANONICAL = tuple(_symmetry_directions(steps) for steps in SYMMETRIES)
+FROM_CANONICAL = tuple({image: direction for direction, image in directions.items()}
+                       for directions in TO_CANONICAL)
+
+
+def apply_symmetry(board: int, symmetry: int) -> int:
+    """ Transforms a packed board by one of the SYMMETRIES, given by index. """
+    transposed, mirrored, flipped = SYMMETRIES[symmetry]
+    if transposed:
+        board = transpose(board)
+    if mirrored:
+        board = mirror(board)
+    if flipped:
+        board = flip(board)
+    return board
+
+
+def canonical(board: int) -> tuple[int, int]:
+    """ Picks one board to stand for all 8 rotations and reflections of a
+    board, so caches keyed by it hold each position once.
+
+    Moving in direction d on board is the same as moving in
+    TO_CANONICAL[symmetry][d] on the canonical board, and a move chosen for
+    the canonical board is played on board as FROM_CANONICAL[symmetry][move].
+    Every symmetry maps the evaluation features, score and spawn odds of a
+    position onto themselves, so values cached for the canonical board hold
+    for board too.
+
+    Parameters:
+        board: The packed 4x4 board.
+
+    Returns:
+        (canonical board, index into SYMMETRIES that gives it from board).
+        The canonical board is the smallest of the 8.
+    """
+    mirrored = mirror(board)
+    t = transpose(board)
+    tm = mirror(t)
+    best = board
+    symmetry = 0
+    for index, image in ((1, mirrored), (2, flip(board)), (3, flip(mirrored)),
+                         (4, t), (5, tm), (6, flip(t)), (7, flip(tm))):
+        if image < best:
+            best = image
+            symmetry = index
+    return best, symmetry
+
+
+def canonical_key(board: int) -> int:
+    """ Returns the canonical form of a packed 4x4 board, for use as a
+    cache or deduplication key. """
+    return canonical(board)[0]
+
+
+MIN_SIZE = 2
+MAX_SIZE = 8
+# Lines up to this long get a table covering every possible line up front.
+# Longer lines have too many possible values (16 ** length), so their tables
+# are filled in as lines are first seen.
+FULL_TABLE_LENGTH = 4
+
+# (delta moving towards index 0, delta moving away from it, score, max rank)
+LineEntry = tuple[int, int, int, int]
+# The same four fields for every line, each as its own sequence indexed by the
+# line, so a mapped table can be used straight from the shared tables file
+LineTable = tuple[Sequence[int], Sequence[int], Sequence[int], Sequence[int]]
+
+
+def _line_entry(line: int, length: int) -> LineEntry:
+    """ Computes the move results for one packed line of the given length. """
+    ranks = [(line >> (4 * i)) & MAX_RANK for i in range(length)]
+    moved, score = _slide_line(ranks)
+    backward, _ = _slide_line(ranks[::-1])
+    towards = 0
+    away = 0
+    for i in range(length):
+        towards |= moved[i] << (4 * i)
+        away |= backward[length - 1 - i] << (4 * i)
+    return line ^ towards, line ^ away, score, max(ranks)
+
+
+class _LazyField(dict):
+    """ One field of a table that computes each entry the first time it is
+    looked up, keeping its value in every field of the table. """
+    def __init__(self, fields: list['_LazyField'], index: int, compute) -> None:
+        super().__init__()
+        self._fields = fields
+        self._index = index
+        self._compute = compute
+
+    def __missing__(self, key: int) -> int:
+        entry = self._compute(key)
+        for field, value in zip(self._fields, entry):
+            field[key] = value
+        return entry[self._index]
+
+
+def _lazy_fields(compute, count: int) -> tuple[_LazyField, ...]:
+    """ Returns the count fields of a lazily computed table, where compute
+    gives all of an entry's fields at once. """
+    fields = []
+    fields.extend(_LazyField(fields, index, compute) for index in range(count))
+    return tuple(fields)
+
+
+_LINE_TABLES: dict[int, LineTable] = {}
+
+
+def _spread_column(line: int, rows: int, cols: int) -> int:
+    """ Moves the cells of a packed column line to their positions in column
+    0 of a rows x cols board. """
+    spread = 0
+    for i in range(rows):
+        spread |= ((line >> (4 * i)) & MAX_RANK) << (4 * cols * i)
+    return spread
+
+
+LINE_FIELDS = ('towards', 'away', 'score', 'max')
+
+
+def _line_table(length: int) -> LineTable:
+    """ Returns the (cached) LineTable for every line of a length. Mapped
+    fields are used as they are, so they stay shared with other processes. """
+    table = _LINE_TABLES.get(length)
+    if table is None:
+        if length <= FULL_TABLE_LENGTH:
+            mapped = tuple(tables.get(f'line{length}/{field}') for field in LINE_FIELDS)
+            if None in mapped:
+                entries = [_line_entry(line, length) for line in range(1 << (4 * length))]
+                table = tuple(list(field) for field in zip(*entries))
+            else:
+                table = mapped
+        else:
+            table = _lazy_fields(lambda line: _line_entry(line, length), len(LINE_FIELDS))
+        _LINE_TABLES[length] = table
+    return table
+
+
+class Engine:
+    """ Moves packed boards of a given size.
+
+    Row moves look each row up in the line table for the row length. Column
+    moves first transpose the board, through small per-size tables that each
+    place two cells, then look each column up in a table whose entries are
+    already spread out to the column's cells.
+    """
+    def __init__(self, rows: int, cols: int) -> None:
+        if not (MIN_SIZE <= rows <= MAX_SIZE and MIN_SIZE <= cols <= MAX_SIZE):
+            raise ValueError(f'unsupported board size {rows}x{cols}')
+        self.rows = rows
+        self.cols = cols
+        self.row_bits = 4 * cols
+        self.col_bits = 4 * rows
+        self.row_mask = (1 << self.row_bits) - 1
+        self.col_mask = (1 << self.col_bits) - 1
+        self.low_bits = sum(1 << (4 * i) for i in range(rows * cols))
+        # The cells of every line, ordered in the direction of travel
+        self._motion_lines = {
+            LEFT: [[(row, col) for col in range(cols)] for row in range(rows)],
+            RIGHT: [[(row, col) for col in reversed(range(cols))] for row in range(rows)],
+            UP: [[(row, col) for row in range(rows)] for col in range(cols)],
+            DOWN: [[(row, col) for row in reversed(range(rows))] for col in range(cols)],
+        }
+        if (rows, cols) == (4, 4):
+            # The standard board has hand-unrolled versions using the 4x4
+            # tables, loaded now so the first move does not wait for them
+            load_tables()
+            self.transpose = transpose
+            self.move_left = move_left
+            self.move_right = move_right
+            self.move_up = move_up
+            self.move_down = move_down
+            self.legal_moves = legal_moves
+            self.max_rank = max_rank
+            self.moves = MOVES
+            return
+        self._rows = _line_table(cols)
+        self._col_lines = _line_table(rows)
+        self._cols = self._column_table()
+        self._transpose_chunks = self._build_transpose_chunks()
+        self.moves = {
+            LEFT: self.move_left,
+            UP: self.move_up,
+            DOWN: self.move_down,
+            RIGHT: self.move_right,
+        }
+
+    def _column_deltas(self, line: int) -> tuple[int, int]:
+        towards, away = self._col_lines[0][line], self._col_lines[1][line]
+        return (_spread_column(towards, self.rows, self.cols),
+                _spread_column(away, self.rows, self.cols))
+
+    def _column_table(self) -> LineTable:
+        """ Returns the column LineTable, whose deltas are spread out to the
+        column's cells. The scores and max ranks are those of the line table,
+        and the deltas are mapped from the shared tables file if it has them. """
+        _, _, score, top = self._col_lines
+        if self.rows > FULL_TABLE_LENGTH:
+            return _lazy_fields(self._column_deltas, 2) + (score, top)
+        towards = tables.get(f'col{self.rows}x{self.cols}/towards')
+        away = tables.get(f'col{self.rows}x{self.cols}/away')
+        if towards is None or away is None:
+            deltas = [self._column_deltas(line) for line in range(1 << self.col_bits)]
+            towards, away = (list(field) for field in zip(*deltas))
+        return towards, away, score, top
+
+    def _build_transpose_chunks(self) -> list[tuple[int, list[int]]]:
+        """ Builds (shift, table) pairs, each placing two adjacent cells of
+        the board at their transposed positions. """
+        chunks = []
+        for start in range(0, self.rows * self.cols, 2):
+            cells = [index for index in (start, start + 1) if index < self.rows * self.cols]
+            table = []
+            for value in range(1 << (4 * len(cells))):
+                placed = 0
+                for offset, index in enumerate(cells):
+                    row, col = divmod(index, self.cols)
+                    rank = (value >> (4 * offset)) & MAX_RANK
+                    placed |= rank << (4 * (col * self.rows + row))
+                table.append(placed)
+            chunks.append((4 * start, table))
+        return chunks
+
+    def transpose(self, board: int) -> int:
+        """ Transposes a board into a cols x rows board. """
+        result = 0
+        for shift, table in self._transpose_chunks:
+            result |= table[(board >> shift) & 0xFF]
+        return result
+
+    def _move_rows(self, board: int, which: int) -> tuple[int, int]:
+        deltas = self._rows[which]
+        scores = self._rows[2]
+        bits = self.row_bits
+        mask = self.row_mask
+        delta = 0
+        score = 0
+        shift = 0
+        for _ in range(self.rows):
+            line = (board >> shift) & mask
+            delta |= deltas[line] << shift
+            score += scores[line]
+            shift += bits
+        return board ^ delta, score
+
+    def _move_cols(self, board: int, which: int) -> tuple[int, int]:
+        deltas = self._cols[which]
+        scores = self._cols[2]
+        bits = self.col_bits
+        mask = self.col_mask
+        t = self.transpose(board)
+        delta = 0
+        score = 0
+        for col in range(self.cols):
+            line = (t >> (bits * col)) & mask
+            delta |= deltas[line] << (4 * col)
+            score += scores[line]
+        return board ^ delta, score
+
+    def move_left(self, board: int) -> tuple[int, int]:
+        return self._move_rows(board, 0)
+
+    def move_right(self, board: int) -> tuple[int, int]:
+        return self._move_rows(board, 1)
+
+    def move_up(self, board: int) -> tuple[int, int]:
+        return self._move_cols(board, 0)
+
+    def move_down(self, board: int) -> tuple[int, int]:
+        return self._move_cols(board, 1)
+
+    def move(self, board: int, direction: str) -> tuple[int, int]:
+        """ Moves all tiles on a board in the given direction, returning the
+        new board and the score gained. """
+        return self.moves[direction](board)
+
+    def motion(self, board: int, direction: str) -> list[Motion]:
+        """ Finds how the tiles on a board slide when it is moved.
+
+        Parameters:
+            board: The packed board before the move.
+            direction: One of LEFT, UP, DOWN or RIGHT.
+
+        Returns:
+            (source cell, destination cell, merged) for every tile that moves
+            or merges, with cells as (row, column). Both tiles of a merge are
+            marked merged.
+        """
+        cols = self.cols
+        motion = []
+        for cells in self._motion_lines[direction]:
+            line = tuple((board >> (4 * (cols * row + col))) & MAX_RANK for row, col in cells)
+            for source, destination, merged in _slide_motion(line):
+                motion.append((cells[source], cells[destination], merged))
+        return motion
+
+    def overflows(self, board: int, direction: str) -> bool:
+        """ Returns True if moving a board in the given direction would
+        merge two MAX_TILE tiles, which the tables leave unmerged since the
+        result does not fit a cell. """
+        if self.max_rank(board) < MAX_RANK:
+            return False
+        cols = self.cols
+        for cells in self._motion_lines[direction]:
+            ranks = [rank for rank in ((board >> (4 * (cols * row + col))) & MAX_RANK
+                                       for row, col in cells) if rank]
+            i = 0
+            while i + 1 < len(ranks):
+                if ranks[i] == ranks[i + 1]:
+                    if ranks[i] == MAX_RANK:
+                        return True
+                    i += 2
+                else:
+                    i += 1
+        return False
+
+    def legal_moves(self, board: int) -> int:
+        """ Returns a mask of MOVE_BITS for every direction that changes the
+        board. """
+        mask = 0
+        towards, away = self._rows[0], self._rows[1]
+        shift = 0
+        for _ in range(self.rows):
+            line = (board >> shift) & self.row_mask
+            if towards[line]:
+                mask |= MOVE_BITS[LEFT]
+            if away[line]:
+                mask |= MOVE_BITS[RIGHT]
+            shift += self.row_bits
+        towards, away = self._cols[0], self._cols[1]
+        t = self.transpose(board)
+        shift = 0
+        for _ in range(self.cols):
+            line = (t >> shift) & self.col_mask
+            if towards[line]:
+                mask |= MOVE_BITS[UP]
+            if away[line]:
+                mask |= MOVE_BITS[DOWN]
+            shift += self.col_bits
+        return mask
+
+    def max_rank(self, board: int) -> int:
+        """ Returns the largest rank on a board. """
+        table = self._rows[3]
+        best = 0
+        for row in range(self.rows):
+            top = table[(board >> (self.row_bits * row)) & self.row_mask]
+            if top > best:
+                best = top
+        return best
+
+    def empty_mask(self, board: int) -> int:
+        """ Returns a mask with bit 4 * index set for every empty cell. """
+        occupied = board | (board >> 1)
+        occupied |= occupied >> 2
+        return ~occupied & self.low_bits
+
+    def empty_positions(self, board: int) -> list[tuple[int, int]]:
+        """ Returns the (row, column) positions of every empty cell. """
+        positions = []
+        mask = self.empty_mask(board)
+        while mask:
+            low = mask & -mask
+            positions.append(divmod((low.bit_length() - 1) >> 2, self.cols))
+            mask ^= low
+        return positions
+
+    def add_random_tile(self, board: int, rng: random.Random = random) -> int:
+        """ Adds a 2 or 4 tile at a random empty cell, drawing from rng in the
+        same way as generate_tile. """
+        return _spawn(board, self.empty_mask(board), rng)
+
+    def encode(self, tiles: list[list[Optional[int]]]) -> int:
+        """ Packs a tiles matrix of this size into a board. """
+        return encode(tiles)
+
+    def decode(self, board: int) -> list[list[Optional[int]]]:
+        """ Unpacks a board into a tiles matrix of this size. """
+        tiles = []
+        shift = 0
+        for _ in range(self.rows):
+            row = []
+            for _ in range(self.cols):
+                rank = (board >> shift) & MAX_RANK
+                row.append(1 << rank if rank else None)
+                shift += 4
+            tiles.append(row)
+        return tiles
+
+
+_ENGINES: dict[tuple[int, int], Engine] = {}
+
+
+def shared_tables() -> dict[str, tables.TableData]:
+    """ Builds every table this module can map from the shared tables file
+    (see tables.py), without using the file.
+
+    Returns:
+        A dict from table name to (array typecode, values).
+    """
+    shared = {}
+    for name, table in zip(TABLE_NAMES, _build_tables()):
+        shared[f'4x4/{name}'] = ('Q', table)
+    for length in range(MIN_SIZE, FULL_TABLE_LENGTH + 1):
+        entries = [_line_entry(line, length) for line in range(1 << (4 * length))]
+        for field, values in zip(LINE_FIELDS, zip(*entries)):
+            shared[f'line{length}/{field}'] = ('Q', values)
+    for rows in range(MIN_SIZE, FULL_TABLE_LENGTH + 1):
+        entries = [_line_entry(line, rows) for line in range(1 << (4 * rows))]
+        # Wider boards do not fit the file's 64-bit items
+        for cols in range(MIN_SIZE, 16 // rows + 1):
+            shared[f'col{rows}x{cols}/towards'] = (
+                'Q', [_spread_column(entry[0], rows, cols) for entry in entries])
+            shared[f'col{rows}x{cols}/away'] = (
+                'Q', [_spread_column(entry[1], rows, cols) for entry in entries])
+    return shared
+
+
+def get_engine(rows: int = NUM_ROWS, cols: int = NUM_COLS) -> Engine:
+    """ Returns the engine for a board size, creating it on first use.
+
+    Parameters:
+        rows: The number of rows, from MIN_SIZE to MAX_SIZE.
+        cols: The number of columns, from MIN_SIZE to MAX_SIZE.
+    """
+    engine = _ENGINES.get((rows, cols))
+    if engine is None:
+        engine = _ENGINES[(rows, cols)] = Engine(rows, cols)
+    return engine
@@ -0,0 +1,512 @@
+"""
+The 2048 game model, with no GUI dependency.
+
+Everything needed to play a game headlessly lives here, so worker processes, servers and
+command line tools can import Model without loading Tk. a3.py builds the Tk game on top of it.
+"""
+import random
+from typing import Optional
+
+import bitboard
+from a3_support import (NUM_ROWS, NUM_COLS, LEFT, UP, DOWN, RIGHT, MAX_UNDOS, WIN_TILE,
+	generate_tile, stack_left, combine_left, reverse, transpose)
+
+class UndoHistory:
+	"""
+	A fixed-capacity ring buffer of previous game states used for undo. Each state is stored as a
+	packed board (see bitboard.py) and a score, so memory stays constant however long a game
+	runs. A board holding a tile too large to pack is stored as a tuple of its rows instead (see
+	Model.snapshot). Once full, pushing a new state overwrites the oldest one.
+	"""
+	def __init__(self, capacity: int = MAX_UNDOS) -> None:
+		self.capacity = capacity
+		self._boards = [0] * capacity
+		self._scores = [0] * capacity
+		#Index of the oldest state and number of states held
+		self._start = 0
+		self._size = 0
+
+	def __len__(self) -> int:
+		return self._size
+
+	def __iter__(self):
+		"""
+		Iterate over the (board, score) states from oldest to newest.
+		"""
+		for i in range(self._size):
+			index = (self._start + i) % self.capacity
+			yield self._boards[index], self._scores[index]
+
+	def push(self, board: int, score: int) -> None:
+		"""
+		Add a state, dropping the oldest one if the buffer is full.
+		"""
+		index = (self._start + self._size) % self.capacity
+		self._boards[index] = board
+		self._scores[index] = score
+		if self._size == self.capacity:
+			self._start = (self._start + 1) % self.capacity
+		else:
+			self._size += 1
+
+	def pop(self) -> Optional[tuple[int, int]]:
+		"""
+		Remove and return the newest (board, score) state, or None if there is none.
+		"""
+		if self._size == 0:
+			return None
+		self._size -= 1
+		index = (self._start + self._size) % self.capacity
+		return self._boards[index], self._scores[index]
+
+	def clear(self) -> None:
+		self._start = 0
+		self._size = 0
+
+#Marks a used undo in the move log
+UNDO = 'u'
+#Key symbols accepted as moves, and the direction each one moves in
+MOVE_KEYS = {'Up': UP, 'w': UP, 'Down': DOWN, 's': DOWN, 'Left': LEFT, 'a': LEFT, 'Right': RIGHT, 'd': RIGHT}
+class Model:
+	def __init__(self, seed: Optional[int] = None, rng: Optional[random.Random] = None,
+			win_tile: int = WIN_TILE, rows: int = NUM_ROWS, cols: int = NUM_COLS) -> None:
+		"""
+		Constructs a new 2048 model instance. This includes setting up a new game (see new_game
+		method below). The game is won once a tile of at least win_tile is made. The board has the
+		given number of rows and columns, each between 2 and 8.
+		Tiles are spawned from rng (a new random.Random if not given), which is reseeded with seed
+		if one is given. Without either, a random seed is picked so every game can be replayed from
+		its move log (see get_move_log).
+		"""
+		self.rows = rows
+		self.cols = cols
+		#Packs and unpacks boards of this size
+		self.engine = bitboard.get_engine(rows, cols)
+		self.win_tile = win_tile
+		self.rng = rng if rng is not None else random.Random()
+		if seed is None and rng is None:
+			seed = random.randrange(2 ** 63)
+		#None when an already seeded rng was injected
+		self.seed = seed
+		if seed is not None:
+			self.rng.seed(seed)
+		#Append-only log of the moves and undos made since the game started, one byte each
+		self.moves = bytearray()
+		#When True, attempt_move keeps how the tiles slid in last_motion (see Engine.motion)
+		self.track_motion = False
+		self.last_motion = None
+		#Initialization of the board using list[list[int]] without using numpy
+		self.matrix = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+		#2 new tiles randommly be created 
+		self.add_tile()
+		self.add_tile()
+		#States before the most recent moves, only MAX_UNDOS undos can be done
+		self.undoable_move = UndoHistory(MAX_UNDOS)
+		self.score = 0
+		#Remaining undo chances
+		self.undo_remained = MAX_UNDOS
+
+	def new_game(self, seed: Optional[int] = None) -> None:
+		"""
+		Sets, or resets, the game state to an initial game state. Any information is set to its initial
+		state, the tiles are all set to empty, and then two new starter tiles are randomly generated
+		(see the add_tile method below).
+		If no seed is given the next one is drawn from the model's rng, so a seeded model plays a
+		reproducible series of games.
+		"""
+		self.seed = seed if seed is not None else self.rng.randrange(2 ** 63)
+		self.rng.seed(self.seed)
+		self.moves = bytearray()
+		self.matrix = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+		self.add_tile()
+		self.add_tile()
+		self.score = 0
+		self.undo_remained = MAX_UNDOS
+		self.undoable_move.clear()
+
+	def get_tiles(self) -> list[list[Optional[int]]]:
+		"""
+		Return the current tiles matrix. Each internal list represents a row of the grid, ordered from
+		top to bottom. Each item in each row list is the integer value on the tile occupying that
+		space, or None if no tile is occupying that space.
+		"""
+		return self.matrix
+
+	def add_tile(self) -> None:
+		"""
+		Randomly generate a new tile at an empty location (you must use generate_tile for this)
+		and add it to the current tiles matrix.
+		"""
+		(position, number) = generate_tile(self.matrix, self.rng)
+		row = position[0]
+		col = position[1]
+		self.matrix[row][col] = number
+
+	def move_left(self) -> None:
+		"""
+		Moves all tiles to their left extreme, merging where necessary. This involves stacking all tiles
+		to the left, merging to the left, and then restacking to the left to fill in any gaps created. If
+		you are keeping track of a score (see Task 2), this method should also add any points gained
+		from the history to the total score.
+		"""
+		#stack left -> combine left -> stack left
+		combined = combine_left(stack_left(self.matrix))
+		self.matrix = stack_left(combined[0])
+		self.score += combined[1]
+
+	def move_right(self) -> None: 
+		"""
+		Moves all tiles to their right extreme, merging where neces-
+		sary. This can be achieved by reversing the tiles matrix, moving left, and then reversing
+		the matrix again. If you are keeping track of a score (see Task 2), this method should also
+		result in gained points being added to the total score.
+		"""
+		#reverse -> history left -> reverse
+		self.matrix = reverse(self.matrix)
+		self.move_left()
+		self.matrix = reverse(self.matrix)
+
+	def move_up(self) -> None:
+		"""
+		Moves all tiles to their top extreme, merging where necessary. This can be achieved by
+		transposing the tiles matrix, moving left, and then transposing the matrix again. If you are
+		keeping track of a score (see Task 2), this method should also result in gained points being
+		added to the total score.
+		"""
+		#transpose -> history left -> transpose
+		self.matrix = transpose(self.matrix)
+		self.move_left()
+		self.matrix = transpose(self.matrix)
+
+	def move_down(self) -> None:
+		"""
+		Moves all tiles to their bottom extreme, merging where necessary. This can be achieved by
+		transposing the tiles matrix, moving right, and then transposing the matrix again. If you
+		are keeping track of a score (see Task 2), this method should also result in gained points
+		being added to the total score.
+		"""
+		#transpose -> history right -> transpose
+		self.matrix = transpose(self.matrix)
+		self.move_right()
+		self.matrix = transpose(self.matrix)
+
+	def attempt_move(self, history: str) -> bool:
+		"""
+		Makes the appropriate history according to the history string provided. Returns True if the
+		history resulted in a change to the game state, else False. The history provided must be one
+		of wasd (this is a pre-condition, not something that must be handled within this method).
+		"""
+		if history in MOVE_KEYS:
+			direction = MOVE_KEYS[history]
+			#The moves build new rows, so the old ones are left as they were
+			tiles = self.matrix
+			score = self.score
+			self._move(direction)
+			#A move that changes nothing is not made, so it takes no undo slot and gets no new tile
+			if self.matrix == tiles:
+				return False
+			#Remember the state before this move for undo
+			before = self.snapshot(tiles)
+			self.undoable_move.push(before, score)
+			if self.track_motion:
+				#Engine.motion cannot describe merges of MAX_TILE tiles, so those are not animated
+				if isinstance(before, int) and self.engine.max_rank(before) < bitboard.MAX_RANK:
+					self.last_motion = self.engine.motion(before, direction)
+				else:
+					self.last_motion = None
+			self.moves.append(ord(direction))
+			return True
+		return False
+
+	def _move(self, direction: str) -> None:
+		"""
+		Moves the tiles in one of the a3_support directions.
+		"""
+		if direction == UP:
+			self.move_up()
+		elif direction == DOWN:
+			self.move_down()
+		elif direction == LEFT:
+			self.move_left()
+		else:
+			self.move_right()
+
+	def play(self, history: str) -> bool:
+		"""
+		Makes a move and then, if there is space, adds the new tile straight away. This is the order
+		the game applies them in, so it is what replays and headless players should use.
+		"""
+		if not self.attempt_move(history):
+			return False
+		if self.has_empty():
+			self.add_tile()
+		return True
+
+	def get_move_log(self) -> tuple[Optional[int], str]:
+		"""
+		Returns (seed, moves) for the current game, where moves holds one of wasd for each move and
+		UNDO for each undo, in order. Replaying the moves from a Model seeded with seed (see
+		replay.py) reproduces the game exactly.
+		"""
+		return self.seed, self.moves.decode('ascii')
+
+	def legal_moves(self, board: Optional[int] = None) -> int:
+		"""
+		Returns the mask of bitboard.MOVE_BITS for the moves that would change the board. board is
+		the current board already packed, if the caller has it.
+		"""
+		return self.engine.legal_moves(self.pack() if board is None else board)
+	
+	def has_won(self) -> bool:
+		"""
+		Returns True if the game has been won, else False. The game has been won if a tile of at
+		least win_tile (2048 by default) exists on the grid.
+		"""
+		#Winning condition
+		for row in self.matrix:
+			for tile in row:
+				if tile is not None and tile >= self.win_tile:
+					return True
+		return False
+
+	def has_lost(self) -> bool:
+		"""
+		Returns True if the game has been lost, else False. The game has been lost if there are
+		no remaining empty places in the grid, but no history would result in a change to the game
+		state.
+		"""
+		matrix = self.matrix
+		if self.has_empty():
+			return False
+
+		for row in range(self.rows):
+			for col in range(self.cols-1):
+				if matrix[row][col] == matrix[row][col+1]:
+					return False
+
+		for row in range(self.rows-1):
+			for col in range(self.cols):
+				if matrix[row][col] == matrix[row+1][col]:
+					return False
+		return True
+
+	def empty_count(self) -> int:
+		"""
+		Returns the number of empty cells on the grid.
+		"""
+		return sum(row.count(None) for row in self.matrix)
+
+	def has_empty(self) -> bool:
+		"""
+		Returns True if there is at least one empty cell on the grid.
+		"""
+		return any(None in row for row in self.matrix)
+
+	def prev_step(self) -> bool:
+		"""
+		Restores the state before the most recent move. Returns False if there is no earlier state
+		to go back to.
+		"""
+		prev_data = self.undoable_move.pop()
+		if prev_data is None:
+			return False
+		board, self.score = prev_data
+		if isinstance(board, int):
+			self.unpack(board)
+		else:
+			self.matrix = [list(row) for row in board]
+		return True
+
+	def snapshot(self, tiles: Optional[list[list[Optional[int]]]] = None):
+		"""
+		Returns tiles, by default the current ones, as an undo state: packed into an integer where
+		possible, else a tuple of the rows, since a tile above bitboard.MAX_TILE does not fit in a
+		packed cell.
+		"""
+		if tiles is None:
+			tiles = self.matrix
+		try:
+			return bitboard.encode(tiles)
+		except ValueError:
+			return tuple(tuple(row) for row in tiles)
+
+	def pack(self) -> int:
+		"""
+		Returns the current tiles packed into a single integer (see bitboard.encode). Raises
+		ValueError if a tile is larger than bitboard.MAX_TILE.
+		"""
+		return bitboard.encode(self.matrix)
+
+	def unpack(self, board: int) -> None:
+		"""
+		Sets the current tiles from a packed board.
+		"""
+		self.matrix = self.engine.decode(board)
+
+	def	get_score(self) -> int: 
+		"""
+		Returns the current score for the game. Each time a new tile is
+		created by a merge, its new value should be added to the score. The total score to be added
+		after a merge is calculated for you by the combine_left function in a3_support.py.
+		"""
+		return self.score
+
+	def get_undos_remaining(self) -> int: 
+		"""
+		Get the number of undos the player has remaining.
+		This should start at 3 at the beginning of a new game, and reduce each time an undo is
+		used.
+		"""
+		return self.undo_remained
+
+	def use_undo(self) -> None: 
+		"""
+		Attempts to undo the previous history, returning the current tiles
+		to the previous tiles state before the last history that made changes to the tiles matrix. If the
+		player does not have any undos remaining, or they are back at the initial state, this method
+		should do nothing.
+		"""
+		if self.undo_remained > 0 and self.prev_step():
+			self.undo_remained -= 1
+			self.moves.append(ord(UNDO))
+
+class BitboardModel(Model):
+	"""
+	A Model that keeps the board packed into a single integer (see bitboard.py) and makes moves
+	through precomputed row lookup tables instead of the list-based support functions. The
+	matrix attribute and get_tiles still give the usual list-of-lists view of the tiles, so this
+	can be used anywhere a Model is expected.
+	The largest tile is kept up to date as moves and spawns happen, and the mask of legal moves is
+	cached until the board next changes, so has_won and has_lost are simple lookups.
+	A packed board cannot hold a tile above bitboard.MAX_TILE, so a move that would merge two of
+	them raises OverflowError; use a Model for games that go that far.
+	"""
+	def __init__(self, seed: Optional[int] = None, rng: Optional[random.Random] = None,
+			win_tile: int = WIN_TILE, rows: int = NUM_ROWS, cols: int = NUM_COLS) -> None:
+		#Packed board, 4 bits per tile holding log2 of its value
+		self.board = 0
+		#log2 of the largest tile on the board
+		self.max_rank = 0
+		#Mask of bitboard.MOVE_BITS that change the board, None until needed
+		self.legal = None
+		#Set again by Model.__init__, but needed before it adds the first tiles
+		self.engine = bitboard.get_engine(rows, cols)
+		super().__init__(seed, rng, win_tile, rows, cols)
+		#The smallest rank whose tile is at least win_tile, rounding up for a win_tile that is not a
+		#power of two, as Model.has_won compares tiles against win_tile itself
+		self.win_rank = (win_tile - 1).bit_length()
+
+	def _set_board(self, board: int) -> None:
+		"""
+		Replaces the whole board, recomputing everything tracked about it.
+		"""
+		self.board = board
+		self.max_rank = self.engine.max_rank(board)
+		self.legal = None
+
+	@property
+	def matrix(self) -> list[list[Optional[int]]]:
+		return self.engine.decode(self.board)
+
+	@matrix.setter
+	def matrix(self, tiles: list[list[Optional[int]]]) -> None:
+		self._set_board(bitboard.encode(tiles))
+
+	def pack(self) -> int:
+		return self.board
+
+	def unpack(self, board: int) -> None:
+		self._set_board(board)
+
+	def add_tile(self) -> None:
+		"""
+		Randomly generate a new tile at an empty location, with the same 2 or 4 odds as
+		generate_tile.
+		"""
+		old = self.board
+		self.board = self.engine.add_random_tile(old, self.rng)
+		#The only changed nibble holds the new tile's rank
+		added = self.board ^ old
+		rank = added >> ((added.bit_length() - 1) & ~3)
+		if rank > self.max_rank:
+			self.max_rank = rank
+		self.legal = None
+
+	def _after_move(self, board: int, gained: int) -> None:
+		if board != self.board:
+			self.board = board
+			self.legal = None
+			#Only a merge can make a bigger tile
+			if gained:
+				self.max_rank = self.engine.max_rank(board)
+		self.score += gained
+
+	def _check_overflow(self, direction: str) -> None:
+		#Only a board holding a MAX_TILE tile can need a merge the tables refuse
+		if self.max_rank == bitboard.MAX_RANK and self.engine.overflows(self.board, direction):
+			raise OverflowError(f'merging two {bitboard.MAX_TILE} tiles needs a Model, not a BitboardModel')
+
+	def _move(self, direction: str) -> None:
+		self._check_overflow(direction)
+		self._after_move(*self.engine.move(self.board, direction))
+
+	def attempt_move(self, history: str) -> bool:
+		"""
+		Makes the move for a key straight on the packed board, and keeps it only if the board
+		changed. Returns True if it did.
+		"""
+		direction = MOVE_KEYS.get(history)
+		if direction is None:
+			return False
+		self._check_overflow(direction)
+		board = self.board
+		new_board, gained = self.engine.moves[direction](board)
+		if new_board == board:
+			return False
+		self.undoable_move.push(board, self.score)
+		if self.track_motion:
+			self.last_motion = self.engine.motion(board, direction)
+		self.board = new_board
+		self.legal = None
+		#Only a merge can make a bigger tile
+		if gained:
+			self.max_rank = self.engine.max_rank(new_board)
+			self.score += gained
+		self.moves.append(ord(direction))
+		return True
+
+	def move_left(self) -> None:
+		self._after_move(*self.engine.move_left(self.board))
+
+	def move_right(self) -> None:
+		self._after_move(*self.engine.move_right(self.board))
+
+	def move_up(self) -> None:
+		self._after_move(*self.engine.move_up(self.board))
+
+	def move_down(self) -> None:
+		self._after_move(*self.engine.move_down(self.board))
+
+	def empty_count(self) -> int:
+		return self.engine.empty_mask(self.board).bit_count()
+
+	def has_empty(self) -> bool:
+		return self.engine.empty_mask(self.board) != 0
+
+	def legal_moves(self, board: Optional[int] = None) -> int:
+		"""
+		Returns the mask of bitboard.MOVE_BITS for the moves that would change the board, cached
+		until the board changes. A board other than the current one is checked afresh.
+		"""
+		if board is not None and board != self.board:
+			return self.engine.legal_moves(board)
+		if self.legal is None:
+			self.legal = self.engine.legal_moves(self.board)
+		return self.legal
+
+	def has_won(self) -> bool:
+		return self.max_rank >= self.win_rank
+
+	def has_lost(self) -> bool:
+		#A board with an empty cell can always move
+		return not self.has_empty() and not self.legal_moves()
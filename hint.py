@@ -0,0 +1,174 @@
+"""
+Background move hints for the game controller.
+
+A HintEngine searches for the best move in a worker process, so the search
+never holds the GIL of the process running the Tk main loop and key presses
+are handled as quickly while it runs as when it does not. The controller
+submits each new position as soon as it settles, and polls for the answer
+with after(); by the time the player asks for a hint it is usually ready.
+
+Every submitted position gets a new generation number, written to a shared
+value the worker checks as it searches. Submitting a position, or cancelling,
+therefore stops a search for an old position within a few hundred nodes, and
+any answer it had already sent is recognised as stale and dropped.
+"""
+import multiprocessing
+import queue
+import random
+import time
+from typing import Optional
+
+import ai
+import bitboard
+import rollout
+from a3_support import NUM_ROWS, NUM_COLS
+
+# Seconds the worker spends on one position, and the deepest expectimax search
+TIME_LIMIT = 1.0
+MAX_DEPTH = 6
+
+# (generation, best direction or None if no move is possible)
+Result = tuple[int, Optional[str]]
+
+
+class _Cancelled(ai.SearchTimeout):
+    """ Raised inside the search when a newer position has been submitted. """
+
+
+class _CancellableSolver(ai.ExpectimaxSolver):
+    """ An ExpectimaxSolver that also stops once the shared generation moves
+    on from the one it is searching for. """
+    def __init__(self, generation: multiprocessing.Value, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.shared_generation = generation
+        self.generation = 0
+
+    def _tick(self) -> None:
+        super()._tick()
+        if self.nodes % self.CLOCK_INTERVAL == 0 and self.shared_generation.value != self.generation:
+            raise _Cancelled()
+
+
+def _rollout_move(board: int, rows: int, cols: int, generation: int,
+                  shared_generation: multiprocessing.Value, rng: random.Random) -> Optional[str]:
+    """ Picks a move by random playouts, for board sizes expectimax does not
+    support. Returns None if cancelled. """
+    engine = bitboard.get_engine(rows, cols)
+    legal = engine.legal_moves(board)
+    directions = [d for d in rollout.DIRECTIONS if legal & bitboard.MOVE_BITS[d]]
+    if len(directions) <= 1:
+        return directions[0] if directions else None
+    totals = dict.fromkeys(directions, 0)
+    deadline = time.perf_counter() + TIME_LIMIT
+    while time.perf_counter() < deadline:
+        for direction in directions:
+            if shared_generation.value != generation:
+                return None
+            first, gained = engine.move(board, direction)
+            totals[direction] += gained + rollout.playout(engine.add_random_tile(first, rng), engine, rng)
+    return max(directions, key=totals.__getitem__)
+
+
+def _serve(requests: multiprocessing.Queue, results: multiprocessing.Queue,
+           shared_generation: multiprocessing.Value, weights: Optional[dict[str, float]]) -> None:
+    """ Answers requests until given None, in the worker process. """
+    solver = _CancellableSolver(shared_generation, depth=MAX_DEPTH, time_limit=TIME_LIMIT,
+                                evaluator=ai.Evaluator(weights))
+    rng = random.Random()
+    while (request := requests.get()) is not None:
+        generation, board, rows, cols = request
+        # Skip positions that were replaced while waiting in the queue
+        if shared_generation.value != generation:
+            continue
+        if (rows, cols) == (4, 4):
+            solver.generation = generation
+            direction = solver.best_move(board)
+        else:
+            direction = _rollout_move(board, rows, cols, generation, shared_generation, rng)
+        # A cancelled search may still have returned a move; the generation check drops it
+        if shared_generation.value == generation:
+            results.put((generation, direction))
+
+
+class HintEngine:
+    """ Searches for the best move in a worker process.
+
+    The worker is started on the first submit() and lives until close().
+    """
+    def __init__(self, weights_path: Optional[str] = None) -> None:
+        """
+        Parameters:
+            weights_path: A weights file for the expectimax evaluation (see
+                          tune.py), or None for ai.DEFAULT_WEIGHTS.
+        """
+        # Loaded here so a bad file is reported straight away, not by the worker
+        self.weights = ai.load_weights(weights_path) if weights_path else None
+        # Spawned rather than forked, so the worker does not inherit Tk's state
+        context = multiprocessing.get_context('spawn')
+        self._context = context
+        self._generation = context.Value('Q', 0, lock=False)
+        self._requests: Optional[multiprocessing.Queue] = None
+        self._results: Optional[multiprocessing.Queue] = None
+        self._worker: Optional[multiprocessing.Process] = None
+        self.pending = False
+
+    def _start(self) -> None:
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._worker = self._context.Process(target=_serve, daemon=True,
+                                             args=(self._requests, self._results, self._generation,
+                                                   self.weights))
+        self._worker.start()
+
+    def submit(self, board: int, rows: int = NUM_ROWS, cols: int = NUM_COLS) -> None:
+        """ Starts a search for a position, cancelling any search already
+        running.
+
+        Parameters:
+            board: The packed board.
+            rows: The number of rows on the board.
+            cols: The number of columns on the board.
+        """
+        if self._worker is None:
+            self._start()
+        self._generation.value += 1
+        self._requests.put((self._generation.value, board, rows, cols))
+        self.pending = True
+
+    def cancel(self) -> None:
+        """ Stops the running search, if any, and drops its answer. """
+        self._generation.value += 1
+        self.pending = False
+
+    def poll(self) -> Optional[Result]:
+        """ Returns the answer for the latest submitted position, if it has
+        arrived, without blocking. Answers for older positions are dropped.
+
+        Returns:
+            (generation, direction) or None if no answer is ready. The
+            direction is None if the position has no legal moves.
+        """
+        if not self.pending:
+            return None
+        while True:
+            try:
+                generation, direction = self._results.get_nowait()
+            except queue.Empty:
+                if not self._worker.is_alive():
+                    # The worker died; the next submit() starts another
+                    self._worker = None
+                    self.pending = False
+                return None
+            if generation == self._generation.value:
+                self.pending = False
+                return generation, direction
+
+    def close(self) -> None:
+        """ Stops the worker process. """
+        self.cancel()
+        if self._worker is not None:
+            self._requests.put(None)
+            self._worker.join(timeout=1)
+            if self._worker.is_alive():
+                self._worker.terminate()
+            self._worker = None
@@ -0,0 +1,122 @@
+"""
+Replays 2048 games from their move logs.
+
+A game is fully determined by the seed its Model was created with and the
+sequence of moves and undos made (see Model.get_move_log). A Replay rebuilds
+the game without rendering and can seek to any point in it. Checkpoints of
+the full game state are kept every `checkpoint_interval` moves as the replay
+advances, so seeking anywhere into a long game only has to re-simulate at
+most that many moves.
+
+Usage:
+    python replay.py SEED MOVES [--at K] [--rows ROWS --cols COLS]
+"""
+import argparse
+from typing import Optional
+
+from core import BitboardModel, UNDO
+from a3_support import NUM_ROWS, NUM_COLS
+
+# (board, score, undos remaining, undo states, rng state)
+Checkpoint = tuple[int, int, int, tuple[tuple[int, int], ...], tuple]
+
+
+class Replay:
+    """ A game rebuilt from its (seed, moves) log. """
+    def __init__(self, seed: int, moves: str, checkpoint_interval: int = 1024,
+                 rows: int = NUM_ROWS, cols: int = NUM_COLS) -> None:
+        """
+        Parameters:
+            seed: The seed the game's Model was created with.
+            moves: One of wasd per move, or UNDO per undo, in order.
+            checkpoint_interval: Number of moves between checkpoints.
+            rows: The number of rows on the game's board.
+            cols: The number of columns on the game's board.
+        """
+        self.seed = seed
+        self.moves = moves
+        self.checkpoint_interval = checkpoint_interval
+        self._model = BitboardModel(seed, rows=rows, cols=cols)
+        self._position = 0
+        # Checkpoint i holds the state after i * checkpoint_interval moves
+        self._checkpoints: list[Checkpoint] = [self._snapshot()]
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    @property
+    def position(self) -> int:
+        """ The number of moves applied to the current state. """
+        return self._position
+
+    def _snapshot(self) -> Checkpoint:
+        model = self._model
+        return (model.pack(), model.score, model.undo_remained,
+                tuple(model.undoable_move), model.rng.getstate())
+
+    def _restore(self, index: int) -> None:
+        board, score, undos, undo_states, rng_state = self._checkpoints[index]
+        model = self._model
+        model.unpack(board)
+        model.score = score
+        model.undo_remained = undos
+        model.undoable_move.clear()
+        for state in undo_states:
+            model.undoable_move.push(*state)
+        model.rng.setstate(rng_state)
+        self._position = index * self.checkpoint_interval
+
+    def _step(self) -> None:
+        move = self.moves[self._position]
+        if move == UNDO:
+            self._model.use_undo()
+        else:
+            self._model.play(move)
+        self._position += 1
+        if (self._position % self.checkpoint_interval == 0
+                and self._position // self.checkpoint_interval == len(self._checkpoints)):
+            self._checkpoints.append(self._snapshot())
+
+    def seek(self, k: int) -> BitboardModel:
+        """ Moves the replay to the state after the first k moves.
+
+        Parameters:
+            k: The number of moves to apply, from 0 to len(self).
+
+        Returns:
+            The replay's model in that state. It is reused by later seeks,
+            so copy anything that needs to outlive the next one.
+        """
+        if not 0 <= k <= len(self.moves):
+            raise IndexError(k)
+        nearest = min(k // self.checkpoint_interval, len(self._checkpoints) - 1)
+        if k < self._position or nearest * self.checkpoint_interval > self._position:
+            self._restore(nearest)
+        while self._position < k:
+            self._step()
+        return self._model
+
+    def final(self) -> BitboardModel:
+        """ Fast-forwards to the end of the game. """
+        return self.seek(len(self.moves))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Replay a 2048 game from its move log.')
+    parser.add_argument('seed', type=int)
+    parser.add_argument('moves')
+    parser.add_argument('--at', type=int, default=None,
+                        help='number of moves to replay, defaulting to all of them')
+    parser.add_argument('--rows', type=int, default=NUM_ROWS)
+    parser.add_argument('--cols', type=int, default=NUM_COLS)
+    args = parser.parse_args(argv)
+
+    replay = Replay(args.seed, args.moves, rows=args.rows, cols=args.cols)
+    model = replay.seek(len(replay) if args.at is None else args.at)
+    for row in model.get_tiles():
+        print(' '.join(f'{tile or ".":>5}' for tile in row))
+    print(f'score {model.get_score()}, undos remaining {model.get_undos_remaining()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Monte Carlo rollout move chooser for 2048.
+
+For each legal direction, many random games are played out from the position
+after that move, and the direction with the best mean final score is chosen.
+Rollouts run in batches on a process pool. The root position is written to a
+multiprocessing.shared_memory block that the workers attach to once, so a
+task only carries a few integers rather than a pickled board. Batch results
+are merged as they arrive, and a decision is returned as soon as the time
+budget runs out; batches still running for an old position notice the change
+in the shared block and stop early.
+
+Usage:
+    python rollout.py --time-limit 0.1 --seed 1
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+
+import bitboard
+from a3_support import NUM_ROWS, NUM_COLS, LEFT, UP, DOWN, RIGHT
+
+DIRECTIONS = (LEFT, UP, DOWN, RIGHT)
+# The shared root position: rows, cols and the packed board (up to 8x8), then
+# a generation number that changes whenever the root does
+ROOT = struct.Struct('<BB32s')
+GENERATION = struct.Struct('<Q')
+SHARED_SIZE = ROOT.size + GENERATION.size
+
+# (generation, direction, rollouts done, total score)
+BatchResult = tuple[int, str, int, int]
+
+
+def playout(board: int, engine: bitboard.Engine, rng: random.Random) -> int:
+    """ Plays uniformly random legal moves until the game is lost.
+
+    Parameters:
+        board: The packed board to start from.
+        engine: The engine for the board's size.
+        rng: The random number generator for moves and new tiles.
+
+    Returns:
+        The score gained over the playout.
+    """
+    moves = [(bitboard.MOVE_BITS[direction], engine.moves[direction]) for direction in DIRECTIONS]
+    score = 0
+    while True:
+        legal = engine.legal_moves(board)
+        if not legal:
+            return score
+        board, gained = rng.choice([move for bit, move in moves if legal & bit])(board)
+        score += gained
+        board = engine.add_random_tile(board, rng)
+
+
+# The shared block, attached once in each worker
+_shared: Optional[shared_memory.SharedMemory] = None
+
+
+def _attach(name: str) -> None:
+    global _shared
+    _shared = shared_memory.SharedMemory(name=name)
+
+
+def _generation() -> int:
+    return GENERATION.unpack_from(_shared.buf, ROOT.size)[0]
+
+
+def _run_batch(task: tuple[int, str, int, int]) -> BatchResult:
+    """ Plays a batch of rollouts for one direction from the shared root, in
+    a worker. Stops early if the root changes. """
+    generation, direction, count, seed = task
+    if _generation() != generation:
+        return generation, direction, 0, 0
+    rows, cols, packed = ROOT.unpack_from(_shared.buf)
+    board = int.from_bytes(packed, 'little')
+    engine = bitboard.get_engine(rows, cols)
+    rng = random.Random(seed)
+    first, gained = engine.move(board, direction)
+    done = 0
+    total = 0
+    for _ in range(count):
+        if _generation() != generation:
+            break
+        total += gained + playout(engine.add_random_tile(first, rng), engine, rng)
+        done += 1
+    return generation, direction, done, total
+
+
+class RolloutPlayer:
+    """ Chooses moves by random rollouts on a process pool.
+
+    The pool and shared block live until close() is called, so use the
+    player as a context manager or close it once done.
+    """
+    def __init__(self, time_limit: float = 0.2, max_rollouts: Optional[int] = None,
+                 batch_size: int = 8, workers: Optional[int] = None, seed: Optional[int] = None) -> None:
+        """
+        Parameters:
+            time_limit: Seconds to spend on each move.
+            max_rollouts: Stop early once every direction has had this many
+                          rollouts. Without it the whole time limit is used.
+            batch_size: Rollouts per task sent to a worker.
+            workers: Number of worker processes, defaulting to the CPU count.
+            seed: Seeds the rollouts, for reproducible rollout sequences.
+        """
+        self.time_limit = time_limit
+        self.max_rollouts = max_rollouts
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.rollouts = 0
+        self._seeds = random.Random(seed)
+        self._generation = 0
+        self._shared = shared_memory.SharedMemory(create=True, size=SHARED_SIZE)
+        self._publish(0, NUM_ROWS, NUM_COLS)
+        self._pool = multiprocessing.Pool(self.workers, initializer=_attach,
+                                          initargs=(self._shared.name,))
+
+    def __enter__(self) -> 'RolloutPlayer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+        self._shared.close()
+        self._shared.unlink()
+
+    def _publish(self, board: int, rows: int, cols: int) -> int:
+        """ Writes a new root position to the shared block, returning its
+        generation. The generation is written last, so a worker that sees it
+        also sees the board. """
+        self._generation += 1
+        ROOT.pack_into(self._shared.buf, 0, rows, cols, board.to_bytes(32, 'little'))
+        GENERATION.pack_into(self._shared.buf, ROOT.size, self._generation)
+        return self._generation
+
+    def best_move(self, board: int, rows: int = NUM_ROWS, cols: int = NUM_COLS) -> Optional[str]:
+        """ Finds the direction with the best mean rollout score.
+
+        Parameters:
+            board: The packed board.
+            rows: The number of rows on the board.
+            cols: The number of columns on the board.
+
+        Returns:
+            One of LEFT, UP, DOWN or RIGHT, or None if no move is possible.
+        """
+        engine = bitboard.get_engine(rows, cols)
+        legal = engine.legal_moves(board)
+        directions = [direction for direction in DIRECTIONS if legal & bitboard.MOVE_BITS[direction]]
+        if len(directions) <= 1:
+            return directions[0] if directions else None
+        deadline = time.perf_counter() + self.time_limit
+        generation = self._publish(board, rows, cols)
+        totals = dict.fromkeys(directions, 0)
+        counts = dict.fromkeys(directions, 0)
+        # Rollouts asked for so far, so batches go to the directions that have had fewest
+        pending = dict.fromkeys(directions, 0)
+        results = queue.SimpleQueue()
+        in_flight = 0
+
+        def submit() -> bool:
+            direction = min(directions, key=lambda d: pending[d])
+            if self.max_rollouts is not None and pending[direction] >= self.max_rollouts:
+                return False
+            pending[direction] += self.batch_size
+            task = (generation, direction, self.batch_size, self._seeds.randrange(2 ** 63))
+            self._pool.apply_async(_run_batch, (task,), callback=results.put)
+            return True
+
+        try:
+            # Keep every worker busy with one batch queued behind it
+            while in_flight < 2 * self.workers and submit():
+                in_flight += 1
+            while in_flight:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    _, direction, done, total = results.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                in_flight -= 1
+                totals[direction] += total
+                counts[direction] += done
+                self.rollouts += done
+                if submit():
+                    in_flight += 1
+        finally:
+            # Stop the batches still running; their results are ignored
+            self._publish(0, rows, cols)
+        return max(directions, key=lambda d: totals[d] / counts[d] if counts[d] else float('-inf'))
+
+    def suggest(self, model) -> Optional[str]:
+        """ Finds the best move for the current state of a Model. """
+        return self.best_move(model.pack(), model.rows, model.cols)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Play a game of 2048 by Monte Carlo rollouts.')
+    parser.add_argument('--time-limit', type=float, default=0.1)
+    parser.add_argument('--max-rollouts', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--rows', type=int, default=NUM_ROWS)
+    parser.add_argument('--cols', type=int, default=NUM_COLS)
+    args = parser.parse_args(argv)
+
+    engine = bitboard.get_engine(args.rows, args.cols)
+    rng = random.Random(args.seed)
+    board = engine.add_random_tile(engine.add_random_tile(0, rng), rng)
+    score = 0
+    moves = 0
+    start = time.perf_counter()
+    with RolloutPlayer(args.time_limit, args.max_rollouts, args.batch_size, args.workers,
+                       args.seed) as player:
+        while (direction := player.best_move(board, args.rows, args.cols)) is not None:
+            board, gained = engine.move(board, direction)
+            board = engine.add_random_tile(board, rng)
+            score += gained
+            moves += 1
+        elapsed = time.perf_counter() - start
+        print(f'score {score}, max tile {1 << engine.max_rank(board)}, {moves} moves, '
+              f'{player.rollouts / elapsed:.0f} rollouts/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Binary save format for 2048 games.
+
+A save file is a fixed-size header, the packed board, then a length-prefixed
+history section, all little-endian:
+
+    magic          4s   b'2048'
+    version        H    FORMAT_VERSION
+    rows, cols     BB   board size
+    score          Q
+    undos          H    undos remaining
+    history count  I    number of history entries after the board
+    board          the packed board (see bitboard.py) in board_bytes(rows, cols)
+                   bytes
+    history        count * (board, Q score), oldest first
+    log flags      B    HAS_SEED if the game's seed is stored, HAS_RNG if its
+                        rng state is
+    seed size      H    bytes in the seed
+    move count     I    bytes in the move log
+    seed           the seed (see Model.seed), signed, in seed size bytes
+    moves          the move log (see Model.get_move_log), one ASCII byte each
+    rng state      625I ?d  the Mersenne Twister state and any pending gauss
+                        value, only if HAS_RNG
+
+The seed, move log and rng state let a loaded game carry on spawning the
+same tiles and still be replayed from its log. A save without a seed, such
+as one converted from a text save, cannot be replayed.
+
+Files are opened through mmap, so loading a save only reads the header until
+the history is actually asked for.
+
+Old text saves written by earlier versions of the game can be converted with:
+    python savefile.py convert old_save.txt new_save.sav
+"""
+import argparse
+import ast
+import mmap
+import struct
+from typing import Iterator, Optional
+
+import bitboard
+from a3_support import NUM_ROWS, NUM_COLS
+
+MAGIC = b'2048'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHBBQHI')
+SCORE = struct.Struct('<Q')
+LOG = struct.Struct('<BHI')
+RNG_STATE = struct.Struct('<625I?d')
+HAS_SEED = 1
+HAS_RNG = 2
+# The version random.Random.getstate() tags its state with
+RNG_VERSION = 3
+
+# (seed or None, move log, rng state or None)
+GameLog = tuple[Optional[int], bytes, Optional[tuple]]
+
+
+def board_bytes(rows: int, cols: int) -> int:
+    """ Returns the number of bytes a packed board of the given size takes. """
+    return (rows * cols + 1) // 2
+
+
+class SaveFormatError(Exception):
+    """ Raised when a file is not a valid save. """
+
+
+def _pack_log(seed: Optional[int], moves: bytes, rng_state: Optional[tuple]) -> bytes:
+    """ Packs the game log section that ends a save. """
+    flags = 0
+    seed_bytes = b''
+    if seed is not None:
+        flags |= HAS_SEED
+        seed_bytes = seed.to_bytes(seed.bit_length() // 8 + 1, 'little', signed=True)
+    state = b''
+    if rng_state is not None:
+        flags |= HAS_RNG
+        _, words, gauss = rng_state
+        state = RNG_STATE.pack(*words, gauss is not None, gauss or 0.0)
+    return LOG.pack(flags, len(seed_bytes), len(moves)) + seed_bytes + bytes(moves) + state
+
+
+def write(path: str, board: int, score: int, undos: int,
+          history: list[tuple[int, int]], rows: int = NUM_ROWS, cols: int = NUM_COLS,
+          seed: Optional[int] = None, moves: bytes = b'', rng_state: Optional[tuple] = None) -> None:
+    """ Writes a game to a binary save file.
+
+    Parameters:
+        path: The file to write.
+        board: The packed board.
+        score: The current score.
+        undos: The number of undos remaining.
+        history: (packed board, score) states, oldest first.
+        rows: The number of rows on the board.
+        cols: The number of columns on the board.
+        seed: The seed the game was started from, or None if unknown.
+        moves: The game's move log.
+        rng_state: The state of the game's random.Random, or None.
+    """
+    size = board_bytes(rows, cols)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, rows, cols, score, undos, len(history)))
+        f.write(board.to_bytes(size, 'little'))
+        f.write(b''.join(entry_board.to_bytes(size, 'little') + SCORE.pack(entry_score)
+                         for entry_board, entry_score in history))
+        f.write(_pack_log(seed, moves, rng_state))
+
+
+def save(path: str, model) -> None:
+    """ Writes the state of a Model to a binary save file.
+
+    Raises:
+        ValueError: If the board, or a state in its undo history, holds a
+                    tile larger than bitboard.MAX_TILE, which the format
+                    cannot store.
+    """
+    board = model.pack()
+    history = list(model.undoable_move)
+    if not all(isinstance(entry_board, int) for entry_board, _ in history):
+        raise ValueError(f'the undo history holds a tile larger than {bitboard.MAX_TILE}, '
+                         'the largest that can be saved')
+    write(path, board, model.get_score(), model.get_undos_remaining(), history,
+          model.rows, model.cols, model.seed, model.moves, model.rng.getstate())
+
+
+class SaveFile:
+    """ A binary save opened through mmap.
+
+    The header fields are read when the file is opened. The history section is
+    only unpacked when iterated, so opening a save with a long history costs
+    no more than opening a short one.
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SaveFormatError(f'{path} is empty')
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise SaveFormatError(f'{path} is too short to be a save file')
+        magic, version = struct.unpack_from('<4sH', self._map)
+        if magic != MAGIC:
+            self.close()
+            raise SaveFormatError(f'{path} is not a 2048 save file')
+        if version != FORMAT_VERSION:
+            self.close()
+            raise SaveFormatError(f'{path} has unsupported version {version}')
+        (_, self.version, self.rows, self.cols, self.score,
+         self.undos, self.history_count) = HEADER.unpack_from(self._map)
+        self._board_size = board_bytes(self.rows, self.cols)
+        self.board = int.from_bytes(self._map[HEADER.size:HEADER.size + self._board_size], 'little')
+        self._history_offset = HEADER.size + self._board_size
+        self._entry_size = self._board_size + SCORE.size
+        self._log_offset = self._history_offset + self.history_count * self._entry_size
+        end = self._log_offset + LOG.size
+        if len(self._map) >= end:
+            flags, seed_size, move_count = LOG.unpack_from(self._map, self._log_offset)
+            end += seed_size + move_count + (RNG_STATE.size if flags & HAS_RNG else 0)
+        if len(self._map) < end:
+            self.close()
+            raise SaveFormatError(f'{path} is truncated')
+
+    def __enter__(self) -> 'SaveFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def history(self) -> Iterator[tuple[int, int]]:
+        """ Iterates over the (packed board, score) history entries, oldest
+        first, reading them from the mapped file on demand. """
+        for index in range(self.history_count):
+            yield self.history_entry(index)
+
+    def history_entry(self, index: int) -> tuple[int, int]:
+        """ Returns a single history entry without reading the others. """
+        if not 0 <= index < self.history_count:
+            raise IndexError(index)
+        offset = self._history_offset + index * self._entry_size
+        board_end = offset + self._board_size
+        board = int.from_bytes(self._map[offset:board_end], 'little')
+        return board, SCORE.unpack_from(self._map, board_end)[0]
+
+    def game_log(self) -> GameLog:
+        """ Returns the saved (seed, move log, rng state). The seed and rng
+        state are None if the save does not hold them. """
+        flags, seed_size, move_count = LOG.unpack_from(self._map, self._log_offset)
+        offset = self._log_offset + LOG.size
+        seed = None
+        if flags & HAS_SEED:
+            seed = int.from_bytes(self._map[offset:offset + seed_size], 'little', signed=True)
+        offset += seed_size
+        moves = self._map[offset:offset + move_count]
+        offset += move_count
+        rng_state = None
+        if flags & HAS_RNG:
+            *state, has_gauss, gauss = RNG_STATE.unpack_from(self._map, offset)
+            rng_state = (RNG_VERSION, tuple(state), gauss if has_gauss else None)
+        return seed, moves, rng_state
+
+    def restore(self, model) -> None:
+        """ Sets a Model to the saved state, including its seed, move log and
+        rng state. A save without a seed sets the model's seed to None, as
+        the game can no longer be replayed from it. """
+        if (self.rows, self.cols) != (model.rows, model.cols):
+            raise SaveFormatError(f'save is for a {self.rows}x{self.cols} board')
+        seed, moves, rng_state = self.game_log()
+        model.unpack(self.board)
+        model.score = self.score
+        model.undo_remained = self.undos
+        model.undoable_move.clear()
+        # Older entries would only be overwritten, so just the last capacity are read
+        first = max(0, self.history_count - model.undoable_move.capacity)
+        for index in range(first, self.history_count):
+            model.undoable_move.push(*self.history_entry(index))
+        model.seed = seed
+        model.moves = bytearray(moves)
+        if rng_state is not None:
+            model.rng.setstate(rng_state)
+
+
+def load(path: str) -> SaveFile:
+    """ Opens a binary save file. Use it as a context manager, or close it
+    once done. """
+    return SaveFile(path)
+
+
+def read_text_save(path: str) -> tuple[int, int, int, list[tuple[int, int]], int, int]:
+    """ Reads an old text save, as written by earlier versions of the game.
+
+    Values are parsed as Python literals, never executed.
+
+    Returns:
+        A tuple of (packed board, score, undos remaining, history, rows,
+        columns).
+    """
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, _, value = line.partition('=')
+            if value.strip():
+                values[name.strip()] = ast.literal_eval(value.strip())
+    try:
+        matrix = values['self.data.matrix']
+        board = bitboard.encode(matrix)
+        score = int(values['self.data.score'])
+        undos = int(values['self.data.undo_remained'])
+    except KeyError as e:
+        raise SaveFormatError(f'{path} is missing {e.args[0]}')
+    history = []
+    for state in values.get('self.data.undoable_move', []):
+        # The oldest saves stored each state as a dict holding the full matrix
+        if isinstance(state, dict):
+            state = (bitboard.encode(state['matrix']), state['score'])
+        history.append((int(state[0]), int(state[1])))
+    return board, score, undos, history, len(matrix), len(matrix[0])
+
+
+def convert(text_path: str, binary_path: str) -> None:
+    """ Converts an old text save into a binary save. """
+    write(binary_path, *read_text_save(text_path))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Inspect or convert 2048 save files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='convert an old text save')
+    convert_parser.add_argument('source')
+    convert_parser.add_argument('destination')
+    show_parser = commands.add_parser('show', help='print a binary save')
+    show_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        convert(args.source, args.destination)
+    else:
+        with load(args.path) as save_file:
+            print(f'version {save_file.version}, {save_file.rows}x{save_file.cols}')
+            print(f'score {save_file.score}, undos remaining {save_file.undos}')
+            engine = bitboard.get_engine(save_file.rows, save_file.cols)
+            for row in engine.decode(save_file.board):
+                print(' '.join(f'{tile or ".":>5}' for tile in row))
+            print(f'{save_file.history_count} history entries')
+            seed, moves, _ = save_file.game_log()
+            if seed is None:
+                print('no seed, cannot be replayed')
+            else:
+                print(f'seed {seed}, {len(moves)} moves')
+
+
+if __name__ == '__main__':
+    main()
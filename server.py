@@ -0,0 +1,527 @@
+"""
+Multi-session 2048 game server.
+
+Clients talk newline-delimited JSON over TCP or a Unix socket: each request
+is one JSON object on a line, and gets one JSON object back on a line. Every
+request names an "op", and may carry an "id" that is echoed in the reply.
+
+    {"op": "new", "seed": 1, "rows": 4, "cols": 4}  -> a new session's state
+    {"op": "move", "session": S, "direction": "w"}  -> state, plus "moved"
+    {"op": "undo", "session": S}                    -> state, plus "undone"
+    {"op": "state", "session": S}                   -> state
+    {"op": "close", "session": S}                   -> {"ok": true}
+    {"op": "stats"}                                 -> session counts
+
+A state reply holds the session id, the board as rows of tiles (null for an
+empty cell), the score, undos remaining and whether the game is won or lost.
+Errors are replied as {"ok": false, "error": "..."}.
+
+Sessions play by the same rules and draw from their rng in the same way as
+core.BitboardModel, so a session and a model given the same seed play the
+same game. They keep their own copy of the move, spawn and undo rules rather
+than a model, since a session is far smaller than one. Like BitboardModel,
+a session cannot merge two 32768 tiles and replies with an error to a move
+that would; core.Model, which the game uses, merges them.
+Each session is a small __slots__ object holding a packed board. Sessions
+left idle are written to the spool directory and dropped from memory, and
+are read back the next time a request names them. Spool files are read and
+written in worker threads, so a slow disk never stalls the event loop.
+
+By default each server spools to a new temporary directory of its own,
+removed when it stops. A directory given with --spool is locked while a
+server uses it, and a second server refuses to start on it. Ids are only
+valid for the run of the server that made them, so sessions a previous run
+left in the directory are deleted when the next one takes the lock.
+
+Usage:
+    python server.py serve --port 2048
+    python server.py serve --unix /tmp/2048.sock --idle-timeout 60
+    python server.py load --port 2048 --sessions 1000 --connections 20
+"""
+import argparse
+import asyncio
+import errno
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where spool directories are not locked
+    fcntl = None
+
+import bitboard
+from a3_support import NUM_ROWS, NUM_COLS, LEFT, UP, DOWN, RIGHT, MAX_UNDOS, WIN_TILE
+
+WIN_RANK = WIN_TILE.bit_length() - 1
+DIRECTIONS = (LEFT, UP, DOWN, RIGHT)
+# The name of a spooled session's file: its id, made by SessionStore.create
+SPOOL_FILE = re.compile(r'[0-9a-f]+-[0-9a-f]+-[0-9]+\.json')
+# Held by the server using a spool directory
+LOCK_FILE = '.lock'
+
+
+class RequestError(Exception):
+    """ Raised for a request that cannot be carried out. Its message is sent
+    back to the client. """
+
+
+class Session:
+    """ The state of one game: a packed board, score, undos and rng. """
+    __slots__ = ('id', 'engine', 'board', 'score', 'undos', 'history', 'rng', 'last_used')
+
+    def __init__(self, session_id: str, seed: Optional[int] = None,
+                 rows: int = NUM_ROWS, cols: int = NUM_COLS) -> None:
+        """
+        Parameters:
+            session_id: The id clients refer to the session by.
+            seed: Seeds the session's rng, defaulting to a random seed.
+            rows: The number of rows on the board.
+            cols: The number of columns on the board.
+        """
+        self.id = session_id
+        self.engine = bitboard.get_engine(rows, cols)
+        self.rng = random.Random(seed)
+        self.board = self.engine.add_random_tile(self.engine.add_random_tile(0, self.rng), self.rng)
+        self.score = 0
+        self.undos = MAX_UNDOS
+        # (board, score) before each of the most recent moves, oldest first
+        self.history: tuple[tuple[int, int], ...] = ()
+        self.last_used = time.monotonic()
+
+    def move(self, direction: str) -> bool:
+        """ Makes a move and adds a new tile. Returns False, changing nothing,
+        if the move would not change the board.
+
+        Raises:
+            RequestError: If the move would merge two bitboard.MAX_TILE tiles.
+        """
+        if self.engine.overflows(self.board, direction):
+            raise RequestError(f'merging two {bitboard.MAX_TILE} tiles is not supported')
+        if not self.engine.legal_moves(self.board) & bitboard.MOVE_BITS[direction]:
+            return False
+        self.history = (self.history + ((self.board, self.score),))[-MAX_UNDOS:]
+        self.board, gained = self.engine.move(self.board, direction)
+        self.score += gained
+        if self.engine.empty_mask(self.board):
+            self.board = self.engine.add_random_tile(self.board, self.rng)
+        return True
+
+    def undo(self) -> bool:
+        """ Goes back to the state before the last move, if an undo is left.
+        Returns True if it did. """
+        if not self.undos or not self.history:
+            return False
+        (self.board, self.score), self.history = self.history[-1], self.history[:-1]
+        self.undos -= 1
+        return True
+
+    def has_won(self) -> bool:
+        return self.engine.max_rank(self.board) >= WIN_RANK
+
+    def has_lost(self) -> bool:
+        return not self.engine.empty_mask(self.board) and not self.engine.legal_moves(self.board)
+
+    def to_reply(self) -> dict:
+        return {
+            'ok': True,
+            'session': self.id,
+            'board': self.engine.decode(self.board),
+            'score': self.score,
+            'undos': self.undos,
+            'won': self.has_won(),
+            'lost': self.has_lost(),
+        }
+
+    def to_dict(self) -> dict:
+        """ Returns the whole state, as a JSON-serialisable dict. """
+        version, internal, gauss = self.rng.getstate()
+        return {
+            'id': self.id,
+            'rows': self.engine.rows,
+            'cols': self.engine.cols,
+            'board': self.board,
+            'score': self.score,
+            'undos': self.undos,
+            'history': self.history,
+            'rng': [version, internal, gauss],
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'Session':
+        """ Rebuilds a session from Session.to_dict. """
+        session = cls.__new__(cls)
+        session.id = state['id']
+        session.engine = bitboard.get_engine(state['rows'], state['cols'])
+        session.board = state['board']
+        session.score = state['score']
+        session.undos = state['undos']
+        session.history = tuple((board, score) for board, score in state['history'])
+        version, internal, gauss = state['rng']
+        session.rng = random.Random()
+        session.rng.setstate((version, tuple(internal), gauss))
+        session.last_used = time.monotonic()
+        return session
+
+
+class SpoolInUseError(Exception):
+    """ Raised when another server holds the lock on a spool directory. """
+
+
+class SessionStore:
+    """ Holds the live sessions, spilling idle ones to a spool directory. """
+    def __init__(self, spool_dir: Optional[str] = None, idle_timeout: float = 300.0) -> None:
+        """
+        Parameters:
+            spool_dir: The directory evicted sessions are written to, or None
+                       for a new temporary directory that shutdown() removes.
+                       Any sessions spooled there by an earlier run are
+                       deleted.
+            idle_timeout: Seconds a session can go unused before it is evicted.
+
+        Raises:
+            SpoolInUseError: If another server is using spool_dir.
+        """
+        self._temporary = spool_dir is None
+        if spool_dir is None:
+            spool_dir = tempfile.mkdtemp(prefix='2048-sessions-')
+        self.spool_dir = spool_dir
+        self.idle_timeout = idle_timeout
+        self.sessions: dict[str, Session] = {}
+        self.evicted = 0
+        self.restored = 0
+        self._ids = itertools.count()
+        self._prefix = f'{os.getpid():x}-{int(time.time()):x}-'
+        # Sessions being written to the spool, and reads from it in progress
+        self._spooling: dict[str, Session] = {}
+        self._reading: dict[str, asyncio.Future] = {}
+        os.makedirs(spool_dir, exist_ok=True)
+        self._lock = self._take_lock()
+        # No request can name a session of an earlier run, so its file would never be removed
+        for name in os.listdir(spool_dir):
+            if SPOOL_FILE.fullmatch(name):
+                os.remove(os.path.join(spool_dir, name))
+
+    def _take_lock(self):
+        """ Locks the spool directory for this store, returning the open lock
+        file. The lock goes with the process, however it ends. """
+        lock = open(os.path.join(self.spool_dir, LOCK_FILE), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                lock.close()
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    raise SpoolInUseError(f'{self.spool_dir} is in use by another server')
+                raise
+        return lock
+
+    def shutdown(self) -> None:
+        """ Releases the spool directory, removing it if it was made for this
+        store. """
+        self._lock.close()
+        if self._temporary:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.spool_dir, f'{session_id}.json')
+
+    def create(self, seed: Optional[int], rows: int, cols: int) -> Session:
+        session = Session(f'{self._prefix}{next(self._ids)}', seed, rows, cols)
+        self.sessions[session.id] = session
+        return session
+
+    def _read(self, session_id: str) -> Optional[Session]:
+        """ Reads a session back from the spool and deletes its file. Returns
+        None if it is not there. Runs in a worker thread. """
+        try:
+            with open(self._path(session_id)) as f:
+                session = Session.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        os.remove(self._path(session_id))
+        return session
+
+    async def get(self, session_id: str) -> Session:
+        """ Returns a session, reading it back from the spool if it was
+        evicted. """
+        # Anything decoded from JSON may arrive here, including unhashable lists and dicts
+        if not isinstance(session_id, str):
+            raise RequestError(f'session must be a string, not {session_id!r}')
+        session = self.sessions.get(session_id)
+        if session is None:
+            # Ids are only ever made by create, so anything else is rejected
+            # before it gets near the file system
+            if not session_id.startswith(self._prefix) or not session_id[len(self._prefix):].isdigit():
+                raise RequestError(f'unknown session {session_id!r}')
+            session = self._spooling.pop(session_id, None)
+            if session is None:
+                # Requests for a session already being read wait for that read
+                reading = self._reading.get(session_id)
+                if reading is None:
+                    reading = self._reading[session_id] = asyncio.ensure_future(
+                        asyncio.to_thread(self._read, session_id))
+                    try:
+                        session = await reading
+                    finally:
+                        del self._reading[session_id]
+                    if session is not None:
+                        self.restored += 1
+                else:
+                    session = await reading
+                if session is None:
+                    raise RequestError(f'unknown session {session_id!r}')
+            self.sessions[session_id] = session
+        session.last_used = time.monotonic()
+        return session
+
+    async def close(self, session_id: str) -> None:
+        await self.get(session_id)
+        del self.sessions[session_id]
+
+    def _write(self, states: list[tuple[str, dict]]) -> None:
+        """ Writes sessions to the spool. Runs in a worker thread. """
+        for path, state in states:
+            with open(path, 'w') as f:
+                json.dump(state, f)
+
+    def _remove(self, paths: list[str]) -> None:
+        for path in paths:
+            os.remove(path)
+
+    async def evict_idle(self) -> int:
+        """ Writes every session idle for longer than idle_timeout to the
+        spool and drops it from memory. Returns how many were evicted. """
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [session for session in self.sessions.values() if session.last_used < cutoff]
+        # Their state is taken now, and a request for one of them while it is written gets it back
+        states = [(self._path(session.id), session.to_dict()) for session in idle]
+        for session in idle:
+            del self.sessions[session.id]
+            self._spooling[session.id] = session
+        try:
+            await asyncio.to_thread(self._write, states)
+        finally:
+            # Sessions taken back by get while being written have stale files
+            stale = [self._path(session.id) for session in idle
+                     if self._spooling.pop(session.id, None) is None]
+        if stale:
+            await asyncio.to_thread(self._remove, stale)
+        self.evicted += len(idle) - len(stale)
+        return len(idle) - len(stale)
+
+    def stats(self) -> dict:
+        return {
+            'ok': True,
+            'live': len(self.sessions),
+            'evicted': self.evicted,
+            'restored': self.restored,
+        }
+
+
+async def handle(store: SessionStore, request: dict) -> dict:
+    """ Carries out one request, returning the reply. """
+    op = request.get('op')
+    if op == 'new':
+        rows = request.get('rows', NUM_ROWS)
+        cols = request.get('cols', NUM_COLS)
+        if not (isinstance(rows, int) and isinstance(cols, int)
+                and bitboard.MIN_SIZE <= rows <= bitboard.MAX_SIZE
+                and bitboard.MIN_SIZE <= cols <= bitboard.MAX_SIZE):
+            raise RequestError(f'unsupported board size {rows}x{cols}')
+        seed = request.get('seed')
+        if seed is not None and not isinstance(seed, int):
+            raise RequestError('seed must be an integer')
+        return store.create(seed, rows, cols).to_reply()
+    if op == 'stats':
+        return store.stats()
+    if op == 'close':
+        await store.close(request.get('session'))
+        return {'ok': True}
+    session = await store.get(request.get('session'))
+    if op == 'move':
+        direction = request.get('direction')
+        if direction not in DIRECTIONS:
+            raise RequestError(f'unknown direction {direction!r}')
+        moved = session.move(direction)
+        reply = session.to_reply()
+        reply['moved'] = moved
+        return reply
+    if op == 'undo':
+        undone = session.undo()
+        reply = session.to_reply()
+        reply['undone'] = undone
+        return reply
+    if op == 'state':
+        return session.to_reply()
+    raise RequestError(f'unknown op {op!r}')
+
+
+async def serve_client(store: SessionStore, reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # readline raises this, not LimitOverrunError, for a line over the limit. The rest of
+                # the line is still unread, so the connection cannot carry on.
+                writer.write(json.dumps({'ok': False, 'error': 'request line too long'}).encode() + b'\n')
+                await writer.drain()
+                break
+            if not line:
+                break
+            request = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise RequestError('a request must be a JSON object')
+                reply = await handle(store, request)
+            # A field of the wrong type that slipped past the checks in handle is still the
+            # client's mistake, so it gets an error reply rather than ending the connection
+            except (ValueError, TypeError, RequestError) as e:
+                request = request if isinstance(request, dict) else {}
+                reply = {'ok': False, 'error': str(e)}
+            if 'id' in request:
+                reply['id'] = request['id']
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def evict_forever(store: SessionStore) -> None:
+    while True:
+        await asyncio.sleep(max(1.0, store.idle_timeout / 4))
+        await store.evict_idle()
+
+
+async def serve(store: SessionStore, host: str = '127.0.0.1', port: int = 2048,
+                unix_path: Optional[str] = None) -> None:
+    """ Serves clients until cancelled. Listens on unix_path if given,
+    otherwise on host and port. """
+    def client(reader, writer):
+        return serve_client(store, reader, writer)
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(client, unix_path)
+    else:
+        server = await asyncio.start_server(client, host, port)
+    evictor = asyncio.create_task(evict_forever(store))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        evictor.cancel()
+
+
+async def _open(host: str, port: int, unix_path: Optional[str]):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: dict) -> dict:
+    writer.write(json.dumps(request).encode() + b'\n')
+    return json.loads(await reader.readline())
+
+
+async def load_test(sessions: int, connections: int, duration: float, host: str = '127.0.0.1',
+                    port: int = 2048, unix_path: Optional[str] = None, seed: int = 0) -> dict:
+    """ Plays random moves on many sessions at once against a running server.
+
+    Parameters:
+        sessions: The number of sessions to open, spread over the connections.
+        connections: The number of client connections to use.
+        duration: Seconds to keep sending moves for.
+
+    Returns:
+        A summary including the sessions held by the server and the moves
+        per second achieved.
+    """
+    rng = random.Random(seed)
+    moves = 0
+
+    async def worker(count: int) -> None:
+        nonlocal moves
+        reader, writer = await _open(host, port, unix_path)
+        ids = []
+        for _ in range(count):
+            reply = await _request(reader, writer, {'op': 'new', 'seed': rng.randrange(2 ** 32)})
+            ids.append(reply['session'])
+        deadline = time.perf_counter() + duration
+        while ids and time.perf_counter() < deadline:
+            index = rng.randrange(len(ids))
+            reply = await _request(reader, writer, {'op': 'move', 'session': ids[index],
+                                                    'direction': rng.choice(DIRECTIONS)})
+            moves += 1
+            if reply.get('lost'):
+                # Replace a finished game so the session count stays level
+                await _request(reader, writer, {'op': 'close', 'session': ids[index]})
+                reply = await _request(reader, writer, {'op': 'new', 'seed': rng.randrange(2 ** 32)})
+                ids[index] = reply['session']
+        writer.close()
+
+    start = time.perf_counter()
+    per_connection = [sessions // connections + (i < sessions % connections) for i in range(connections)]
+    await asyncio.gather(*(worker(count) for count in per_connection))
+    elapsed = time.perf_counter() - start
+    reader, writer = await _open(host, port, unix_path)
+    stats = await _request(reader, writer, {'op': 'stats'})
+    writer.close()
+    return {
+        'connections': connections,
+        'sessions_held': stats['live'],
+        'sessions_evicted': stats['evicted'],
+        'moves': moves,
+        'moves_per_second': moves / elapsed,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Serve many 2048 games over newline-delimited JSON.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'load'):
+        command = commands.add_parser(name)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=2048)
+        command.add_argument('--unix', default=None, help='listen or connect on this Unix socket instead')
+    serve_parser = commands.choices['serve']
+    serve_parser.add_argument('--spool', default=None,
+                              help='directory evicted sessions are written to, defaulting to a new '
+                                   'temporary directory')
+    serve_parser.add_argument('--idle-timeout', type=float, default=300.0)
+    load_parser = commands.choices['load']
+    load_parser.add_argument('--sessions', type=int, default=1000)
+    load_parser.add_argument('--connections', type=int, default=10)
+    load_parser.add_argument('--duration', type=float, default=10.0)
+    load_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            store = SessionStore(args.spool, args.idle_timeout)
+        except SpoolInUseError as e:
+            parser.error(str(e))
+        try:
+            asyncio.run(serve(store, args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            store.shutdown()
+    else:
+        summary = asyncio.run(load_test(args.sessions, args.connections, args.duration,
+                                        args.host, args.port, args.unix, args.seed))
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
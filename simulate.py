@@ -0,0 +1,259 @@
+"""
+Headless batch simulator for 2048.
+
+Plays complete games without Tk using the packed board engine in bitboard.py,
+fanning them out across a multiprocessing pool. Each chunk of games is given
+its own seed derived from the base seed, so a run is reproducible no matter
+how the chunks are scheduled onto workers.
+
+Usage:
+    python simulate.py --games 10000 --policy greedy --workers 4
+    python simulate.py --policy mypackage.policies:corner_policy
+    python simulate.py --rows 5 --cols 5
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import random
+import time
+from typing import Callable, Iterator, Optional
+
+import bitboard
+from a3_support import NUM_ROWS, NUM_COLS, WIN_TILE
+
+WIN_RANK = WIN_TILE.bit_length() - 1
+
+# A legal move, as (direction, board after the move, score gained)
+Candidate = tuple[str, int, int]
+Policy = Callable[[int, list[Candidate], random.Random], str]
+
+
+def legal_moves(board: int, engine: bitboard.Engine) -> list[Candidate]:
+    """ Finds every move that changes the board.
+
+    Parameters:
+        board: The packed board.
+        engine: The engine for the board's size.
+
+    Returns:
+        A list of (direction, new board, score gained) for each legal move.
+    """
+    candidates = []
+    for direction, move in engine.moves.items():
+        new_board, gained = move(board)
+        if new_board != board:
+            candidates.append((direction, new_board, gained))
+    return candidates
+
+
+def random_policy(board: int, candidates: list[Candidate], rng: random.Random) -> str:
+    """ Picks a legal move uniformly at random. """
+    return rng.choice(candidates)[0]
+
+
+def greedy_policy(board: int, candidates: list[Candidate], rng: random.Random) -> str:
+    """ Picks the legal move with the largest immediate score gain, breaking
+    ties at random. """
+    best = max(gained for _, _, gained in candidates)
+    return rng.choice([direction for direction, _, gained in candidates if gained == best])
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+
+def load_policy(name: str) -> Policy:
+    """ Resolves a policy by name.
+
+    Parameters:
+        name: Either a key of POLICIES, or a 'module:function' path to a
+              user-supplied policy taking (board, candidates, rng) and
+              returning one of the candidate directions.
+
+    Returns:
+        The policy function.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise ValueError(f'unknown policy {name!r}')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def play_game(policy: Policy, rng: random.Random, engine: bitboard.Engine) -> tuple[int, int, int]:
+    """ Plays one game to completion.
+
+    Parameters:
+        policy: Chooses a direction from the legal moves on each turn.
+        rng: The random number generator used for spawns and by the policy.
+        engine: The engine for the board size to play on.
+
+    Returns:
+        A tuple of (score, max tile rank, number of moves).
+    """
+    board = engine.add_random_tile(engine.add_random_tile(0, rng), rng)
+    score = 0
+    moves = 0
+    candidates = legal_moves(board, engine)
+    while candidates:
+        direction = policy(board, candidates, rng)
+        for candidate, new_board, gained in candidates:
+            if candidate == direction:
+                break
+        else:
+            raise ValueError(f'policy chose illegal move {direction!r}')
+        board = engine.add_random_tile(new_board, rng)
+        score += gained
+        moves += 1
+        candidates = legal_moves(board, engine)
+    return score, engine.max_rank(board), moves
+
+
+class Summary:
+    """ Aggregated results over a number of games.
+
+    Scores are kept in fixed-width buckets so memory stays constant however
+    many games are merged in.
+    """
+    BUCKET_WIDTH = 1024
+
+    def __init__(self) -> None:
+        self.games = 0
+        self.wins = 0
+        self.moves = 0
+        self.total_score = 0
+        self.min_score: Optional[int] = None
+        self.max_score = 0
+        self.score_buckets: dict[int, int] = {}
+        self.max_tiles: dict[int, int] = {}
+        self.elapsed = 0.0
+
+    def add_game(self, score: int, rank: int, moves: int) -> None:
+        """ Adds the result of a single game. """
+        self.games += 1
+        self.moves += moves
+        self.total_score += score
+        self.wins += rank >= WIN_RANK
+        if self.min_score is None or score < self.min_score:
+            self.min_score = score
+        self.max_score = max(self.max_score, score)
+        bucket = score // self.BUCKET_WIDTH * self.BUCKET_WIDTH
+        self.score_buckets[bucket] = self.score_buckets.get(bucket, 0) + 1
+        tile = 1 << rank
+        self.max_tiles[tile] = self.max_tiles.get(tile, 0) + 1
+
+    def merge(self, other: 'Summary') -> None:
+        """ Adds every game from another summary into this one. """
+        self.games += other.games
+        self.wins += other.wins
+        self.moves += other.moves
+        self.total_score += other.total_score
+        if other.min_score is not None and (self.min_score is None or other.min_score < self.min_score):
+            self.min_score = other.min_score
+        self.max_score = max(self.max_score, other.max_score)
+        for bucket, count in other.score_buckets.items():
+            self.score_buckets[bucket] = self.score_buckets.get(bucket, 0) + count
+        for tile, count in other.max_tiles.items():
+            self.max_tiles[tile] = self.max_tiles.get(tile, 0) + count
+        self.elapsed += other.elapsed
+
+    def to_dict(self, wall_time: Optional[float] = None) -> dict:
+        """ Returns the summary as a JSON-serialisable dict.
+
+        Parameters:
+            wall_time: Seconds of wall-clock time the run has taken so far.
+                       Moves per second is reported against this if given,
+                       otherwise against the time spent inside workers.
+        """
+        seconds = wall_time if wall_time is not None else self.elapsed
+        return {
+            'games': self.games,
+            'win_rate': self.wins / self.games if self.games else 0.0,
+            'mean_score': self.total_score / self.games if self.games else 0.0,
+            'min_score': self.min_score,
+            'max_score': self.max_score,
+            'score_histogram': {str(k): v for k, v in sorted(self.score_buckets.items())},
+            'max_tile_histogram': {str(k): v for k, v in sorted(self.max_tiles.items())},
+            'moves': self.moves,
+            'moves_per_second': self.moves / seconds if seconds else 0.0,
+        }
+
+
+def run_chunk(args: tuple[str, int, int, int, int]) -> Summary:
+    """ Plays a chunk of games in a worker process.
+
+    Parameters:
+        args: A tuple of (policy name, number of games, seed, rows, columns).
+
+    Returns:
+        The summary of the chunk.
+    """
+    policy_name, games, seed, rows, cols = args
+    policy = load_policy(policy_name)
+    engine = bitboard.get_engine(rows, cols)
+    rng = random.Random(seed)
+    summary = Summary()
+    start = time.perf_counter()
+    for _ in range(games):
+        summary.add_game(*play_game(policy, rng, engine))
+    summary.elapsed = time.perf_counter() - start
+    return summary
+
+
+def simulate(games: int, policy: str = 'random', workers: Optional[int] = None,
+             seed: int = 0, chunk_size: int = 100,
+             rows: int = NUM_ROWS, cols: int = NUM_COLS) -> Iterator[Summary]:
+    """ Runs games across a process pool, streaming results as they arrive.
+
+    Parameters:
+        games: Total number of games to play.
+        policy: The policy name, see load_policy.
+        workers: Number of worker processes, defaulting to the CPU count.
+        seed: Base seed; chunk i is played with seed + i.
+        chunk_size: Number of games each task plays before reporting back.
+        rows: The number of rows on the board.
+        cols: The number of columns on the board.
+
+    Yields:
+        The running total Summary after each chunk completes.
+    """
+    load_policy(policy)
+    tasks = []
+    for i, start in enumerate(range(0, games, chunk_size)):
+        tasks.append((policy, min(chunk_size, games - start), seed + i, rows, cols))
+    total = Summary()
+    with multiprocessing.Pool(workers) as pool:
+        for summary in pool.imap_unordered(run_chunk, tasks):
+            total.merge(summary)
+            yield total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Play 2048 games headlessly.')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--policy', default='random',
+                        help="'random', 'greedy' or a 'module:function' path")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=NUM_ROWS)
+    parser.add_argument('--cols', type=int, default=NUM_COLS)
+    parser.add_argument('--progress', action='store_true',
+                        help='print a JSON line after every chunk')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = Summary()
+    for total in simulate(args.games, args.policy, args.workers, args.seed, args.chunk_size,
+                          args.rows, args.cols):
+        if args.progress:
+            print(json.dumps(total.to_dict(time.perf_counter() - start)), flush=True)
+    print(json.dumps(total.to_dict(time.perf_counter() - start), indent=2))
+
+
+if __name__ == '__main__':
+    main()
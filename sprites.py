@@ -0,0 +1,215 @@
+"""
+Pre-rendered tile images for the game grid.
+
+Every tile is drawn once per (value, size) into a PhotoImage, and the grid
+shows each cell as a single image item over one image of the empty board.
+Redraws then only swap which image an item shows, rather than recolouring a
+rectangle and laying out text.
+
+Colours come from COLOURS and FG_COLOURS in a3_support up to 2048, and are
+derived from the rank of the tile beyond that, so tiles of any power of two
+can be drawn. Numbers are drawn from a built-in 5x7 pixel font scaled to the
+tile, since PhotoImage cannot render text itself.
+"""
+import colorsys
+import tkinter as tk
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from a3_support import COLOURS, FG_COLOURS, LIGHT, DARK, BACKGROUND_COLOUR
+
+# Each digit as 7 rows of 5 pixels
+GLYPHS = {
+    '0': ('01110', '10001', '10011', '10101', '11001', '10001', '01110'),
+    '1': ('00100', '01100', '00100', '00100', '00100', '00100', '01110'),
+    '2': ('01110', '10001', '00001', '00010', '00100', '01000', '11111'),
+    '3': ('11111', '00010', '00100', '00010', '00001', '10001', '01110'),
+    '4': ('00010', '00110', '01010', '10010', '11111', '00010', '00010'),
+    '5': ('11111', '10000', '11110', '00001', '00001', '10001', '01110'),
+    '6': ('00110', '01000', '10000', '11110', '10001', '10001', '01110'),
+    '7': ('11111', '00001', '00010', '00100', '01000', '01000', '01000'),
+    '8': ('01110', '10001', '10001', '01110', '10001', '10001', '01110'),
+    '9': ('01110', '10001', '10001', '01111', '00001', '00010', '01100'),
+}
+GLYPH_WIDTH = 5
+GLYPH_HEIGHT = 7
+# Fractions of the tile the number may take up: its height, and its width
+TEXT_HEIGHT = 0.3
+TEXT_WIDTH = 0.8
+
+
+def _runs(row: str) -> tuple[tuple[int, int], ...]:
+    """ Returns the (start, end) of each run of lit pixels in a glyph row. """
+    runs = []
+    start = None
+    for index, pixel in enumerate(row + '0'):
+        if pixel == '1' and start is None:
+            start = index
+        elif pixel == '0' and start is not None:
+            runs.append((start, index))
+            start = None
+    return tuple(runs)
+
+
+GLYPH_ROWS = {digit: tuple(_runs(row) for row in rows) for digit, rows in GLYPHS.items()}
+
+
+# The largest tile with a hand-picked colour. The tile after it gets
+# BEYOND_LIGHTNESS, and each doubling from there turns the hue by HUE_STEP and
+# darkens the tile by LIGHTNESS_STEP, down to MIN_LIGHTNESS.
+LARGEST_STYLED = max(value for value in COLOURS if value is not None)
+BEYOND_LIGHTNESS = 0.45
+HUE_STEP = 0.09
+LIGHTNESS_STEP = 0.04
+MIN_LIGHTNESS = 0.2
+MAX_SATURATION = 0.6
+
+# A rectangle of pixels, as (x_min, y_min, x_max, y_max) with the maxima
+# exclusive
+Rect = tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=None)
+def tile_colours(value: int) -> tuple[str, str]:
+    """ Returns the (background, foreground) colours of a tile.
+
+    Parameters:
+        value: The tile's number, a power of two.
+    """
+    if value in COLOURS:
+        return COLOURS[value], FG_COLOURS[value]
+    # Beyond the hand-picked colours, each doubling turns the hue a little
+    # further and darkens the tile, so neighbouring ranks stay distinct
+    steps = value.bit_length() - LARGEST_STYLED.bit_length()
+    red, green, blue = (int(COLOURS[LARGEST_STYLED][i:i + 2], 16) / 255 for i in (1, 3, 5))
+    hue, lightness, saturation = colorsys.rgb_to_hls(red, green, blue)
+    hue = (hue + steps * HUE_STEP) % 1
+    lightness = max(MIN_LIGHTNESS, BEYOND_LIGHTNESS - (steps - 1) * LIGHTNESS_STEP)
+    red, green, blue = colorsys.hls_to_rgb(hue, lightness, min(saturation, MAX_SATURATION))
+    background = '#{:02x}{:02x}{:02x}'.format(*(round(channel * 255) for channel in (red, green, blue)))
+    luminance = 0.299 * red + 0.587 * green + 0.114 * blue
+    return background, LIGHT if luminance < 0.6 else DARK
+
+
+def glyph_scale(digits: int, size: int) -> int:
+    """ Returns the pixels per font pixel for a number of the given length
+    on a tile of the given size, so that longer numbers still fit. """
+    by_height = size * TEXT_HEIGHT / GLYPH_HEIGHT
+    # Digits are separated by one font pixel
+    by_width = size * TEXT_WIDTH / (digits * (GLYPH_WIDTH + 1) - 1)
+    return max(1, int(min(by_height, by_width)))
+
+
+@lru_cache(maxsize=1024)
+def number_rects(value: int, size: int) -> tuple[Rect, ...]:
+    """ Lays out a tile's number.
+
+    Parameters:
+        value: The number to draw.
+        size: The width and height of the tile, in pixels.
+
+    Returns:
+        The rectangles to fill with the foreground colour, centred on the
+        tile. Runs of lit font pixels in a row are merged into one rectangle.
+        A number too long for even the smallest font is cropped at the edges.
+    """
+    text = str(value)
+    scale = glyph_scale(len(text), size)
+    width = (len(text) * (GLYPH_WIDTH + 1) - 1) * scale
+    left = (size - width) // 2
+    top = (size - GLYPH_HEIGHT * scale) // 2
+    rects = []
+    for index, digit in enumerate(text):
+        x = left + index * (GLYPH_WIDTH + 1) * scale
+        for row, pixels in enumerate(GLYPH_ROWS[digit]):
+            y = top + row * scale
+            for start, end in pixels:
+                x_min = max(0, x + start * scale)
+                x_max = min(size, x + end * scale)
+                if x_min < x_max:
+                    rects.append((x_min, y, x_max, y + scale))
+    return tuple(rects)
+
+
+def render_board(master: Optional[tk.Misc], width: int, height: int,
+                 cells: list[Rect]) -> tk.PhotoImage:
+    """ Draws the empty board.
+
+    Parameters:
+        master: The widget whose Tk interpreter owns the image.
+        width: The width of the board, in pixels.
+        height: The height of the board, in pixels.
+        cells: Where to draw each empty cell.
+
+    Returns:
+        The background colour with every cell in the empty cell colour.
+    """
+    board = tk.PhotoImage(master=master, width=width, height=height)
+    board.put(BACKGROUND_COLOUR, to=(0, 0, width, height))
+    for rect in cells:
+        board.put(COLOURS[None], to=rect)
+    return board
+
+
+class SpriteCache:
+    """ A bounded LRU cache of tile images keyed by (value, size).
+
+    An image evicted here stays valid for as long as something else holds a
+    reference to it, so callers should keep the images they are showing.
+    """
+    def __init__(self, master: Optional[tk.Misc] = None, max_sprites: int = 256) -> None:
+        """
+        Parameters:
+            master: The widget whose Tk interpreter owns the images.
+            max_sprites: The most images to hold.
+        """
+        self.master = master
+        self.max_sprites = max_sprites
+        self._sprites: OrderedDict[tuple[int, int], tk.PhotoImage] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    def get(self, value: int, size: int) -> tk.PhotoImage:
+        """ Returns the image of a tile, rendering it if not cached.
+
+        Parameters:
+            value: The tile's number.
+            size: The width and height of the image, in pixels.
+        """
+        key = (value, size)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self._render(value, size)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_sprites:
+            self._sprites.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def _render(self, value: int, size: int) -> tk.PhotoImage:
+        background, foreground = tile_colours(value)
+        sprite = tk.PhotoImage(master=self.master, width=size, height=size)
+        sprite.put(background, to=(0, 0, size, size))
+        for rect in number_rects(value, size):
+            sprite.put(foreground, to=rect)
+        return sprite
+
+    def clear(self) -> None:
+        self._sprites.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'sprites': len(self._sprites),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,171 @@
+"""
+Precomputed lookup tables shared through a memory-mapped file.
+
+Building the move tables in bitboard.py and the heuristic tables in ai.py
+takes the better part of a second in every process that uses them. Running
+
+    python tables.py build
+
+writes them all once to a versioned file. From then on bitboard and ai map
+that file read-only when they first need the tables, so every process on a
+host shares a single copy through the page cache and loading them takes
+milliseconds. If the file is missing or was written for another
+TABLES_VERSION, the tables are built in-process as before.
+
+The file is little-endian:
+
+    magic        8s   b'2048TBL\\0'
+    version      I    TABLES_VERSION
+    count        I    number of tables
+    directory    count * (name 32s, array typecode c, 7 pad bytes,
+                          offset Q, number of items Q)
+    data         the items of each table, each starting on an 8-byte boundary
+
+Usage:
+    python tables.py build [--path PATH]
+    python tables.py show [--path PATH]
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Optional
+
+MAGIC = b'2048TBL\0'
+# Bump whenever the contents or meaning of any table changes
+TABLES_VERSION = 1
+HEADER = struct.Struct('<8sII')
+ENTRY = struct.Struct('<32sc7xQQ')
+ALIGNMENT = 8
+# Points at a tables file elsewhere, or, if set but empty, turns the file off
+PATH_VARIABLE = 'BITBOARD_TABLES'
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables.bin')
+
+# A table to write, as (array typecode, values)
+TableData = tuple[str, Iterable]
+
+
+def tables_path() -> str:
+    """ Returns the path of the tables file this process uses, or an empty
+    string if it has been turned off. """
+    return os.environ.get(PATH_VARIABLE, DEFAULT_PATH)
+
+
+def write(path: str, tables: dict[str, TableData]) -> None:
+    """ Writes tables to a file.
+
+    The file is written next to path and then moved into place, so processes
+    mapping the old file are never shown a partly written one.
+
+    Parameters:
+        path: The file to write.
+        tables: Maps each table name to (array typecode, values).
+    """
+    arrays = []
+    for name, (typecode, values) in tables.items():
+        items = array(typecode, values)
+        if sys.byteorder != 'little':
+            items.byteswap()
+        arrays.append((name, items))
+    offset = HEADER.size + ENTRY.size * len(arrays)
+    directory = []
+    for name, items in arrays:
+        offset += -offset % ALIGNMENT
+        directory.append(ENTRY.pack(name.encode('ascii'), items.typecode.encode('ascii'),
+                                    offset, len(items)))
+        offset += len(items) * items.itemsize
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, TABLES_VERSION, len(arrays)))
+        f.write(b''.join(directory))
+        for name, items in arrays:
+            f.write(b'\0' * (-f.tell() % ALIGNMENT))
+            items.tofile(f)
+    os.replace(temporary, path)
+
+
+# Mapped files by path. The maps stay open for the life of the process.
+_MAPPED: dict[str, Optional[dict[str, memoryview]]] = {}
+
+
+def load(path: Optional[str] = None) -> Optional[dict[str, memoryview]]:
+    """ Maps a tables file read-only.
+
+    Parameters:
+        path: The file to map, defaulting to tables_path().
+
+    Returns:
+        A dict from table name to a memoryview of its items, or None if the
+        file is missing, turned off or not a valid file of this version.
+    """
+    if path is None:
+        path = tables_path()
+    if path in _MAPPED:
+        return _MAPPED[path]
+    tables = None
+    # Memoryviews index in native byte order
+    if path and sys.byteorder == 'little':
+        tables = _map(path)
+    _MAPPED[path] = tables
+    return tables
+
+
+def _map(path: str) -> Optional[dict[str, memoryview]]:
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mapped) < HEADER.size:
+        return None
+    magic, version, count = HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != TABLES_VERSION or len(mapped) < HEADER.size + count * ENTRY.size:
+        return None
+    view = memoryview(mapped)
+    tables = {}
+    for index in range(count):
+        name, typecode, offset, length = ENTRY.unpack_from(mapped, HEADER.size + index * ENTRY.size)
+        typecode = typecode.decode('ascii')
+        end = offset + length * array(typecode).itemsize
+        if end > len(mapped):
+            return None
+        tables[name.rstrip(b'\0').decode('ascii')] = view[offset:end].cast(typecode)
+    return tables
+
+
+def get(name: str) -> Optional[memoryview]:
+    """ Returns a table from the mapped tables file, or None if the file or
+    the table is not available. """
+    tables = load()
+    return tables.get(name) if tables is not None else None
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    # Imported here rather than at the top, as every process that imports
+    # bitboard imports this module
+    import argparse
+    parser = argparse.ArgumentParser(description='Build or inspect the shared lookup tables file.')
+    parser.add_argument('command', choices=('build', 'show'))
+    parser.add_argument('--path', default=None, help=f'defaults to ${PATH_VARIABLE} or {DEFAULT_PATH}')
+    args = parser.parse_args(argv)
+    path = args.path or tables_path() or DEFAULT_PATH
+
+    if args.command == 'build':
+        # Imported here, as they use this module to find the file at import
+        import ai
+        import bitboard
+        tables = bitboard.shared_tables()
+        tables.update(ai.shared_tables())
+        write(path, tables)
+        print(f'wrote {len(tables)} tables to {path} ({os.path.getsize(path)} bytes)')
+    else:
+        tables = _map(path)
+        if tables is None:
+            sys.exit(f'{path} is not a tables file of version {TABLES_VERSION}')
+        for name, view in tables.items():
+            print(f'{name:<32} {view.format} x {len(view)}')
+
+
+if __name__ == '__main__':
+    main()
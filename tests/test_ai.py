@@ -0,0 +1,92 @@
+"""
+Tests for the expectimax solver and its evaluation.
+"""
+import random
+import unittest
+
+import ai
+import bitboard
+from tests.test_bitboard import random_tiles
+
+LOST = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+
+
+def random_boards(count: int, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    return [bitboard.encode(random_tiles(4, 4, rng, 10)) for _ in range(count)]
+
+
+class EvaluatorTest(unittest.TestCase):
+    def test_tables_match_line_scores(self):
+        evaluator = ai.Evaluator()
+        for board in random_boards(100, 1):
+            tiles = [[tile.bit_length() - 1 if tile else 0 for tile in row]
+                     for row in bitboard.decode(board)]
+            lines = tiles + [list(column) for column in zip(*tiles)]
+            expected = sum(evaluator._line_score(line) for line in lines)
+            top = bitboard.max_rank(board)
+            if top in (tiles[0][0], tiles[0][3], tiles[3][0], tiles[3][3]):
+                expected += evaluator.weights['corner'] * top
+            with self.subTest(board=hex(board)):
+                self.assertAlmostEqual(evaluator.evaluate(board), expected, places=6)
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def test_only_hits_deep_enough_searches(self):
+        table = ai.TranspositionTable()
+        table.put(1, 2, 5.0)
+        self.assertEqual(table.get(1, 2), 5.0)
+        self.assertEqual(table.get(1, 1), 5.0)
+        self.assertIsNone(table.get(1, 3))
+        self.assertIsNone(table.get(2, 1))
+
+    def test_evicts_least_recently_used(self):
+        table = ai.TranspositionTable(max_entries=2)
+        table.put(1, 1, 1.0)
+        table.put(2, 1, 2.0)
+        table.get(1, 1)
+        table.put(3, 1, 3.0)
+        self.assertEqual(len(table), 2)
+        self.assertIsNone(table.get(2, 1))
+        self.assertEqual(table.get(1, 1), 1.0)
+        self.assertEqual(table.stats()['evictions'], 1)
+
+    def test_symmetric_boards_share_entries(self):
+        table = ai.TranspositionTable(symmetric=True)
+        board = random_boards(1, 4)[0]
+        table.put(board, 2, 7.0)
+        for symmetry in range(len(bitboard.SYMMETRIES)):
+            self.assertEqual(table.get(bitboard.apply_symmetry(board, symmetry), 2), 7.0)
+        self.assertEqual(len(table), 1)
+
+
+class ExpectimaxSolverTest(unittest.TestCase):
+    def test_no_move_on_lost_board(self):
+        board = bitboard.encode(LOST)
+        self.assertIsNone(ai.ExpectimaxSolver(depth=2).best_move(board))
+        self.assertEqual(ai.ExpectimaxSolver()._leaf(board), ai.LOSS_VALUE)
+
+    def test_best_move_is_legal(self):
+        solver = ai.ExpectimaxSolver(depth=2)
+        timed = ai.ExpectimaxSolver(depth=6, time_limit=0.01)
+        for board in random_boards(30, 2):
+            legal = bitboard.legal_moves(board)
+            for chosen in (solver.best_move(board), timed.best_move(board)):
+                with self.subTest(board=hex(board)):
+                    if legal:
+                        self.assertTrue(legal & bitboard.MOVE_BITS[chosen])
+                    else:
+                        self.assertIsNone(chosen)
+
+    def test_repeated_search_uses_table(self):
+        solver = ai.ExpectimaxSolver(depth=3)
+        board = random_boards(1, 3)[0]
+        first = solver.best_move(board)
+        nodes = solver.nodes
+        self.assertEqual(solver.best_move(board), first)
+        # Every chance node below the root is cached now
+        self.assertLess(solver.nodes, nodes)
+        self.assertGreater(solver.table.hits, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests for the NumPy batch move engine, checked against the list-based moves
+in a3_support.
+"""
+import random
+import unittest
+
+from a3_support import LEFT, UP, DOWN, RIGHT
+from tests.test_bitboard import support_move, random_tiles
+
+try:
+    import numpy as np
+    import batch
+except ImportError:
+    batch = None
+
+DIRECTIONS = (LEFT, UP, DOWN, RIGHT)
+
+
+@unittest.skipIf(batch is None, 'needs NumPy')
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        self.tiles = [random_tiles(4, 4, rng) for _ in range(300)]
+        # Full boards, some with merges left and some without
+        self.tiles += [[[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]],
+                       [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 4]]]
+        self.boards = batch.from_tiles(self.tiles)
+
+    def test_tiles_round_trip(self):
+        self.assertEqual(batch.to_tiles(self.boards), self.tiles)
+
+    def test_moves_match_support(self):
+        for direction in DIRECTIONS:
+            moved, scores, changed = batch.move(self.boards, direction)
+            moved_tiles = batch.to_tiles(moved)
+            for n, tiles in enumerate(self.tiles):
+                expected, gained = support_move(tiles, direction)
+                with self.subTest(direction=direction, tiles=tiles):
+                    self.assertEqual(moved_tiles[n], expected)
+                    self.assertEqual(scores[n], gained)
+                    self.assertEqual(changed[n], expected != tiles)
+
+    def test_terminal_checks(self):
+        lost = batch.has_lost(self.boards)
+        won = batch.has_won(self.boards, win_rank=6)
+        for n, tiles in enumerate(self.tiles):
+            with self.subTest(tiles=tiles):
+                self.assertEqual(lost[n], all(support_move(tiles, d)[0] == tiles for d in DIRECTIONS))
+                self.assertEqual(won[n], any(tile and tile >= 64 for row in tiles for tile in row))
+
+    def test_generate_tile_fills_one_empty_cell(self):
+        spawned = batch.generate_tile(self.boards, np.random.default_rng(0))
+        for before, after in zip(self.boards, spawned):
+            added = after != before
+            with self.subTest(board=before.tolist()):
+                self.assertEqual(int(added.sum()), 1 if (before == 0).any() else 0)
+                self.assertTrue((before[added] == 0).all())
+                self.assertTrue(np.isin(after[added], (1, 2)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""
+Tests for the packed board engine, checked against the list-based moves in
+a3_support.
+"""
+import random
+import unittest
+from typing import Optional
+
+import bitboard
+from a3_support import (LEFT, UP, DOWN, RIGHT, stack_left, combine_left, reverse, transpose,
+                        generate_tile)
+
+DIRECTIONS = (LEFT, UP, DOWN, RIGHT)
+SIZES = ((2, 2), (3, 5), (4, 4), (5, 3), (6, 6), (8, 8))
+
+Tiles = list[list[Optional[int]]]
+
+
+def support_move(tiles: Tiles, direction: str) -> tuple[Tiles, int]:
+    """ Moves tiles the way Model does, returning the new tiles and the score
+    gained. """
+    if direction in (UP, DOWN):
+        tiles = transpose(tiles)
+    if direction in (RIGHT, DOWN):
+        tiles = reverse(tiles)
+    combined, gained = combine_left(stack_left(tiles))
+    tiles = stack_left(combined)
+    if direction in (RIGHT, DOWN):
+        tiles = reverse(tiles)
+    if direction in (UP, DOWN):
+        tiles = transpose(tiles)
+    return tiles, gained
+
+
+def random_tiles(rows: int, cols: int, rng: random.Random, max_rank: int = bitboard.MAX_RANK - 1) -> Tiles:
+    """ Returns random tiles below the engine's cap, with about a third of
+    the cells empty and small ranks common, so merges come up often. """
+    tiles = []
+    for _ in range(rows):
+        row = []
+        for _ in range(cols):
+            rank = rng.choice((0, 0, rng.randint(1, 3), rng.randint(1, max_rank)))
+            row.append(1 << rank if rank else None)
+        tiles.append(row)
+    return tiles
+
+
+def legal_mask(tiles: Tiles) -> int:
+    """ Returns the MOVE_BITS of every direction that changes tiles. """
+    mask = 0
+    for direction in DIRECTIONS:
+        if support_move(tiles, direction)[0] != tiles:
+            mask |= bitboard.MOVE_BITS[direction]
+    return mask
+
+
+def largest_rank(tiles: Tiles) -> int:
+    largest = max((tile for row in tiles for tile in row if tile), default=None)
+    return largest.bit_length() - 1 if largest else 0
+
+
+class MoveTest(unittest.TestCase):
+    def test_moves_match_support(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            tiles = random_tiles(4, 4, rng)
+            board = bitboard.encode(tiles)
+            for direction in DIRECTIONS:
+                expected, gained = support_move(tiles, direction)
+                moved, score = bitboard.move(board, direction)
+                with self.subTest(tiles=tiles, direction=direction):
+                    self.assertEqual(bitboard.decode(moved), expected)
+                    self.assertEqual(score, gained)
+
+    def test_legal_moves_and_max_rank(self):
+        rng = random.Random(2)
+        for _ in range(500):
+            tiles = random_tiles(4, 4, rng)
+            board = bitboard.encode(tiles)
+            with self.subTest(tiles=tiles):
+                self.assertEqual(bitboard.legal_moves(board), legal_mask(tiles))
+                self.assertEqual(bitboard.max_rank(board), largest_rank(tiles))
+
+    def test_encode_round_trip(self):
+        rng = random.Random(3)
+        for _ in range(20):
+            tiles = random_tiles(4, 4, rng, bitboard.MAX_RANK)
+            self.assertEqual(bitboard.decode(bitboard.encode(tiles)), tiles)
+
+    def test_encode_rejects_tiles_above_cap(self):
+        tiles = [[bitboard.MAX_TILE * 2, 2, None, None]] + [[None] * 4 for _ in range(3)]
+        with self.assertRaises(ValueError):
+            bitboard.encode(tiles)
+
+
+class SpawnTest(unittest.TestCase):
+    def test_spawns_like_generate_tile(self):
+        rng = random.Random(6)
+        for _ in range(500):
+            tiles = random_tiles(4, 4, rng)
+            if all(all(row) for row in tiles):
+                continue
+            board = bitboard.encode(tiles)
+            state = rng.getstate()
+            (row, col), number = generate_tile(tiles, rng)
+            rng.setstate(state)
+            spawned = bitboard.add_random_tile(board, rng)
+            tiles[row][col] = number
+            with self.subTest(board=hex(board)):
+                self.assertEqual(bitboard.decode(spawned), tiles)
+
+    def test_empty_positions(self):
+        rng = random.Random(7)
+        for _ in range(100):
+            tiles = random_tiles(4, 4, rng)
+            expected = [(row, col) for row in range(4) for col in range(4) if tiles[row][col] is None]
+            board = bitboard.encode(tiles)
+            self.assertEqual(bitboard.empty_positions(board), expected)
+            self.assertEqual(bitboard.empty_mask(board).bit_count(), len(expected))
+
+
+class EngineTest(unittest.TestCase):
+    def test_moves_match_support(self):
+        rng = random.Random(1)
+        for rows, cols in SIZES:
+            engine = bitboard.get_engine(rows, cols)
+            for _ in range(200):
+                tiles = random_tiles(rows, cols, rng)
+                board = engine.encode(tiles)
+                for direction in DIRECTIONS:
+                    expected, gained = support_move(tiles, direction)
+                    moved, score = engine.move(board, direction)
+                    with self.subTest(size=(rows, cols), tiles=tiles, direction=direction):
+                        self.assertEqual(engine.decode(moved), expected)
+                        self.assertEqual(score, gained)
+
+    def test_legal_moves_and_max_rank(self):
+        rng = random.Random(2)
+        for rows, cols in SIZES:
+            engine = bitboard.get_engine(rows, cols)
+            for _ in range(200):
+                tiles = random_tiles(rows, cols, rng)
+                board = engine.encode(tiles)
+                with self.subTest(size=(rows, cols), tiles=tiles):
+                    self.assertEqual(engine.legal_moves(board), legal_mask(tiles))
+                    self.assertEqual(engine.max_rank(board), largest_rank(tiles))
+
+    def test_encode_round_trip(self):
+        rng = random.Random(3)
+        for rows, cols in SIZES:
+            engine = bitboard.get_engine(rows, cols)
+            tiles = random_tiles(rows, cols, rng, bitboard.MAX_RANK)
+            self.assertEqual(engine.decode(engine.encode(tiles)), tiles)
+
+    def test_spawns_like_generate_tile(self):
+        rng = random.Random(6)
+        for rows, cols in SIZES:
+            engine = bitboard.get_engine(rows, cols)
+            for _ in range(50):
+                tiles = random_tiles(rows, cols, rng)
+                if all(all(row) for row in tiles):
+                    continue
+                board = engine.encode(tiles)
+                state = rng.getstate()
+                (row, col), number = generate_tile(tiles, rng)
+                rng.setstate(state)
+                spawned = engine.add_random_tile(board, rng)
+                tiles[row][col] = number
+                with self.subTest(size=(rows, cols), board=hex(board)):
+                    self.assertEqual(engine.decode(spawned), tiles)
+
+    def test_overflows(self):
+        for rows, cols in SIZES:
+            engine = bitboard.get_engine(rows, cols)
+            tiles = [[None] * cols for _ in range(rows)]
+            tiles[0][0] = tiles[0][1] = bitboard.MAX_TILE
+            board = engine.encode(tiles)
+            with self.subTest(size=(rows, cols)):
+                self.assertTrue(engine.overflows(board, LEFT))
+                self.assertTrue(engine.overflows(board, RIGHT))
+                self.assertFalse(engine.overflows(board, UP))
+                self.assertFalse(engine.overflows(board, DOWN))
+        # Tiles that pair off before reaching the cap do not overflow
+        engine = bitboard.get_engine(2, 3)
+        board = engine.encode([[bitboard.MAX_TILE, 1024, 1024], [None, None, None]])
+        self.assertFalse(engine.overflows(board, LEFT))
+
+    def test_rejects_unsupported_sizes(self):
+        for rows, cols in ((1, 4), (4, 9), (0, 0)):
+            with self.subTest(size=(rows, cols)), self.assertRaises(ValueError):
+                bitboard.get_engine(rows, cols)
+
+
+class SymmetryTest(unittest.TestCase):
+    def test_directions_follow_symmetries(self):
+        rng = random.Random(4)
+        for _ in range(100):
+            board = bitboard.encode(random_tiles(4, 4, rng))
+            for symmetry in range(len(bitboard.SYMMETRIES)):
+                image = bitboard.apply_symmetry(board, symmetry)
+                for direction in DIRECTIONS:
+                    mapped = bitboard.TO_CANONICAL[symmetry][direction]
+                    self.assertEqual(bitboard.FROM_CANONICAL[symmetry][mapped], direction)
+                    moved, score = bitboard.move(board, direction)
+                    moved_image, image_score = bitboard.move(image, mapped)
+                    with self.subTest(board=hex(board), symmetry=symmetry, direction=direction):
+                        self.assertEqual(bitboard.apply_symmetry(moved, symmetry), moved_image)
+                        self.assertEqual(score, image_score)
+
+    def test_canonical(self):
+        rng = random.Random(5)
+        for _ in range(100):
+            board = bitboard.encode(random_tiles(4, 4, rng))
+            key, symmetry = bitboard.canonical(board)
+            self.assertEqual(bitboard.apply_symmetry(board, symmetry), key)
+            for other in range(len(bitboard.SYMMETRIES)):
+                self.assertEqual(bitboard.canonical_key(bitboard.apply_symmetry(board, other)), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Tests for the headless game models.
+"""
+import random
+import unittest
+
+import bitboard
+from a3_support import DOWN, RIGHT
+from core import Model, BitboardModel, UndoHistory, UNDO
+
+KEYS = 'wasd'
+
+
+def play_both(seed: int, turns: int, **size) -> tuple[Model, BitboardModel]:
+    """ Plays the same random keys, with the odd undo, on a Model and a
+    BitboardModel made from the same seed, checking they agree every turn. """
+    model = Model(seed, **size)
+    packed = BitboardModel(seed, **size)
+    rng = random.Random(seed)
+    for _ in range(turns):
+        if rng.random() < 0.05:
+            model.use_undo()
+            packed.use_undo()
+        else:
+            key = rng.choice(KEYS)
+            if model.play(key) != packed.play(key):
+                raise AssertionError(f'play({key!r}) disagrees')
+        if model.matrix != packed.matrix or model.score != packed.score:
+            raise AssertionError('the models have diverged')
+        if model.has_lost():
+            break
+    return model, packed
+
+
+class ModelTest(unittest.TestCase):
+    def test_models_play_the_same_game(self):
+        for seed, (rows, cols) in enumerate(((4, 4), (4, 4), (4, 4), (3, 5), (5, 5), (2, 3))):
+            with self.subTest(seed=seed, size=(rows, cols)):
+                model, packed = play_both(seed, 400, rows=rows, cols=cols)
+                self.assertEqual(model.get_move_log(), packed.get_move_log())
+                self.assertEqual(model.undo_remained, packed.undo_remained)
+                self.assertEqual(model.has_won(), packed.has_won())
+                self.assertEqual(model.has_lost(), packed.has_lost())
+                self.assertEqual(model.legal_moves(), packed.legal_moves())
+
+    def test_seed_decides_the_game(self):
+        games = []
+        for _ in range(2):
+            model = Model(seed=11)
+            for key in 'wasd' * 20:
+                model.play(key)
+            games.append((model.matrix, model.score))
+        self.assertEqual(games[0], games[1])
+
+    def test_undo_is_logged(self):
+        model = Model(seed=3)
+        model.play('a') or model.play('d')
+        model.use_undo()
+        self.assertTrue(model.get_move_log()[1].endswith(UNDO))
+
+    def test_no_op_move_is_not_made(self):
+        for cls in (Model, BitboardModel):
+            model = cls(seed=0)
+            model.matrix = [[2, None, None, None], [4, None, None, None],
+                            [None] * 4, [None] * 4]
+            with self.subTest(cls=cls.__name__):
+                self.assertEqual(model.legal_moves(), bitboard.MOVE_BITS[RIGHT] | bitboard.MOVE_BITS[DOWN])
+                self.assertFalse(model.attempt_move('a'))
+                self.assertEqual(len(model.undoable_move), 0)
+                self.assertEqual(model.get_move_log()[1], '')
+                self.assertTrue(model.attempt_move('d'))
+                self.assertEqual(model.matrix[0], [None, None, None, 2])
+
+
+class UndoTest(unittest.TestCase):
+    def test_history_keeps_newest_states(self):
+        history = UndoHistory(capacity=3)
+        for board in range(5):
+            history.push(board, 10 * board)
+        self.assertEqual(list(history), [(2, 20), (3, 30), (4, 40)])
+        self.assertEqual(history.pop(), (4, 40))
+        history.push(5, 50)
+        self.assertEqual(list(history), [(2, 20), (3, 30), (5, 50)])
+        history.clear()
+        self.assertIsNone(history.pop())
+
+    def test_undo_restores_state(self):
+        model = Model(seed=3)
+        model.play('a')
+        tiles = [row[:] for row in model.matrix]
+        score = model.score
+        model.play('w') or model.play('d')
+        model.use_undo()
+        self.assertEqual(model.matrix, tiles)
+        self.assertEqual(model.score, score)
+
+    def test_undo_keeps_tiles_past_cap(self):
+        model = Model(seed=0)
+        model.matrix = [[2 * bitboard.MAX_TILE, 2, None, None]] + [[None] * 4 for _ in range(3)]
+        self.assertTrue(model.attempt_move('d'))
+        self.assertEqual(model.matrix[0], [None, None, 2 * bitboard.MAX_TILE, 2])
+        model.use_undo()
+        self.assertEqual(model.matrix[0], [2 * bitboard.MAX_TILE, 2, None, None])
+
+
+class TerminalTest(unittest.TestCase):
+    def test_win_tile(self):
+        tiles = [[1024, 2048, None, None]] + [[None] * 4 for _ in range(3)]
+        for win_tile in (8, 1024, 2048, 3000, 4096):
+            for cls in (Model, BitboardModel):
+                model = cls(seed=0, win_tile=win_tile)
+                model.matrix = tiles
+                with self.subTest(win_tile=win_tile, cls=cls.__name__):
+                    self.assertEqual(model.has_won(), win_tile <= 2048)
+
+    def test_checks_follow_the_board(self):
+        model = BitboardModel(seed=0)
+        model.matrix = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, None]]
+        self.assertFalse(model.has_lost())
+        model.add_tile()
+        # Its neighbours are both 4, so only a 2 leaves no merges
+        self.assertEqual(model.has_lost(), model.matrix[3][3] == 2)
+        model.matrix = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+        self.assertTrue(model.has_lost())
+        model.unpack(bitboard.encode([[2048, None, None, None]] + [[None] * 4 for _ in range(3)]))
+        self.assertTrue(model.has_won())
+        self.assertFalse(model.has_lost())
+
+
+class TileCapTest(unittest.TestCase):
+    def test_bitboard_model_refuses_to_overflow(self):
+        model = BitboardModel(seed=0)
+        model.matrix = [[bitboard.MAX_TILE, bitboard.MAX_TILE, 2, 4], [4, 2, 4, 2],
+                        [2, 4, 2, 4], [4, 2, 4, 2]]
+        board = model.board
+        with self.assertRaises(OverflowError):
+            model.attempt_move('a')
+        self.assertEqual(model.board, board)
+        self.assertFalse(model.attempt_move('w'))
+
+    def test_model_merges_past_cap(self):
+        model = Model(seed=0, rows=6, cols=6)
+        model.track_motion = True
+        model.matrix = [[bitboard.MAX_TILE, bitboard.MAX_TILE, 2, 4, 2, 4]] + [
+            [2, 4, 2, 4, 2, 4] if row % 2 else [4, 2, 4, 2, 4, 2] for row in range(5)]
+        self.assertTrue(model.attempt_move('a'))
+        self.assertEqual(model.matrix[0], [2 * bitboard.MAX_TILE, 2, 4, 2, 4, None])
+        self.assertEqual(model.score, 2 * bitboard.MAX_TILE)
+        # The packed motion cannot describe the merge, so there is none to animate
+        self.assertIsNone(model.last_motion)
+
+
+if __name__ == '__main__':
+    unittest.main()
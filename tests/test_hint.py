@@ -0,0 +1,67 @@
+"""
+Tests for the background hint engine.
+"""
+import random
+import time
+import unittest
+
+import bitboard
+import hint
+from tests.test_bitboard import random_tiles
+
+LOST = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+# Long enough for the worker to start and finish a search of TIME_LIMIT
+TIMEOUT = 30.0
+
+
+class HintEngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hints = hint.HintEngine()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.hints.close()
+
+    def wait(self) -> hint.Result:
+        deadline = time.monotonic() + TIMEOUT
+        while time.monotonic() < deadline:
+            result = self.hints.poll()
+            if result is not None:
+                return result
+            time.sleep(0.01)
+        self.fail('no hint arrived')
+
+    def test_hint_is_legal(self):
+        rng = random.Random(1)
+        for rows, cols in ((4, 4), (3, 5)):
+            engine = bitboard.get_engine(rows, cols)
+            board = engine.encode(random_tiles(rows, cols, rng, 6))
+            self.hints.submit(board, rows, cols)
+            _, direction = self.wait()
+            with self.subTest(size=(rows, cols)):
+                self.assertTrue(engine.legal_moves(board) & bitboard.MOVE_BITS[direction])
+
+    def test_only_latest_position_is_answered(self):
+        rng = random.Random(2)
+        boards = [bitboard.encode(random_tiles(4, 4, rng, 6)) for _ in range(3)]
+        for board in boards:
+            self.hints.submit(board)
+        generation, direction = self.wait()
+        self.assertEqual(generation, self.hints._generation.value)
+        self.assertTrue(bitboard.legal_moves(boards[-1]) & bitboard.MOVE_BITS[direction])
+        self.assertIsNone(self.hints.poll())
+
+    def test_no_hint_on_lost_board(self):
+        self.hints.submit(bitboard.encode(LOST))
+        self.assertIsNone(self.wait()[1])
+
+    def test_cancel_drops_answer(self):
+        self.hints.submit(bitboard.encode(random_tiles(4, 4, random.Random(3), 6)))
+        self.hints.cancel()
+        self.assertFalse(self.hints.pending)
+        self.assertIsNone(self.hints.poll())
+
+
+if __name__ == '__main__':
+    unittest.main()
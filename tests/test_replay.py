@@ -0,0 +1,61 @@
+"""
+Tests for replaying games from their move logs.
+"""
+import random
+import unittest
+
+from core import Model
+from replay import Replay
+
+
+def record(seed: int, turns: int, **size) -> tuple[Model, list[tuple]]:
+    """ Plays random keys and undos, returning the model and the (tiles,
+    score, undos remaining) after each logged move. """
+    model = Model(seed, **size)
+    rng = random.Random(seed)
+    states = [(model.matrix, model.score, model.undo_remained)]
+    for _ in range(turns):
+        logged = len(model.moves)
+        if rng.random() < 0.05:
+            model.use_undo()
+        else:
+            model.play(rng.choice('wasd'))
+        if len(model.moves) > logged:
+            states.append(([row[:] for row in model.matrix], model.score, model.undo_remained))
+        if model.has_lost():
+            break
+    return model, states
+
+
+class ReplayTest(unittest.TestCase):
+    def test_final_matches_game(self):
+        for seed, (rows, cols) in ((1, (4, 4)), (2, (3, 5))):
+            model, _ = record(seed, 500, rows=rows, cols=cols)
+            replayed = Replay(*model.get_move_log(), rows=rows, cols=cols).final()
+            with self.subTest(seed=seed):
+                self.assertEqual(replayed.matrix, model.matrix)
+                self.assertEqual(replayed.score, model.score)
+
+    def test_seek_in_any_order(self):
+        model, states = record(3, 400)
+        replay = Replay(*model.get_move_log(), checkpoint_interval=16)
+        self.assertEqual(len(replay), len(states) - 1)
+        positions = list(range(len(states)))
+        random.Random(0).shuffle(positions)
+        for k in positions + [len(states) - 1, 0, 17, 16, 15]:
+            state = replay.seek(k)
+            with self.subTest(k=k):
+                self.assertEqual(replay.position, k)
+                self.assertEqual((state.matrix, state.score, state.undo_remained), states[k])
+
+    def test_seek_out_of_range(self):
+        model, _ = record(4, 10)
+        replay = Replay(*model.get_move_log())
+        with self.assertRaises(IndexError):
+            replay.seek(len(replay) + 1)
+        with self.assertRaises(IndexError):
+            replay.seek(-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
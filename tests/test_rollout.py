@@ -0,0 +1,65 @@
+"""
+Tests for the Monte Carlo rollout player.
+"""
+import random
+import unittest
+from multiprocessing import shared_memory
+
+import bitboard
+import rollout
+from a3_support import DOWN
+from tests.test_bitboard import random_tiles
+
+LOST = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+
+
+class PlayoutTest(unittest.TestCase):
+    def test_plays_until_lost(self):
+        rng = random.Random(1)
+        for rows, cols in ((4, 4), (3, 5)):
+            engine = bitboard.get_engine(rows, cols)
+            board = engine.encode(random_tiles(rows, cols, rng, 6))
+            with self.subTest(size=(rows, cols)):
+                self.assertGreaterEqual(rollout.playout(board, engine, rng), 0)
+        self.assertEqual(rollout.playout(bitboard.encode(LOST), bitboard.get_engine(), rng), 0)
+
+
+class RolloutPlayerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.player = rollout.RolloutPlayer(time_limit=5.0, max_rollouts=16, workers=2, seed=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.player.close()
+
+    def test_no_move_on_lost_board(self):
+        self.assertIsNone(self.player.best_move(bitboard.encode(LOST)))
+
+    def test_only_legal_move(self):
+        # Only moving down changes this board
+        board = bitboard.encode(LOST[:3] + [[None] * 4])
+        self.assertEqual(bitboard.legal_moves(board), bitboard.MOVE_BITS[DOWN])
+        self.assertEqual(self.player.best_move(board), DOWN)
+
+    def test_best_move_is_legal(self):
+        rng = random.Random(2)
+        for rows, cols in ((4, 4), (3, 5)):
+            engine = bitboard.get_engine(rows, cols)
+            board = engine.encode(random_tiles(rows, cols, rng, 6))
+            rollouts = self.player.rollouts
+            chosen = self.player.best_move(board, rows, cols)
+            with self.subTest(size=(rows, cols)):
+                self.assertTrue(engine.legal_moves(board) & bitboard.MOVE_BITS[chosen])
+                self.assertGreater(self.player.rollouts, rollouts)
+
+    def test_close_frees_shared_block(self):
+        player = rollout.RolloutPlayer(workers=1)
+        name = player._shared.name
+        player.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
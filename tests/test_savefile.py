@@ -0,0 +1,103 @@
+"""
+Tests for the binary save format.
+"""
+import os
+import tempfile
+import unittest
+
+import savefile
+from core import Model
+
+
+class SaveFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'game.sav')
+
+    def played(self, seed: int, **size) -> Model:
+        model = Model(seed, **size)
+        for key in 'wasdwasdaassddww':
+            model.play(key)
+        model.use_undo()
+        model.play('a')
+        return model
+
+    def assert_restores(self, model: Model, loaded: Model) -> None:
+        savefile.save(self.path, model)
+        with savefile.load(self.path) as save_file:
+            self.assertEqual(save_file.version, savefile.FORMAT_VERSION)
+            self.assertEqual(list(save_file.history()), list(model.undoable_move))
+            save_file.restore(loaded)
+        self.assertEqual(loaded.matrix, model.matrix)
+        self.assertEqual(loaded.score, model.score)
+        self.assertEqual(loaded.undo_remained, model.undo_remained)
+        self.assertEqual(list(loaded.undoable_move), list(model.undoable_move))
+
+    def test_round_trip(self):
+        for seed in (1, 2, 3):
+            with self.subTest(seed=seed):
+                self.assert_restores(self.played(seed), Model(seed=99))
+
+    def test_restore_keeps_last_history_entries(self):
+        model = self.played(1)
+        history = [(board, 4 * index) for index, board in enumerate(range(1, 40))]
+        savefile.write(self.path, model.pack(), model.score, 2, history)
+        with savefile.load(self.path) as save_file:
+            save_file.restore(model)
+        capacity = model.undoable_move.capacity
+        self.assertEqual(list(model.undoable_move), history[-capacity:])
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a save file at all')
+        with self.assertRaises(savefile.SaveFormatError):
+            savefile.load(self.path)
+
+    def test_rejects_truncated_file(self):
+        savefile.save(self.path, self.played(1))
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for end in (savefile.HEADER.size, len(data) - 1):
+            with open(self.path, 'wb') as f:
+                f.write(data[:end])
+            with self.subTest(end=end), self.assertRaises(savefile.SaveFormatError):
+                savefile.load(self.path)
+
+    def test_round_trip_keeps_game_log(self):
+        model = self.played(-7)
+        savefile.save(self.path, model)
+        loaded = Model(seed=99)
+        with savefile.load(self.path) as save_file:
+            save_file.restore(loaded)
+        self.assertEqual(loaded.get_move_log(), model.get_move_log())
+        self.assertEqual(loaded.rng.getstate(), model.rng.getstate())
+        # Both carry on spawning the same tiles
+        for key in 'wasd':
+            self.assertEqual(loaded.play(key), model.play(key))
+            self.assertEqual(loaded.matrix, model.matrix)
+
+    def test_save_without_seed_cannot_be_replayed(self):
+        model = self.played(5)
+        savefile.write(self.path, model.pack(), model.score, 2, [])
+        loaded = self.played(6)
+        with savefile.load(self.path) as save_file:
+            save_file.restore(loaded)
+        self.assertEqual(loaded.matrix, model.matrix)
+        self.assertEqual(loaded.get_move_log(), (None, ''))
+
+    def test_round_trip_other_sizes(self):
+        for seed, (rows, cols) in ((2, (3, 5)), (2 ** 70, (6, 6)), (4, (8, 8))):
+            with self.subTest(size=(rows, cols)):
+                self.assert_restores(self.played(seed, rows=rows, cols=cols),
+                                     Model(seed=99, rows=rows, cols=cols))
+
+    def test_rejects_other_board_size(self):
+        savefile.save(self.path, self.played(1))
+        with savefile.load(self.path) as save_file:
+            with self.assertRaises(savefile.SaveFormatError):
+                save_file.restore(Model(seed=1, rows=5, cols=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
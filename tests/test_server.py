@@ -0,0 +1,122 @@
+"""
+Tests for the multi-session game server.
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import server
+from core import BitboardModel
+
+
+class SessionTest(unittest.TestCase):
+    def test_plays_like_bitboard_model(self):
+        for seed in range(5):
+            session = server.Session('game', seed)
+            model = BitboardModel(seed=seed)
+            rng = random.Random(seed)
+            for _ in range(300):
+                if rng.random() < 0.05:
+                    session.undo()
+                    model.use_undo()
+                else:
+                    key = rng.choice('wasd')
+                    self.assertEqual(session.move(key), model.play(key))
+                with self.subTest(seed=seed):
+                    self.assertEqual((session.board, session.score, session.undos),
+                                     (model.board, model.score, model.undo_remained))
+
+    def test_state_round_trip(self):
+        session = server.Session('game', 1, rows=3, cols=5)
+        for key in 'wasdwasd':
+            session.move(key)
+        restored = server.Session.from_dict(json.loads(json.dumps(session.to_dict())))
+        self.assertEqual(restored.to_reply(), session.to_reply())
+        self.assertEqual(restored.history, session.history)
+        self.assertEqual(restored.rng.random(), session.rng.random())
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = server.SessionStore(os.path.join(directory.name, 'spool'), idle_timeout=0)
+        self.addCleanup(self.store.shutdown)
+        socket_path = os.path.join(directory.name, 'socket')
+        self.server = asyncio.create_task(server.serve(self.store, unix_path=socket_path))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        self.reader, self.writer = await asyncio.open_unix_connection(socket_path)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        self.server.cancel()
+        try:
+            await self.server
+        except asyncio.CancelledError:
+            pass
+
+    async def request(self, **fields) -> dict:
+        return await server._request(self.reader, self.writer, fields)
+
+    async def test_play_over_connection(self):
+        reply = await self.request(op='new', seed=3, id=7)
+        self.assertTrue(reply['ok'])
+        self.assertEqual(reply['id'], 7)
+        session = server.Session('game', 3)
+        self.assertEqual(reply['board'], session.engine.decode(session.board))
+        moved = await self.request(op='move', session=reply['session'], direction='a')
+        self.assertEqual(moved['moved'], session.move('a'))
+        self.assertEqual(moved['board'], session.engine.decode(session.board))
+
+    async def test_idle_sessions_are_spooled_and_restored(self):
+        reply = await self.request(op='new', seed=4)
+        self.assertEqual(await self.store.evict_idle(), 1)
+        self.assertNotIn(reply['session'], self.store.sessions)
+        state = await self.request(op='state', session=reply['session'])
+        self.assertEqual(state['board'], reply['board'])
+        self.assertEqual(self.store.restored, 1)
+
+    async def test_bad_requests_get_error_replies(self):
+        session = (await self.request(op='new'))['session']
+        for request in ({'op': 'state', 'session': [1]}, {'op': 'move', 'session': {}, 'direction': 'w'},
+                        {'op': 'close', 'session': [1]}, {'op': 'new', 'rows': [4]},
+                        {'op': 'new', 'seed': 'x'}, {'op': [1]}, {'op': 'state', 'session': '../x'},
+                        {'op': 'move', 'session': session, 'direction': ['w']}):
+            with self.subTest(request=request):
+                self.assertFalse((await self.request(**request))['ok'])
+        self.writer.write(b'not json\n')
+        self.assertFalse(json.loads(await self.reader.readline())['ok'])
+        # The connection is still usable after all of them
+        self.assertTrue((await self.request(op='state', session=session))['ok'])
+
+    async def test_long_line_closes_connection(self):
+        self.writer.write(b'x' * 70000 + b'\n')
+        self.assertEqual(json.loads(await self.reader.readline())['error'], 'request line too long')
+        self.assertEqual(await self.reader.read(), b'')
+
+
+class SpoolTest(unittest.TestCase):
+    def test_default_spools_are_separate(self):
+        first = server.SessionStore()
+        second = server.SessionStore()
+        self.assertNotEqual(first.spool_dir, second.spool_dir)
+        for store in (first, second):
+            store.shutdown()
+            self.assertFalse(os.path.exists(store.spool_dir))
+
+    @unittest.skipIf(server.fcntl is None, 'needs fcntl to lock the spool')
+    def test_spool_is_locked(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = server.SessionStore(directory)
+            with self.assertRaises(server.SpoolInUseError):
+                server.SessionStore(directory)
+            store.shutdown()
+            server.SessionStore(directory).shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for the memory-mapped lookup tables file.
+"""
+import os
+import tempfile
+import unittest
+
+import bitboard
+import tables
+
+
+class TablesFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tables.bin')
+
+    def test_round_trip(self):
+        written = {'a': ('Q', [0, 1, 2 ** 64 - 1]), 'b': ('d', [0.5, -2.0]), 'empty': ('Q', [])}
+        tables.write(self.path, written)
+        mapped = tables._map(self.path)
+        self.assertEqual(set(mapped), set(written))
+        for name, (typecode, values) in written.items():
+            with self.subTest(name=name):
+                self.assertEqual(mapped[name].format, typecode)
+                self.assertEqual(mapped[name].tolist(), values)
+
+    def test_rejects_other_files(self):
+        self.assertIsNone(tables._map(self.path))
+        tables.write(self.path, {'a': ('Q', [1, 2, 3])})
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        other_version = data[:8] + (tables.TABLES_VERSION + 1).to_bytes(4, 'little') + data[12:]
+        for contents in (b'', other_version, data[:-8]):
+            with open(self.path, 'wb') as f:
+                f.write(contents)
+            with self.subTest(size=len(contents)):
+                self.assertIsNone(tables._map(self.path))
+
+
+@unittest.skipIf(tables.load() is None, 'no tables file to map')
+class MappedTablesTest(unittest.TestCase):
+    def test_engine_uses_mapped_tables(self):
+        # Lines of up to 4 cells have mapped tables, so these shapes map every field
+        for rows, cols in ((3, 4), (4, 3), (2, 2)):
+            engine = bitboard.get_engine(rows, cols)
+            for field in engine._rows + engine._cols:
+                with self.subTest(size=(rows, cols)):
+                    self.assertIsInstance(field, memoryview)
+
+    def test_mapped_tables_match_built_ones(self):
+        for name, (typecode, values) in bitboard.shared_tables().items():
+            with self.subTest(name=name):
+                self.assertEqual(tables.get(name).tolist(), list(values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for the evaluation weight tuner and weights files.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import ai
+import tune
+
+
+class WeightsFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'weights.json')
+
+    def test_round_trip(self):
+        ai.save_weights(self.path, {'empty': 1.5}, generation=3)
+        self.assertEqual(ai.load_weights(self.path), {**ai.DEFAULT_WEIGHTS, 'empty': 1.5})
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['generation'], 3)
+
+    def test_rejects_unknown_weights(self):
+        ai.save_weights(self.path, {'empty': 1.0, 'luck': 2.0})
+        with self.assertRaises(ValueError):
+            ai.load_weights(self.path)
+
+
+class StrategyTest(unittest.TestCase):
+    def test_moves_towards_fitter_candidates(self):
+        target = [1.0, -2.0, 0.5, 3.0, 0.0]
+        strategy = tune.Strategy([0.0] * len(target), 1.0, 10)
+        rng = random.Random(1)
+        for _ in range(60):
+            samples = strategy.ask(rng)
+            strategy.tell(samples, [-sum((a - b) ** 2 for a, b in zip(x, target)) for _, x in samples])
+        self.assertEqual(strategy.generation, 60)
+        for mean, goal in zip(strategy.mean, target):
+            self.assertAlmostEqual(mean, goal, delta=0.1)
+
+    def test_state_round_trip(self):
+        strategy = tune.Strategy(tune.from_weights(ai.DEFAULT_WEIGHTS), 0.3, 6)
+        samples = strategy.ask(random.Random(2))
+        strategy.tell(samples, list(range(len(samples))))
+        restored = tune.Strategy.from_dict(json.loads(json.dumps(strategy.to_dict())), 6)
+        self.assertEqual(restored.to_dict(), strategy.to_dict())
+        self.assertEqual(restored.ask(random.Random(3)), strategy.ask(random.Random(3)))
+
+
+class TuneTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def run_tune(self, generations: int, name: str, resume: bool = False) -> tune.Strategy:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return tune.tune(generations, population=4, games=1, depth=1, seed=5, workers=2,
+                             checkpoint=os.path.join(self.directory, name),
+                             output=os.path.join(self.directory, 'weights.json'), resume=resume)
+
+    def test_resumed_run_matches_uninterrupted_run(self):
+        uninterrupted = self.run_tune(2, 'whole.json')
+        self.run_tune(1, 'split.json')
+        resumed = self.run_tune(2, 'split.json', resume=True)
+        self.assertEqual(resumed.to_dict(), uninterrupted.to_dict())
+        weights = ai.load_weights(os.path.join(self.directory, 'weights.json'))
+        self.assertEqual(weights.keys(), ai.DEFAULT_WEIGHTS.keys())
+
+    def test_resume_refuses_other_settings(self):
+        path = os.path.join(self.directory, 'checkpoint.json')
+        tune.write_checkpoint(path, {'seed': 1}, tune.Strategy([0.0], 0.3, 4), [])
+        with self.assertRaises(ValueError):
+            tune.read_checkpoint(path, {'seed': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,302 @@
+"""
+Self-play tuner for the expectimax evaluation weights.
+
+Searches for the ai.Evaluator weights (empty cells, monotonicity, smoothness,
+largest tile in a corner and available merges) that score best in self-play,
+with a separable CMA-ES: each generation samples candidate weight vectors from
+a Gaussian with a per-weight spread, plays every candidate on the same set of
+seeded games across a process pool, and moves the Gaussian towards the best
+candidates. Weights are searched in log space, so they stay positive and a
+step changes each of them by a similar factor whatever its size.
+
+Every candidate in a generation plays the same games, so they are compared on
+equal terms; each generation gets new games, so the weights do not overfit to
+a few boards. The seeds are derived from the run's seed and the generation
+number, and the strategy state is checkpointed after every generation, so an
+interrupted run resumes exactly where it stopped.
+
+After every generation the mean of the search distribution is written to the
+weights file, which ai.load_weights reads (a3.py --weights PATH, for hints).
+
+Usage:
+    python tune.py --generations 40 --population 12 --games 8 --output weights.json
+    python tune.py --generations 60 --resume
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from multiprocessing.pool import Pool
+from typing import Optional
+
+import ai
+import bitboard
+import simulate
+
+NAMES = tuple(ai.DEFAULT_WEIGHTS)
+CHECKPOINT_VERSION = 1
+
+# Log weights in NAMES order
+Vector = list[float]
+
+
+def to_weights(x: Vector) -> dict[str, float]:
+    """ Converts a vector of log weights into Evaluator weights. """
+    return {name: math.exp(value) for name, value in zip(NAMES, x)}
+
+
+def from_weights(weights: dict[str, float]) -> Vector:
+    """ Converts Evaluator weights into a vector of log weights. """
+    return [math.log(weights[name]) for name in NAMES]
+
+
+class Strategy:
+    """ A separable CMA-ES maximising a noisy fitness.
+
+    Only the diagonal of the covariance is adapted, which is plenty for a
+    handful of weights and keeps the update to a few lines. The overall step
+    size follows cumulative step-size adaptation.
+    """
+    def __init__(self, mean: Vector, sigma: float, population: int) -> None:
+        """
+        Parameters:
+            mean: The starting point.
+            sigma: The starting step size, in log weight.
+            population: Candidates sampled per generation.
+        """
+        n = len(mean)
+        self.mean = list(mean)
+        self.sigma = sigma
+        self.scales = [1.0] * n
+        self.path = [0.0] * n
+        self.population = population
+        self.generation = 0
+        # The better half of each generation is recombined, the best weighted most
+        mu = population // 2
+        raw = [math.log(mu + 0.5) - math.log(rank + 1) for rank in range(mu)]
+        self.recombination = [weight / sum(raw) for weight in raw]
+        mu_eff = 1 / sum(weight ** 2 for weight in self.recombination)
+        self.mu_eff = mu_eff
+        self.c_sigma = (mu_eff + 2) / (n + mu_eff + 5)
+        self.d_sigma = 1 + 2 * max(0.0, math.sqrt((mu_eff - 1) / (n + 1)) - 1) + self.c_sigma
+        # Separable CMA-ES can learn the diagonal faster than full CMA-ES
+        self.c_mu = min(1.0, (n + 2) / 3 * mu_eff / ((n + 2) ** 2 + mu_eff))
+        # Expected length of a standard normal vector
+        self.chi_n = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+    def ask(self, rng: random.Random) -> list[tuple[Vector, Vector]]:
+        """ Samples a generation of candidates.
+
+        Returns:
+            A (standard normal z, candidate x) pair for each candidate.
+        """
+        samples = []
+        for _ in range(self.population):
+            z = [rng.gauss(0.0, 1.0) for _ in self.mean]
+            x = [m + self.sigma * scale * zi for m, scale, zi in zip(self.mean, self.scales, z)]
+            samples.append((z, x))
+        return samples
+
+    def tell(self, samples: list[tuple[Vector, Vector]], fitnesses: list[float]) -> None:
+        """ Moves the distribution towards the fittest of samples. """
+        ranked = sorted(zip(fitnesses, range(len(samples))), reverse=True)
+        best = [samples[index][0] for _, index in ranked[:len(self.recombination)]]
+        n = len(self.mean)
+        step = [sum(w * z[i] for w, z in zip(self.recombination, best)) for i in range(n)]
+        # The spread learnt from this generation's steps, before the mean moves
+        learnt = [sum(w * (self.scales[i] * z[i]) ** 2 for w, z in zip(self.recombination, best))
+                  for i in range(n)]
+        self.mean = [m + self.sigma * scale * s for m, scale, s in zip(self.mean, self.scales, step)]
+        c = self.c_sigma
+        self.path = [(1 - c) * p + math.sqrt(c * (2 - c) * self.mu_eff) * s
+                     for p, s in zip(self.path, step)]
+        length = math.sqrt(sum(p * p for p in self.path))
+        self.sigma *= math.exp(c / self.d_sigma * (length / self.chi_n - 1))
+        self.scales = [math.sqrt((1 - self.c_mu) * scale ** 2 + self.c_mu * l)
+                       for scale, l in zip(self.scales, learnt)]
+        self.generation += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'mean': self.mean,
+            'sigma': self.sigma,
+            'scales': self.scales,
+            'path': self.path,
+            'generation': self.generation,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, population: int) -> 'Strategy':
+        strategy = cls(data['mean'], data['sigma'], population)
+        strategy.scales = data['scales']
+        strategy.path = data['path']
+        strategy.generation = data['generation']
+        return strategy
+
+
+# Solvers built in this worker, by (weights, depth). Each game of a
+# generation reuses its candidate's solver, so this only needs the candidates
+# of one generation.
+_solvers: dict[tuple, ai.ExpectimaxSolver] = {}
+MAX_SOLVERS = 16
+TABLE_ENTRIES = 200_000
+
+
+def _solver(weights: tuple[float, ...], depth: int) -> ai.ExpectimaxSolver:
+    key = (weights, depth)
+    solver = _solvers.get(key)
+    if solver is None:
+        if len(_solvers) >= MAX_SOLVERS:
+            _solvers.clear()
+        evaluator = ai.Evaluator(dict(zip(NAMES, weights)))
+        table = ai.TranspositionTable(max_entries=TABLE_ENTRIES, symmetric=True)
+        solver = _solvers[key] = ai.ExpectimaxSolver(depth=depth, evaluator=evaluator, table=table)
+    return solver
+
+
+def play(task: tuple[tuple[float, ...], int, int]) -> int:
+    """ Plays one seeded game with the given weights, in a worker.
+
+    Parameters:
+        task: (weights in NAMES order, search depth, game seed).
+
+    Returns:
+        The final score.
+    """
+    weights, depth, seed = task
+    solver = _solver(weights, depth)
+    score, _, _ = simulate.play_game(lambda board, candidates, rng: solver.best_move(board),
+                                     random.Random(seed), bitboard.get_engine())
+    return score
+
+
+def evaluate(pool: Pool, candidates: list[Vector], depth: int,
+             seeds: list[int]) -> list[float]:
+    """ Scores each candidate by its mean score over the same seeded games.
+
+    Returns:
+        The fitness of each candidate, in order.
+    """
+    tasks = [(tuple(to_weights(x).values()), depth, seed) for x in candidates for seed in seeds]
+    scores = pool.map(play, tasks, chunksize=1)
+    return [sum(scores[i:i + len(seeds)]) / len(seeds) for i in range(0, len(scores), len(seeds))]
+
+
+def generation_rng(seed: int, generation: int) -> random.Random:
+    """ Returns the random number generator for a generation's game seeds
+    and candidates, the same every time the generation is run. """
+    return random.Random(seed * 1_000_003 + generation)
+
+
+def write_checkpoint(path: str, config: dict, strategy: Strategy, history: list[dict]) -> None:
+    """ Writes the tuner state to path, replacing it in one step. """
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'version': CHECKPOINT_VERSION, 'config': config, 'strategy': strategy.to_dict(),
+                   'history': history}, f, indent=2)
+        f.write('\n')
+    os.replace(temporary, path)
+
+
+def read_checkpoint(path: str, config: dict) -> tuple[Strategy, list[dict]]:
+    """ Reads the tuner state written by write_checkpoint.
+
+    Raises:
+        ValueError: If the checkpoint is from another version or was made
+                    with different settings.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'{path}: not a version {CHECKPOINT_VERSION} checkpoint')
+    if data['config'] != config:
+        raise ValueError(f'{path}: made with {data["config"]}, not {config}')
+    return Strategy.from_dict(data['strategy'], config['population']), data['history']
+
+
+def tune(generations: int, population: int = 8, games: int = 4, depth: int = 1,
+         sigma: float = 0.3, seed: int = 0, workers: Optional[int] = None,
+         checkpoint: Optional[str] = None, output: Optional[str] = None,
+         resume: bool = False) -> Strategy:
+    """ Runs the tuner until the strategy has done the given number of
+    generations.
+
+    Parameters:
+        generations: The total number of generations, counting any done
+                     before a resumed checkpoint.
+        population: Candidates per generation.
+        games: Seeded games each candidate plays per generation.
+        depth: The expectimax search depth used in the games.
+        sigma: The starting step size, in log weight.
+        seed: Derives every game seed and candidate.
+        workers: Number of worker processes, defaulting to the CPU count.
+        checkpoint: The file to save the state to after every generation.
+        output: The weights file to write after every generation.
+        resume: Continue from checkpoint if it exists.
+
+    Returns:
+        The final strategy. Its mean holds the tuned log weights.
+    """
+    config = {'seed': seed, 'population': population, 'games': games, 'depth': depth}
+    if resume and checkpoint and os.path.exists(checkpoint):
+        strategy, history = read_checkpoint(checkpoint, config)
+    else:
+        strategy = Strategy(from_weights(ai.DEFAULT_WEIGHTS), sigma, population)
+        history = []
+    with multiprocessing.Pool(workers) as pool:
+        while strategy.generation < generations:
+            start = time.perf_counter()
+            rng = generation_rng(seed, strategy.generation)
+            seeds = [rng.randrange(2 ** 32) for _ in range(games)]
+            samples = strategy.ask(rng)
+            fitnesses = evaluate(pool, [x for _, x in samples], depth, seeds)
+            best = max(range(population), key=fitnesses.__getitem__)
+            history.append({
+                'generation': strategy.generation,
+                'best_fitness': fitnesses[best],
+                'mean_fitness': sum(fitnesses) / population,
+                'best_weights': to_weights(samples[best][1]),
+                'sigma': strategy.sigma,
+            })
+            strategy.tell(samples, fitnesses)
+            if checkpoint:
+                write_checkpoint(checkpoint, config, strategy, history)
+            if output:
+                ai.save_weights(output, to_weights(strategy.mean), generation=strategy.generation,
+                                **config)
+            print(f'generation {strategy.generation}: best {fitnesses[best]:.0f}, '
+                  f'mean {history[-1]["mean_fitness"]:.0f}, sigma {strategy.sigma:.3f}, '
+                  f'{time.perf_counter() - start:.1f}s', flush=True)
+    return strategy
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Tune the expectimax evaluation weights by self-play.')
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--population', type=int, default=8)
+    parser.add_argument('--games', type=int, default=4, help='games per candidate per generation')
+    parser.add_argument('--depth', type=int, default=1, help='expectimax depth used in the games')
+    parser.add_argument('--sigma', type=float, default=0.3, help='starting step size, in log weight')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default='tune_checkpoint.json')
+    parser.add_argument('--output', default='weights.json')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint if it exists')
+    args = parser.parse_args(argv)
+    if args.population < 2:
+        parser.error('--population must be at least 2')
+
+    try:
+        strategy = tune(args.generations, args.population, args.games, args.depth, args.sigma,
+                        args.seed, args.workers, args.checkpoint, args.output, args.resume)
+    except ValueError as e:
+        parser.error(str(e))
+    for name, value in to_weights(strategy.mean).items():
+        print(f'{name:<13}{value:10.2f}')
+
+
+if __name__ == '__main__':
+    main()